@@ -1,11 +1,16 @@
-from typing import List, Dict, Tuple, Any
+from typing import List, Dict, NamedTuple, Tuple, Any
+from concurrent.futures import ProcessPoolExecutor
 
 import re
+import os
 import csv
-import json
+import time
 import os.path
 import logging
+import argparse
 import operator
+import functools
+import threading
 
 import shapely.ops
 import shapely.geometry
@@ -13,20 +18,66 @@ import shapely.geometry
 from shapely.geometry import Point, LineString, MultiLineString, Polygon
 from shapely.geometry.base import BaseGeometry
 
+from open_cycle_export.cache_utilities.atomic_cache import (
+    file_lock,
+    store_json_atomic,
+    read_json_entry,
+)
+from open_cycle_export.cache_utilities.cache_index import record_entry, touch_entry
+from open_cycle_export.cache_utilities.compression import (
+    COMPRESSIONS,
+    COMPRESSION_VARIABLE,
+)
 from open_cycle_export.map_builder.map_plotter import MapPlotter
+from open_cycle_export.pipeline.staged_pipeline import Pipeline, PipelineStage
 
-from open_cycle_export.route_downloader.download_cycle_route import download_cycle_route
+from open_cycle_export.route_downloader.download_cycle_route import (
+    download_cycle_route,
+    download_cycle_routes,
+)
 from open_cycle_export.route_downloader.download_places import download_places
 
-from open_cycle_export.route_exporter.elevation_finder import find_elevations
-from open_cycle_export.route_exporter.route_exporter import generate_gpx_file
+from open_cycle_export.route_exporter.elevation_finder import (
+    DEM_DIRECTORY_VARIABLE,
+    ELEVATION_CACHE_VARIABLE,
+    ELEVATION_CHUNK_SIZE_VARIABLE,
+    ELEVATION_WORKERS_VARIABLE,
+    get_elevation_finder,
+    log_elevation_statistics,
+)
+from open_cycle_export.route_exporter.route_exporter import write_gpx_track
+from open_cycle_export.route_exporter.track_simplifier import (
+    DOUGLAS_PEUCKER,
+    VISVALINGAM,
+    TOLERANCE_VARIABLE,
+    MAX_POINTS_VARIABLE,
+    METHOD_VARIABLE,
+    get_simplify_options,
+    simplify_track,
+)
 
 from open_cycle_export.route_processor.route_processor import (
-    process_route_features,
-    find_furthest_waypoints,
-    make_route_creator,
+    process_route_features_to_graph,
+    find_furthest_coordinates,
+    make_graph_route_creator,
+)
+from open_cycle_export.route_processor.spatial_convertor import (
+    WGS84,
+    transform_multi_line_string,
+)
+from open_cycle_export.route_processor.waypoint_graph import (
+    WaypointGraph,
+    save_waypoint_graph,
+    load_waypoint_graph as load_waypoint_graph_directory,
 )
 
+from open_cycle_export.spatial_index.place_index import (
+    PlaceIndex,
+    create_place_index,
+    save_place_index,
+    load_place_index,
+)
+from open_cycle_export.shapely_utilities.feature_filter import group_features_by_polygon
 from open_cycle_export.shapely_utilities.immutable_point import ImmutablePoint
 from open_cycle_export.shapely_utilities.geometry_encoder import GeometryEncoder
 
@@ -44,20 +95,27 @@ def get_file_path(name: str, folder: str, extension: str = "json"):
     return os.path.join(os.path.abspath(os.path.dirname(__file__)), folder, filename)
 
 
-def export_gpx_route(route: MultiLineString, filename: str):
+def find_route_elevations(route: MultiLineString):
+    coordinates = simplify_track(
+        [coord for line in route for coord in line.coords], *get_simplify_options()
+    )
+    return coordinates, get_elevation_finder()(coordinates)
+
+
+def write_gpx_route(coordinates, elevations, filename: str):
     filename = format_name(filename, "_")
     file_path = get_file_path(filename, "routes", "gpx")
-    coordinates = [coord for line in route for coord in line.coords]
-    elevations = find_elevations(coordinates)
-    gpx_data = generate_gpx_file(coordinates, elevations)
     with open(file_path, "w") as open_file:
-        open_file.write(gpx_data)
+        write_gpx_track(open_file, coordinates, elevations)
+
+
+def export_gpx_route(route: MultiLineString, filename: str):
+    coordinates, elevations = find_route_elevations(route)
+    write_gpx_route(coordinates, elevations, filename)
 
 
 def store_json(data: Any, filename: str, **kwargs):
-    file_path = get_file_path(filename, ".cache")
-    with open(file_path, "w") as open_file:
-        json.dump(data, open_file, **kwargs)
+    store_json_atomic(get_file_path(filename, ".cache"), data, **kwargs)
 
 
 def store_route(route: MultiLineString, filename: str):
@@ -70,9 +128,7 @@ def store_geometry(geometry_data: Any, filename: str):
 
 
 def load_json(filename: str):
-    file_path = get_file_path(filename, ".cache")
-    with open(file_path) as open_file:
-        return json.load(open_file)
+    return read_json_entry(get_file_path(filename, ".cache"))
 
 
 def load_route(name: str):
@@ -84,26 +140,37 @@ def load_waypoints(filename: str):
     return [ImmutablePoint(*point["coordinates"]) for point in load_json(filename)]
 
 
-def load_waypoint_connections(filename: str):
-    return [
-        [
-            None if connection is None else shapely.geometry.shape(connection)
-            for connection in row
-        ]
-        for row in load_json(filename)
-    ]
+def store_waypoint_graph(waypoint_graph: WaypointGraph, filename: str):
+    graph_path = get_file_path(filename, ".cache", "graph")
+    save_waypoint_graph(waypoint_graph, graph_path)
+    record_entry(graph_path, graph_path, "waypoint graph")
+
+
+def load_waypoint_graph(filename: str):
+    graph_path = get_file_path(filename, ".cache", "graph")
+    waypoint_graph = load_waypoint_graph_directory(graph_path)
+    touch_entry(graph_path, "waypoint graph")
+    return waypoint_graph
 
 
 def create_bbox_polygon(min_x, min_y, max_x, max_y):
     return Polygon([(min_x, min_y), (max_x, min_y), (max_x, max_y), (min_x, max_y)])
 
 
-def filter_features(features: List[Dict], polygon: Polygon):
-    return [
-        feature
-        for feature in features
-        if shapely.geometry.shape(get_geometry(feature)).intersects(polygon)
-    ]
+def split_features_by_city(
+    features: List[Dict], city_features: List[Dict]
+) -> Dict[str, List[Dict]]:
+    "Features intersecting each city boundary from download_city_boundaries by name"
+
+    city_names, city_polygons = [], []
+    for city_feature in city_features:
+        polygon = shapely.geometry.shape(get_geometry(city_feature))
+        # Boundaries with no complete ring have no polygon to test against
+        if polygon.area:
+            city_names.append(city_feature["properties"].get("name"))
+            city_polygons.append(polygon)
+    groups = group_features_by_polygon(features, city_polygons)
+    return {name: group for name, group in zip(city_names, groups) if group}
 
 
 def merge_line_strings(line_strings: List[LineString]):
@@ -113,50 +180,93 @@ def merge_line_strings(line_strings: List[LineString]):
     return MultiLineString([ways_multi_line_string])
 
 
-def closest_place_index_finder(place_points: List[ImmutablePoint]):
-    place_indexes = list(range(len(place_points)))
+def get_place_index_path(area):
+    return get_file_path("{}_places".format(format_name(area)), ".cache", "places")
 
-    def find_closest_place_index(search_point: ImmutablePoint):
-        return min(place_indexes, key=lambda i: search_point.distance(place_points[i]))
 
-    return find_closest_place_index
+def load_cached_place_index(area):
+    "Place index from the cache or None when there is no valid cache entry"
+
+    try:
+        index_path = get_place_index_path(area)
+        place_index = load_place_index(index_path)
+        touch_entry(index_path, "place index")
+        return place_index
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def get_place_index(area) -> PlaceIndex:
+    "Index of the places in an area, built once and shared by every process"
+
+    place_index = load_cached_place_index(area)
+    if place_index is not None:
+        return place_index
+
+    index_path = get_place_index_path(area)
+    with file_lock(index_path):
+        place_index = load_cached_place_index(area)
+        if place_index is None:
+            place_features = download_places(area)["features"]
+            logger.info("downloaded %s place features", len(place_features))
+            place_index = create_place_index(place_features)
+            save_place_index(place_index, index_path)
+            record_entry(index_path, index_path, "place index")
+    return place_index
+
+
+def get_waypoint_graph_filename(area, route_type, route_number):
+    route_name = "{}_{}_{}".format(format_name(area), route_type, route_number)
+    return "{}_waypoint_graph".format(route_name)
+
+
+def load_cached_waypoint_graph(area, route_type, route_number):
+    "Waypoint graph from the cache or None when there is no valid cache entry"
+
+    try:
+        filename = get_waypoint_graph_filename(area, route_type, route_number)
+        return load_waypoint_graph(filename)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def load_or_process_waypoint_graph(area, route_type, route_number, route_features):
+
+    waypoint_graph_filename = get_waypoint_graph_filename(
+        area, route_type, route_number
+    )
+
+    waypoint_graph = load_cached_waypoint_graph(area, route_type, route_number)
+    if waypoint_graph is not None:
+        logger.info("using cached waypoint graph")
+        return waypoint_graph
+
+    # Wait for any other process processing the same route and use its graph
+    with file_lock(get_file_path(waypoint_graph_filename, ".cache", "graph")):
+        waypoint_graph = load_cached_waypoint_graph(area, route_type, route_number)
+        if waypoint_graph is not None:
+            logger.info("using waypoint graph cached by another process")
+            return waypoint_graph
+        if len(route_features) < 1:
+            raise ValueError("no ways found for route {}".format(route_number))
+        waypoint_graph = process_route_features_to_graph(route_features)
+        store_waypoint_graph(waypoint_graph, waypoint_graph_filename)
+
+    return waypoint_graph
 
 
 def process_route_data(area, route_type, route_number):
 
-    route_name = "{}_{}_{}".format(format_name(area), route_type, route_number)
-    logger.info("process route %s", route_name)
+    logger.info("process route %s %s %s", area, route_type, route_number)
 
     route_features = download_cycle_route(area, route_type, route_number)["features"]
     logger.info("downloaded %s route features", len(route_features))
 
-    waypoints_filename = "{}_waypoints".format(route_name)
-    waypoint_distances_filename = "{}_waypoint_distances".format(route_name)
-    waypoint_connections_filename = "{}_waypoint_connections".format(route_name)
-    costs_matrix_filename = "{}_costs_matrix".format(route_name)
-
-    try:
-        waypoints = load_waypoints(waypoints_filename)
-        waypoint_distances = load_json(waypoint_distances_filename)
-        waypoint_connections = load_waypoint_connections(waypoint_connections_filename)
-        costs_matrix = load_json(costs_matrix_filename)
-        logger.info("using cached waypoints")
-    except FileNotFoundError:
-        logger.info("waypoint cache not found")
-        result = process_route_features(route_features)
-        waypoints, waypoint_distances, waypoint_connections, costs_matrix = result
-        store_geometry(waypoints, waypoints_filename)
-        store_json(waypoint_distances, waypoint_distances_filename)
-        store_geometry(waypoint_connections, waypoint_connections_filename)
-        store_json(costs_matrix, costs_matrix_filename)
-
-    return (
-        route_features,
-        waypoints,
-        waypoint_distances,
-        waypoint_connections,
-        costs_matrix,
+    waypoint_graph = load_or_process_waypoint_graph(
+        area, route_type, route_number, route_features
     )
+    return route_features, waypoint_graph
 
 
 def plot_routes(route_features, routes):
@@ -180,50 +290,50 @@ def abbreviate_area(area):
     return area[:2] if len(words) < 2 else "".join([word[0] for word in words])
 
 
-def create_route(area, route_type, route_number, show_plot=False):
+def create_route_line_strings(
+    area, route_type, route_number, waypoint_graph: WaypointGraph, place_index
+) -> List[Tuple[str, MultiLineString]]:
 
-    process_route_data_results = process_route_data(area, route_type, route_number)
-    route_features, *route_creator_inputs = process_route_data_results
-    waypoints, waypoint_distances = route_creator_inputs[:2]
+    route_creator = make_graph_route_creator(waypoint_graph)
 
-    place_features = download_places(area)["features"]
-    logger.info("downloaded %s place features", len(place_features))
+    point_a_index, point_b_index = find_furthest_coordinates(waypoint_graph.coordinates)
 
-    place_names = [
-        feature.get("properties", {}).get("name") for feature in place_features
-    ]
-    place_points = [
-        ImmutablePoint(*feature.get("geometry", {}).get("coordinates"))
-        for feature in place_features
-    ]
-    find_closest_place_index = closest_place_index_finder(place_points)
+    # Routes are found in the metric CRS of the graph and exported in lon/lat
+    crs = waypoint_graph.crs
+    route_a_to_b = transform_multi_line_string(
+        route_creator(point_a_index, point_b_index), crs, WGS84
+    )
+    route_b_to_a = transform_multi_line_string(
+        route_creator(point_b_index, point_a_index), crs, WGS84
+    )
 
-    route_creator = make_route_creator(*route_creator_inputs)
+    place_name_a, place_name_b = place_index.find_nearest_names(
+        waypoint_graph.coordinates[[point_a_index, point_b_index]], crs
+    )
 
-    point_a_index, point_b_index = find_furthest_waypoints(waypoint_distances)
+    base_name = "{} {} {}".format(abbreviate_area(area), route_type, route_number)
+    route_a_to_b_name = "{} {} to {}".format(base_name, place_name_a, place_name_b)
+    route_b_to_a_name = "{} {} to {}".format(base_name, place_name_b, place_name_a)
 
-    route_a_to_b = route_creator(point_a_index, point_b_index)
-    route_b_to_a = route_creator(point_b_index, point_a_index)
+    return [(route_a_to_b_name, route_a_to_b), (route_b_to_a_name, route_b_to_a)]
 
-    waypoint_a = waypoints[point_a_index]
-    waypoint_b = waypoints[point_b_index]
 
-    place_name_a = place_names[find_closest_place_index(waypoint_a)]
-    place_name_b = place_names[find_closest_place_index(waypoint_b)]
+def create_route(area, route_type, route_number, show_plot=False):
 
-    base_name = "{} {} {}".format(abbreviate_area(area), route_type, route_number)
-    route_a_to_b_name = "{} {} to {}".format(base_name, place_name_a, place_name_b)
-    route_b_to_a_name = "{} {} to {}".format(base_name, place_name_b, place_name_a)
+    process_route_data_results = process_route_data(area, route_type, route_number)
+    route_features, waypoint_graph = process_route_data_results
+
+    routes = create_route_line_strings(
+        area, route_type, route_number, waypoint_graph, get_place_index(area)
+    )
 
     if show_plot:
-        plot_routes(
-            route_features,
-            [(route_a_to_b_name, route_a_to_b), (route_b_to_a_name, route_b_to_a)],
-        )
+        plot_routes(route_features, routes)
 
     logger.info("export gpx files for both directions")
-    export_gpx_route(route_a_to_b, route_a_to_b_name)
-    export_gpx_route(route_b_to_a, route_b_to_a_name)
+    for route_name, route in routes:
+        export_gpx_route(route, route_name)
+    log_elevation_statistics()
     logger.info("route creation complete")
 
 
@@ -233,16 +343,307 @@ def get_csv_data(filename):
         return list(csv_file)[1:]
 
 
+RouteKey = Tuple[str, str, str]
+
+
+class RouteReport(NamedTuple):
+    area: str
+    route_type: str
+    route_number: str
+    status: str
+    waypoint_count: int = 0
+    edge_count: int = 0
+    download_seconds: float = 0.0
+    process_seconds: float = 0.0
+    elevation_seconds: float = 0.0
+    export_seconds: float = 0.0
+    error: str = ""
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def download_route_features(area, route_type, route_number):
+    return download_cycle_route(area, route_type, route_number)["features"]
+
+
+def process_route_task(area, route_type, route_number, route_features, find_routes):
+    "Process a route in a worker process, routing it when find_routes is set"
+
+    waypoint_graph = load_or_process_waypoint_graph(
+        area, route_type, route_number, route_features
+    )
+    routes = []
+    if find_routes:
+        # The place index was cached by the download stage and is memory mapped
+        routes = create_route_line_strings(
+            area, route_type, route_number, waypoint_graph, get_place_index(area)
+        )
+    return waypoint_graph.waypoint_count, waypoint_graph.edge_count, routes
+
+
+def run_batch(
+    route_keys: List[RouteKey],
+    workers: int = None,
+    io_workers: int = 4,
+    export: bool = False,
+    resume: bool = True,
+    queue_size: int = 4,
+    log_interval: float = 30.0,
+) -> List[RouteReport]:
+    """Stream many routes through a download, process and export pipeline
+
+    Each stage runs concurrently on different routes and stages are joined by bounded
+    queues, so network waits on Overpass and the elevation service overlap with
+    processing while only a few routes are held in memory at once. Processing and
+    routing run in a process pool. Routes of the same area and network are downloaded
+    together in one query by the first route of each network to reach the download
+    stage. A route which fails is reported and does not stop the batch. Stage queue
+    depths and throughput are logged while the batch runs.
+
+    Arguments:
+        route_keys {List[RouteKey]} -- Area, route type and route number of each route
+
+    Keyword Arguments:
+        workers {int} -- Number of processes, one per CPU when None (default: {None})
+        io_workers {int} -- Number of threads for each download and export stage (default: {4})
+        export {bool} -- Create routes and export them as GPX files (default: {False})
+        resume {bool} -- Skip routes with a valid waypoint graph cache when not exporting (default: {True})
+        queue_size {int} -- Maximum number of routes waiting before each stage (default: {4})
+        log_interval {float} -- Seconds between logging stage statistics (default: {30.0})
+
+    Returns:
+        List[RouteReport] -- Status, counts and timings of each route in input order
+    """
+
+    reports: Dict[RouteKey, RouteReport] = {}
+    route_details: Dict[RouteKey, Dict[str, Any]] = {key: {} for key in route_keys}
+    network_locks: Dict[Tuple[str, str], threading.Lock] = {}
+    downloaded_networks = set()
+    workers = workers or os.cpu_count()
+
+    def finish(route_key: RouteKey, status: str, **kwargs):
+        kwargs.update(route_details[route_key])
+        reports[route_key] = RouteReport(*route_key, status, **kwargs)
+        logger.info(
+            "%s/%s routes complete, %s %s",
+            len(reports),
+            len(route_keys),
+            " ".join(route_key),
+            status,
+        )
+
+    def download_network_routes(area, route_type):
+        "Download every pending route of a network with one query, caching each"
+
+        with network_locks[area, route_type]:
+            if (area, route_type) not in downloaded_networks:
+                route_numbers = [
+                    route_number
+                    for key_area, key_type, route_number in pending_keys
+                    if (key_area, key_type) == (area, route_type)
+                ]
+                try:
+                    download_cycle_routes(area, route_type, route_numbers)
+                except Exception:
+                    # Each route falls back to its own query in download_stage
+                    logger.exception("failed to download %s %s", area, route_type)
+                downloaded_networks.add((area, route_type))
+
+    def download_stage(route_key: RouteKey):
+        start = time.perf_counter()
+        download_network_routes(*route_key[:2])
+        route_features = download_route_features(*route_key)
+        route_details[route_key]["download_seconds"] = time.perf_counter() - start
+        if export:
+            get_place_index(route_key[0])
+        return route_key, route_features
+
+    def process_stage(item):
+        route_key, route_features = item
+        args = (*route_key, route_features, export)
+        result, elapsed = process_pool.submit(timed, process_route_task, *args).result()
+        waypoint_count, edge_count, routes = result
+        route_details[route_key].update(
+            waypoint_count=waypoint_count,
+            edge_count=edge_count,
+            process_seconds=elapsed,
+        )
+        return route_key, routes
+
+    def elevation_stage(item):
+        route_key, routes = item
+        elevated_routes, elapsed = timed(
+            lambda: [(name, *find_route_elevations(route)) for name, route in routes]
+        )
+        route_details[route_key]["elevation_seconds"] = elapsed
+        return route_key, elevated_routes
+
+    def write_stage(item):
+        route_key, elevated_routes = item
+        start = time.perf_counter()
+        for route_name, coordinates, elevations in elevated_routes:
+            write_gpx_route(coordinates, elevations, route_name)
+        route_details[route_key]["export_seconds"] = time.perf_counter() - start
+        return route_key
+
+    stages = [
+        PipelineStage("download", download_stage, io_workers),
+        PipelineStage("process", process_stage, workers),
+    ]
+    if export:
+        stages.append(PipelineStage("elevation", elevation_stage, io_workers))
+        stages.append(PipelineStage("write", write_stage))
+
+    pending_keys = []
+    for route_key in route_keys:
+        waypoint_graph = None
+        if resume and not export:
+            waypoint_graph = load_cached_waypoint_graph(*route_key)
+        if waypoint_graph is None:
+            pending_keys.append(route_key)
+            continue
+        route_details[route_key].update(
+            waypoint_count=waypoint_graph.waypoint_count,
+            edge_count=waypoint_graph.edge_count,
+        )
+        finish(route_key, "cached")
+    for area, route_type, _ in pending_keys:
+        network_locks.setdefault((area, route_type), threading.Lock())
+
+    pipeline = Pipeline(stages, queue_size, log_interval)
+    with ProcessPoolExecutor(workers) as process_pool:
+        for result in pipeline.run(pending_keys):
+            route_key = pending_keys[result.index]
+            if result.error is None:
+                finish(route_key, "exported" if export else "processed")
+            else:
+                error = "{}: {!r}".format(result.failed_stage, result.error)
+                finish(route_key, "failed", error=error)
+    pipeline.log_statistics()
+    if export:
+        log_elevation_statistics()
+
+    return [reports[route_key] for route_key in route_keys]
+
+
+def write_batch_report(reports: List[RouteReport], filename: str):
+    with open(filename, "w", newline="") as open_file:
+        csv_file = csv.writer(open_file)
+        csv_file.writerow(RouteReport._fields)
+        for report in reports:
+            csv_file.writerow(
+                [
+                    round(value, 3) if isinstance(value, float) else value
+                    for value in report
+                ]
+            )
+
+    status_counts = {}
+    for report in reports:
+        status_counts[report.status] = status_counts.get(report.status, 0) + 1
+    logger.info("batch complete %s, report written to %s", status_counts, filename)
+
+
 def main():
-    for area, route_type, route_number in get_csv_data("data/cycle_routes.csv"):
-        try:
-            logger.info("%s %s %s", area, route_type, route_number)
-            process_route_data(area, route_type, route_number)
-        except Exception as error:
-            logger.error("Failed to process route {}".format(route_number))
+    parser = argparse.ArgumentParser(description="Export cycle routes as GPX tracks")
+    parser.add_argument(
+        "--cache-compression",
+        choices=list(COMPRESSIONS.keys()),
+        help="compress new cache entries, existing entries are read in any format",
+    )
+    parser.add_argument(
+        "--dem-directory",
+        help="find elevations from local .hgt or .npy tiles instead of the web api",
+    )
+    parser.add_argument(
+        "--elevation-cache",
+        help="database caching elevations from the web api, an empty path disables it",
+    )
+    parser.add_argument(
+        "--elevation-chunk-size",
+        type=int,
+        help="maximum number of points in each request to the elevation web api",
+    )
+    parser.add_argument(
+        "--elevation-workers",
+        type=int,
+        help="maximum number of requests sent to the elevation web api at once",
+    )
+    parser.add_argument(
+        "--simplify-tolerance",
+        type=float,
+        help="remove track points while the track moves less than this many metres",
+    )
+    parser.add_argument(
+        "--simplify-max-points",
+        type=int,
+        help="keep at most this many of the most important track points",
+    )
+    parser.add_argument(
+        "--simplify-method",
+        choices=[DOUGLAS_PEUCKER, VISVALINGAM],
+        help="track simplification algorithm, douglas-peucker by default",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    route_parser = subparsers.add_parser("route", help="export a single route")
+    route_parser.add_argument("area")
+    route_parser.add_argument("route_type")
+    route_parser.add_argument("route_number")
+    route_parser.add_argument("--plot", action="store_true")
+
+    batch_parser = subparsers.add_parser("batch", help="process a csv of routes")
+    batch_parser.add_argument("--routes", default="data/cycle_routes.csv")
+    batch_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    batch_parser.add_argument("--io-workers", type=int, default=4)
+    batch_parser.add_argument("--export", action="store_true")
+    batch_parser.add_argument("--no-resume", action="store_true")
+    batch_parser.add_argument("--report", default="batch_report.csv")
+    batch_parser.add_argument("--queue-size", type=int, default=4)
+    batch_parser.add_argument("--log-interval", type=float, default=30.0)
+
+    args = parser.parse_args()
+
+    if args.cache_compression is not None:
+        # Set in the environment so worker processes compress their entries too
+        os.environ[COMPRESSION_VARIABLE] = args.cache_compression
+    if args.dem_directory is not None:
+        os.environ[DEM_DIRECTORY_VARIABLE] = args.dem_directory
+    if args.elevation_cache is not None:
+        os.environ[ELEVATION_CACHE_VARIABLE] = args.elevation_cache
+    if args.elevation_chunk_size is not None:
+        os.environ[ELEVATION_CHUNK_SIZE_VARIABLE] = str(args.elevation_chunk_size)
+    if args.elevation_workers is not None:
+        os.environ[ELEVATION_WORKERS_VARIABLE] = str(args.elevation_workers)
+    if args.simplify_tolerance is not None:
+        os.environ[TOLERANCE_VARIABLE] = str(args.simplify_tolerance)
+    if args.simplify_max_points is not None:
+        os.environ[MAX_POINTS_VARIABLE] = str(args.simplify_max_points)
+    if args.simplify_method is not None:
+        os.environ[METHOD_VARIABLE] = args.simplify_method
+
+    if args.command == "batch":
+        route_keys = [tuple(row) for row in get_csv_data(args.routes)]
+        reports = run_batch(
+            route_keys,
+            args.workers,
+            args.io_workers,
+            args.export,
+            not args.no_resume,
+            args.queue_size,
+            args.log_interval,
+        )
+        write_batch_report(reports, args.report)
+    elif args.command == "route":
+        create_route(args.area, args.route_type, args.route_number, args.plot)
+    else:
+        create_route("France", "ncn", "V43")
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
-    create_route("France", "ncn", "V43")
-    # main()
+    main()
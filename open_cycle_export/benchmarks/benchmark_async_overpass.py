@@ -0,0 +1,101 @@
+"""Compare query throughput against a local replay server limiting concurrency
+
+Each client runs the same batch of queries, a quarter of which repeat another query,
+against a server answering after a fixed latency and refusing requests beyond its
+concurrency limit with 429. A fresh cache folder is used for every run.
+
+"""
+
+import json
+import asyncio
+import tempfile
+
+from open_cycle_export.benchmarks.benchmark_tools import time_function, print_table
+from open_cycle_export.route_downloader.replay_server import ReplayServer
+from open_cycle_export.route_downloader.async_query_overpass import (
+    AsyncOverpassClient,
+    query_overpass_all,
+)
+
+QUERY_COUNT = 40
+LATENCY = 0.05
+SERVER_CONCURRENCY = 4
+
+
+def create_queries():
+    unique_count = QUERY_COUNT * 3 // 4
+    return [
+        'relation["ref"="{}"];way(r);'.format(index % unique_count)
+        for index in range(QUERY_COUNT)
+    ]
+
+
+def run_queries(replay_server, queries, max_concurrent, sequential):
+    with tempfile.TemporaryDirectory() as cache_folder:
+        client = AsyncOverpassClient(
+            endpoint=replay_server.endpoint,
+            max_concurrent=max_concurrent,
+            backoff=LATENCY,
+            cache_folder=cache_folder,
+        )
+        loop = asyncio.new_event_loop()
+        try:
+            if sequential:
+                for query in queries:
+                    loop.run_until_complete(client.query(query))
+            else:
+                loop.run_until_complete(query_overpass_all(client, queries))
+        finally:
+            loop.close()
+    return client.statistics
+
+
+def main():
+    queries = create_queries()
+    rows = []
+    with tempfile.TemporaryDirectory() as responses_folder:
+        with ReplayServer(
+            responses_folder,
+            default_response=json.dumps({"elements": []}),
+            latency=LATENCY,
+            max_concurrent=SERVER_CONCURRENCY,
+        ) as replay_server:
+            clients = [("sequential", 1, True)] + [
+                ("async", max_concurrent, False) for max_concurrent in [1, 4, 8]
+            ]
+            for name, max_concurrent, sequential in clients:
+                elapsed, statistics = time_function(
+                    run_queries,
+                    replay_server,
+                    queries,
+                    max_concurrent,
+                    sequential,
+                    repeat=1,
+                )
+                rows.append(
+                    [
+                        name,
+                        max_concurrent,
+                        elapsed,
+                        len(queries) / elapsed,
+                        statistics.request_count,
+                        statistics.coalesced_count + statistics.cache_hit_count,
+                        statistics.retry_count,
+                    ]
+                )
+    print_table(
+        [
+            "client",
+            "concurrent",
+            "time (s)",
+            "queries/s",
+            "requests",
+            "shared",
+            "retries",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
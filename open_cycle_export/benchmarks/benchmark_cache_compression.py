@@ -0,0 +1,120 @@
+"""Compare disk usage and load time of cache entries in each compression format
+
+Fixtures are sized like real cache entries: the GeoJSON of a national route queried
+with geom verbosity and the towns and cities of the United Kingdom. Paths of real
+cache entries can be given as arguments to benchmark them as well.
+
+    python -m open_cycle_export.benchmarks.benchmark_cache_compression .cache/*.json
+
+"""
+
+import os
+import sys
+import json
+import random
+import tempfile
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    create_synthetic_ways,
+    print_table,
+)
+from open_cycle_export.cache_utilities.atomic_cache import (
+    store_json_atomic,
+    read_json_entry,
+)
+from open_cycle_export.cache_utilities.compression import COMPRESSIONS
+
+
+def create_route_fixture(way_count: int):
+    "GeoJSON like a route query with geom verbosity"
+
+    ways = create_synthetic_ways(way_count)
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {
+                    "type": "way",
+                    "id": 10000000 + index,
+                    "tags": {"highway": "unclassified", "surface": "asphalt"},
+                    "nodes": list(range(index * 100, index * 100 + len(way.coords))),
+                },
+                "geometry": {
+                    "type": "LineString",
+                    "coordinates": [[round(x, 7), round(y, 7)] for x, y in way.coords],
+                },
+            }
+            for index, way in enumerate(ways)
+        ],
+    }
+
+
+def create_places_fixture(place_count: int):
+    "GeoJSON like the places query for the United Kingdom"
+
+    random.seed(0)
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {
+                    "type": "node",
+                    "id": 20000000 + index,
+                    "tags": {
+                        "name": "Place {}".format(index),
+                        "place": random.choice(["town", "city"]),
+                        "population": str(random.randint(1000, 1000000)),
+                        "wikidata": "Q{}".format(random.randint(1, 10000000)),
+                    },
+                },
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [
+                        round(random.uniform(-8, 2), 7),
+                        round(random.uniform(50, 59), 7),
+                    ],
+                },
+            }
+            for index in range(place_count)
+        ],
+    }
+
+
+def main():
+    fixtures = [
+        ("route 20k ways", create_route_fixture(20000)),
+        ("places 5k", create_places_fixture(5000)),
+    ]
+    for file_path in sys.argv[1:]:
+        fixtures.append((os.path.basename(file_path), read_json_entry(file_path)))
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for fixture_name, data in fixtures:
+            plain_size = None
+            for name in COMPRESSIONS.keys():
+                file_path = os.path.join(directory, "entry.json")
+                store_elapsed, entry_path = time_function(
+                    store_json_atomic, file_path, data, name, repeat=1
+                )
+                load_elapsed, _ = time_function(read_json_entry, file_path)
+                size = os.path.getsize(entry_path)
+                plain_size = plain_size or size
+                rows.append(
+                    [
+                        fixture_name,
+                        name,
+                        size,
+                        size / plain_size,
+                        store_elapsed,
+                        load_elapsed,
+                    ]
+                )
+    print_table(["fixture", "format", "bytes", "ratio", "store (s)", "load (s)"], rows)
+
+
+if __name__ == "__main__":
+    main()
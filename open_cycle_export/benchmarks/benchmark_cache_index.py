@@ -0,0 +1,85 @@
+"""Compare finding cache entries through the SQLite index and by probing the folder
+
+Probing checks for an entry in every compression format while the index finds its
+path with one lookup. Hits look up entries stored compressed, the worst case for
+probing, first with a new index and then again once the index remembers their
+paths. Misses look up keys which were never stored. The folder is in the page cache
+here, the best case for probing.
+
+"""
+
+import os
+import tempfile
+
+from open_cycle_export.benchmarks.benchmark_tools import time_function, print_table
+from open_cycle_export.cache_utilities.cache_index import CacheIndex
+from open_cycle_export.cache_utilities.compression import find_entry_path, COMPRESSIONS
+
+LOOKUP_COUNT = 2000
+
+
+def create_entries(folder: str, entry_count: int):
+    extension = list(COMPRESSIONS.values())[-1].extension
+    for index in range(entry_count):
+        with open(os.path.join(folder, "{}.json{}".format(index, extension)), "w"):
+            pass
+
+
+def probe_entries(folder: str, keys):
+    return [find_entry_path(os.path.join(folder, key)) for key in keys]
+
+
+def time_first_lookups(database_path: str, keys, repeat: int = 3) -> float:
+    "Best time to look up keys with a new index, not counting opening or closing it"
+
+    best_elapsed = float("inf")
+    for _ in range(repeat):
+        cache_index = CacheIndex(database_path)
+        elapsed, _ = time_function(
+            lambda: [cache_index.lookup(key) for key in keys], repeat=1
+        )
+        best_elapsed = min(best_elapsed, elapsed)
+        cache_index.close()
+    return best_elapsed
+
+
+def lookup_entries(cache_index: CacheIndex, keys):
+    return [cache_index.lookup(key) for key in keys]
+
+
+def main():
+    rows = []
+    for entry_count in [1000, 20000]:
+        with tempfile.TemporaryDirectory() as folder:
+            create_entries(folder, entry_count)
+            database_path = os.path.join(folder, "index.sqlite")
+            cache_index = CacheIndex(database_path)
+            hit_keys = [
+                "{}.json".format(index * 7919 % entry_count)
+                for index in range(LOOKUP_COUNT)
+            ]
+            miss_keys = [
+                "missing{}.json".format(index) for index in range(LOOKUP_COUNT)
+            ]
+            repeat_elapsed, _ = time_function(lookup_entries, cache_index, hit_keys)
+            lookups = [
+                ("hit", hit_keys, time_first_lookups(database_path, hit_keys)),
+                ("repeat hit", hit_keys, repeat_elapsed),
+                ("miss", miss_keys, time_first_lookups(database_path, miss_keys)),
+            ]
+            for name, keys, index_elapsed in lookups:
+                probe_elapsed, _ = time_function(probe_entries, folder, keys)
+                rows.append(
+                    [
+                        entry_count,
+                        name,
+                        probe_elapsed / LOOKUP_COUNT * 1e6,
+                        index_elapsed / LOOKUP_COUNT * 1e6,
+                    ]
+                )
+            cache_index.close()
+    print_table(["entries", "lookup", "probe (µs)", "index (µs)"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compare waypoint graph size, processing time and routing time with and without
+contracting chains of line segments between junctions
+
+Both graphs are routed between the same pair of dead ends. Waypoints bridging gaps
+to other parts of the route are never contracted, so the cost only differs where the
+full graph takes a straight line shortcut between two parts of the same connected
+ways, which the synthetic route does as it meanders back on itself.
+
+"""
+
+import numpy
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    create_synthetic_ways,
+    print_table,
+)
+from open_cycle_export.shapely_utilities.immutable_point import ImmutablePoint
+from open_cycle_export.route_processor.routing_algorithm import heap_route_creator
+from open_cycle_export.route_processor.way_processor import process_ways_to_graph
+
+
+def find_route_cost(waypoint_graph, route):
+    return sum(
+        waypoint_graph.edge_costs[waypoint_graph.find_edge(i_a, i_b)]
+        for i_a, i_b in zip(route[:-1], route[1:])
+    )
+
+
+def main():
+    rows = []
+    for way_count, gap_every in [(500, 0), (500, 20), (5000, 0), (5000, 20)]:
+        ways = create_synthetic_ways(way_count, gap_every=gap_every)
+        coefficients = [1] * way_count
+        keep_coordinates = numpy.array([ways[0].coords[0], ways[-1].coords[-1]])
+        for contract in [False, True]:
+            elapsed, waypoint_graph = time_function(
+                process_ways_to_graph,
+                ways,
+                coefficients,
+                coefficients,
+                1000,
+                contract=contract,
+                keep_coordinates=keep_coordinates,
+                repeat=1,
+            )
+            start, end = [
+                waypoint_graph.find_waypoint(ImmutablePoint(*coordinates))
+                for coordinates in keep_coordinates
+            ]
+            create_route = heap_route_creator(*waypoint_graph.edge_arrays)
+            route_elapsed, route = time_function(create_route, start, end)
+            rows.append(
+                [
+                    way_count,
+                    gap_every or "-",
+                    "yes" if contract else "no",
+                    waypoint_graph.waypoint_count,
+                    waypoint_graph.edge_count,
+                    elapsed,
+                    route_elapsed,
+                    round(find_route_cost(waypoint_graph, route), 6),
+                ]
+            )
+    headers = ["ways", "gap every", "contract", "waypoints", "edges"]
+    print_table(headers + ["process (s)", "route (s)", "cost"], rows)
+
+
+if __name__ == "__main__":
+    main()
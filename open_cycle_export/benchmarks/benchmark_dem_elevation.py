@@ -0,0 +1,52 @@
+"""Time finding elevations of long routes from local SRTM tiles
+
+Synthetic 3 arc second tiles are written around the synthetic route, which crosses
+tile boundaries in southern England. Timings are for the first route, which maps
+the tiles, and for later routes with the tiles already mapped.
+
+"""
+
+import os
+import tempfile
+
+import numpy
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    create_synthetic_route_coordinates,
+    print_table,
+)
+from open_cycle_export.route_exporter.dem_elevation_finder import (
+    get_tile_name,
+    create_dem_elevation_finder,
+)
+
+SAMPLE_COUNT = 1201
+
+
+def write_tiles(directory: str, coordinates: numpy.ndarray):
+    random_state = numpy.random.RandomState(0)
+    tiles = set(map(tuple, numpy.floor(coordinates[:, ::-1]).astype(int).tolist()))
+    for tile_latitude, tile_longitude in tiles:
+        samples = random_state.randint(0, 1000, (SAMPLE_COUNT, SAMPLE_COUNT))
+        tile_name = get_tile_name(tile_latitude, tile_longitude)
+        samples.astype(">i2").tofile(os.path.join(directory, tile_name + ".hgt"))
+    return len(tiles)
+
+
+def main():
+    rows = []
+    for point_count in [10000, 100000, 1000000]:
+        coordinates = create_synthetic_route_coordinates(point_count, step=0.0002)
+        with tempfile.TemporaryDirectory() as directory:
+            tile_count = write_tiles(directory, coordinates)
+            find_elevations = create_dem_elevation_finder(directory)
+            first_elapsed, _ = time_function(find_elevations, coordinates, repeat=1)
+            elapsed, elevations = time_function(find_elevations, coordinates)
+            assert None not in elevations
+            rows.append([point_count, tile_count, first_elapsed, elapsed])
+    print_table(["points", "tiles", "first route (s)", "later routes (s)"], rows)
+
+
+if __name__ == "__main__":
+    main()
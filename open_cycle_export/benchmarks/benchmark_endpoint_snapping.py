@@ -0,0 +1,59 @@
+"""Compare waypoint graph size and processing time with and without endpoint snapping
+
+Messy relations are simulated by moving the start of every way up to half a metre
+away from the end of the previous way.
+
+"""
+
+import numpy
+from shapely.geometry import LineString
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    create_synthetic_ways,
+    print_table,
+)
+from open_cycle_export.route_processor.way_processor import process_ways_to_graph
+
+JITTER_DEGREES = 0.5 / 111000
+
+
+def create_messy_ways(way_count: int, seed: int = 0):
+    random_state = numpy.random.RandomState(seed)
+    ways = create_synthetic_ways(way_count, gap_every=0)
+    jitter = random_state.uniform(-JITTER_DEGREES, JITTER_DEGREES, (way_count, 2))
+    return [
+        LineString([numpy.add(way.coords[0], offset), *way.coords[1:]])
+        for way, offset in zip(ways, jitter)
+    ]
+
+
+def main():
+    rows = []
+    for way_count in [500, 2000, 5000]:
+        ways = create_messy_ways(way_count)
+        coefficients = [1] * way_count
+        for snap_tolerance in [None, 1.0]:
+            elapsed, waypoint_graph = time_function(
+                process_ways_to_graph,
+                ways,
+                coefficients,
+                coefficients,
+                1000,
+                snap_tolerance=snap_tolerance,
+                repeat=1,
+            )
+            rows.append(
+                [
+                    way_count,
+                    snap_tolerance or "-",
+                    waypoint_graph.waypoint_count,
+                    waypoint_graph.edge_count,
+                    elapsed,
+                ]
+            )
+    print_table(["ways", "snap (m)", "waypoints", "edges", "time (s)"], rows)
+
+
+if __name__ == "__main__":
+    main()
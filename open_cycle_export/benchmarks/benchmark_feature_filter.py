@@ -0,0 +1,75 @@
+"""Compare filtering route features by building and testing every geometry
+
+The reference builds a shapely geometry for every feature and tests it against an
+unprepared polygon, as filter_features once did. The filter screens features by
+bounding box and tests the rest against a prepared polygon. Grouping by many city
+polygons is compared with filtering once for each city.
+
+"""
+
+import shapely.geometry
+from shapely.geometry import Point
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    print_table,
+    create_synthetic_ways,
+)
+from open_cycle_export.shapely_utilities.feature_filter import (
+    filter_features,
+    group_features_by_polygon,
+)
+
+WAY_COUNT = 50000
+CITY_COUNT = 20
+
+
+def create_way_features():
+    return [
+        {
+            "type": "Feature",
+            "geometry": shapely.geometry.mapping(way),
+            "properties": {"highway": "cycleway"},
+        }
+        for way in create_synthetic_ways(WAY_COUNT, points_per_way=8)
+    ]
+
+
+def create_city_polygons(features):
+    "Detailed circular boundaries around points spread along the ways"
+
+    step = len(features) // CITY_COUNT
+    return [
+        Point(features[index]["geometry"]["coordinates"][0]).buffer(0.02, 64)
+        for index in range(0, len(features), step)
+    ]
+
+
+def filter_unprepared(features, polygon):
+    return [
+        feature
+        for feature in features
+        if shapely.geometry.shape(feature["geometry"]).intersects(polygon)
+    ]
+
+
+def main():
+    features = create_way_features()
+    polygons = create_city_polygons(features)
+    filters = [("unprepared", filter_unprepared), ("screened", filter_features)]
+    rows = []
+    for name, function in filters:
+        elapsed, filtered = time_function(function, features, polygons[0], repeat=1)
+        rows.append(["filter " + name, 1, elapsed, len(filtered)])
+    for name, function in filters:
+        elapsed, groups = time_function(
+            lambda: [function(features, polygon) for polygon in polygons], repeat=1
+        )
+        rows.append(["per city " + name, len(polygons), elapsed, sum(map(len, groups))])
+    elapsed, groups = time_function(group_features_by_polygon, features, polygons)
+    rows.append(["grouped", len(polygons), elapsed, sum(map(len, groups))])
+    print_table(["method", "polygons", "time (s)", "features kept"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Compare waypoint distance searches with the per pair geometry reference
+
+The reference finds the distance of every pair of waypoints with a shapely
+distance call, as process_ways did, and takes the argmax of the whole matrix. The
+scan compares every pair in chunks and the hull search only compares convex hull
+vertices. The broadcast finds the full matrix in float32 with one array operation.
+
+"""
+
+import numpy
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    print_table,
+    create_synthetic_route_coordinates,
+)
+from open_cycle_export.route_processor.point_distances import (
+    find_distance_matrix,
+    find_furthest_pair,
+)
+from open_cycle_export.shapely_utilities.immutable_point import ImmutablePoint
+
+# The shapely reference and the scan grow with the square of the waypoint count, so
+# they are only timed on the smaller waypoint counts
+REFERENCE_LIMIT = 2000
+SCAN_LIMIT = 10000
+
+
+def find_reference_furthest_pair(waypoints):
+    waypoint_distances = numpy.array(
+        [[w_a.distance(w_b) for w_b in waypoints] for w_a in waypoints]
+    )
+    max_flat_index = numpy.argmax(waypoint_distances)
+    return numpy.unravel_index(max_flat_index, waypoint_distances.shape)
+
+
+def find_scanned_furthest_pair(coordinates, chunk_size=256):
+    furthest_pair, furthest_distance = (0, 0), -1
+    x, y = coordinates[:, 0], coordinates[:, 1]
+    for start in range(0, len(coordinates), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        squared_distances = (x[chunk, numpy.newaxis] - x) ** 2 + (
+            y[chunk, numpy.newaxis] - y
+        ) ** 2
+        i, j = numpy.unravel_index(
+            numpy.argmax(squared_distances), squared_distances.shape
+        )
+        if squared_distances[i, j] > furthest_distance:
+            furthest_pair = (start + int(i), int(j))
+            furthest_distance = squared_distances[i, j]
+    return furthest_pair
+
+
+def main():
+    rows = []
+    for waypoint_count in [1000, 2000, 10000, 100000]:
+        coordinates = create_synthetic_route_coordinates(waypoint_count)
+        furthest_pair = None
+        searches = [("hull", find_furthest_pair, coordinates)]
+        if waypoint_count <= SCAN_LIMIT:
+            searches.insert(0, ("scan", find_scanned_furthest_pair, coordinates))
+        if waypoint_count <= REFERENCE_LIMIT:
+            waypoints = [ImmutablePoint(*point) for point in coordinates.tolist()]
+            searches.insert(0, ("shapely", find_reference_furthest_pair, waypoints))
+        for name, function, points in searches:
+            elapsed, pair = time_function(function, points, repeat=1)
+            pair = tuple(int(index) for index in pair)
+            if furthest_pair is None:
+                furthest_pair = pair
+            is_same = pair == furthest_pair
+            rows.append(["furthest " + name, waypoint_count, elapsed, is_same])
+        if waypoint_count <= SCAN_LIMIT:
+            elapsed, _ = time_function(find_distance_matrix, coordinates)
+            rows.append(["matrix broadcast", waypoint_count, elapsed, True])
+    print_table(["method", "waypoints", "time (s)", "same pair"], rows)
+
+
+if __name__ == "__main__":
+    main()
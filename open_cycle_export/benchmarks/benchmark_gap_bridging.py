@@ -0,0 +1,184 @@
+"""Compare nearest neighbour gap bridging with the complete graph reference
+
+The complete graph reference is process_ways with the dense route creator, every
+waypoint pair is connected by a straight line when no way joins them.
+
+Routes broken into many fragments, further apart than the nearest neighbours of
+their waypoints, are joined by component bridges. These are compared with joining
+the smallest component to its closest outside waypoint one component at a time.
+
+"""
+
+import numpy
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    create_synthetic_ways,
+    print_table,
+)
+from open_cycle_export.route_processor.route_processor import (
+    create_line_strings,
+    create_way_coefficients,
+)
+from open_cycle_export.route_processor.routing_algorithm import (
+    route_creator,
+    heap_route_creator,
+)
+from open_cycle_export.route_processor.way_processor import (
+    process_ways,
+    process_ways_to_graph,
+    find_dead_ends,
+    find_component_bridges,
+)
+from open_cycle_export.route_processor.waypoint_graph import find_connected_components
+from open_cycle_export.spatial_index.grid_index import GridIndex, estimate_cell_size
+from open_cycle_export.shapely_utilities.immutable_point import ImmutablePoint
+from open_cycle_export.test_data.test_data_loader import load_test_data
+
+UNCONNECTED_COEFFICIENT = 1000
+
+WAYS_PER_FRAGMENT = 10
+PER_COMPONENT_FRAGMENT_LIMIT = 300
+
+
+def complete_graph_route(ways, forward_coefficients, reverse_coefficients, ends):
+    waypoints, _, _, costs_matrix = process_ways(
+        ways, forward_coefficients, reverse_coefficients, UNCONNECTED_COEFFICIENT
+    )
+    start, end = [waypoints.index(waypoint) for waypoint in ends]
+    route = route_creator(list(range(len(waypoints))), costs_matrix)(start, end)
+    return sum(costs_matrix[route[i - 1]][route[i]] for i in range(1, len(route)))
+
+
+def sparse_graph_route(ways, forward_coefficients, reverse_coefficients, ends, **kw):
+    waypoint_graph = process_ways_to_graph(
+        ways, forward_coefficients, reverse_coefficients, UNCONNECTED_COEFFICIENT, **kw
+    )
+    start, end = [waypoint_graph.find_waypoint(waypoint) for waypoint in ends]
+    route = heap_route_creator(*waypoint_graph.edge_arrays)(start, end)
+    edges = [
+        waypoint_graph.find_edge(route[i - 1], route[i]) for i in range(1, len(route))
+    ]
+    return float(waypoint_graph.edge_costs[edges].sum())
+
+
+def benchmark_ways(name, ways, forward_coefficients, reverse_coefficients, ends):
+    arguments = (ways, forward_coefficients, reverse_coefficients, ends)
+    rows = []
+    if len(ways) <= 500:
+        elapsed, cost = time_function(complete_graph_route, *arguments, repeat=1)
+        rows.append([name, len(ways), "complete", elapsed, cost])
+    for mode, options in [
+        ("k=8", dict(gap_neighbour_count=8)),
+        ("k=2", dict(gap_neighbour_count=2)),
+        ("r=0.002", dict(gap_radius=0.002)),
+    ]:
+        elapsed, cost = time_function(
+            sparse_graph_route, *arguments, repeat=1, **options
+        )
+        rows.append([name, len(ways), mode, elapsed, cost])
+    return rows
+
+
+def find_component_bridges_per_component(
+    coordinates, edge_sources, edge_targets, is_dead_end
+):
+    "Reference joining the smallest component to its closest outside waypoint"
+
+    labels = find_connected_components(len(coordinates), edge_sources, edge_targets)
+    bridge_count = 0
+    while labels.max(initial=0) > 0:
+        component = numpy.argmin(numpy.bincount(labels))
+        is_inside = labels == component
+        inside, outside = numpy.flatnonzero(is_inside), numpy.flatnonzero(~is_inside)
+        dead_ends = inside[is_dead_end[inside]]
+        search_points = dead_ends if len(dead_ends) else inside
+        grid_index = GridIndex(
+            coordinates[outside], estimate_cell_size(coordinates[outside], 4)
+        )
+        queries, indexes = grid_index.query_nearest(coordinates[search_points], 1)
+        offsets = coordinates[search_points[queries]] - coordinates[outside[indexes]]
+        target = outside[indexes[numpy.argmin((offsets ** 2).sum(axis=1))]]
+        labels[is_inside] = labels[target]
+        labels = numpy.unique(labels, return_inverse=True)[1].reshape(-1)
+        bridge_count += 1
+    return bridge_count
+
+
+def create_fragments(fragment_count):
+    "Chains of waypoints along a route with every other run of ways left out"
+
+    ways = create_synthetic_ways(2 * fragment_count * WAYS_PER_FRAGMENT, gap_every=0)
+    fragments = [
+        numpy.concatenate(
+            [
+                numpy.array(way.coords)[:-1]
+                for way in ways[start : start + WAYS_PER_FRAGMENT]
+            ]
+        )
+        for start in range(0, len(ways), 2 * WAYS_PER_FRAGMENT)
+    ]
+    coordinates = numpy.concatenate(fragments)
+    is_chained = numpy.ones(len(coordinates) - 1, dtype=bool)
+    is_chained[numpy.cumsum([len(fragment) for fragment in fragments])[:-1] - 1] = False
+    edge_sources = numpy.flatnonzero(is_chained)
+    return coordinates, edge_sources, edge_sources + 1
+
+
+def benchmark_fragments():
+    rows = []
+    for fragment_count in [30, 100, 300, 1000, 3000]:
+        coordinates, edge_sources, edge_targets = create_fragments(fragment_count)
+        arguments = (
+            coordinates,
+            edge_sources,
+            edge_targets,
+            find_dead_ends(len(coordinates), edge_sources, edge_targets),
+        )
+        per_component_elapsed = "-"
+        if fragment_count <= PER_COMPONENT_FRAGMENT_LIMIT:
+            per_component_elapsed, _ = time_function(
+                find_component_bridges_per_component, *arguments, repeat=1
+            )
+        elapsed, (bridge_sources, _) = time_function(find_component_bridges, *arguments)
+        rows.append(
+            [
+                fragment_count,
+                len(coordinates),
+                per_component_elapsed,
+                elapsed,
+                len(bridge_sources),
+            ]
+        )
+    print_table(
+        ["fragments", "waypoints", "per component (s)", "bridges (s)", "bridges"], rows,
+    )
+
+
+def main():
+    rows = []
+
+    features = load_test_data("test_route_processor_roundabout_data.json")
+    ways = create_line_strings(features)
+    forward_coefficients, reverse_coefficients = create_way_coefficients(features)
+    ends = [ImmutablePoint(-0.943355, 50.996674), ImmutablePoint(-0.942682, 50.996912)]
+    rows += benchmark_ways(
+        "roundabout", ways, forward_coefficients, reverse_coefficients, ends
+    )
+
+    for way_count in [100, 300, 1000]:
+        ways = create_synthetic_ways(way_count)
+        coefficients = [1] * way_count
+        ends = [
+            ImmutablePoint(*ways[0].coords[0]),
+            ImmutablePoint(*ways[-1].coords[-1]),
+        ]
+        rows += benchmark_ways("synthetic", ways, coefficients, coefficients, ends)
+
+    print_table(["data", "ways", "gap bridging", "time (s)", "route cost"], rows)
+    print()
+    benchmark_fragments()
+
+
+if __name__ == "__main__":
+    main()
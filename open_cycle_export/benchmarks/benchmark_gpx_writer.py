@@ -0,0 +1,75 @@
+"""Compare writing a GPX file through gpxpy with the streaming writer
+
+Both writers produce the same file. Peak memory is measured with tracemalloc in a
+separate run from the timing, as tracing slows allocation heavy code.
+
+"""
+
+import os
+import tempfile
+import tracemalloc
+
+import numpy
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    print_table,
+    create_synthetic_route_coordinates,
+)
+from open_cycle_export.route_exporter.route_exporter import (
+    generate_gpx_file,
+    write_gpx_track,
+)
+
+
+def write_gpxpy(file_path, coordinates, elevations):
+    gpx_data = generate_gpx_file(coordinates, elevations)
+    with open(file_path, "w") as open_file:
+        open_file.write(gpx_data)
+
+
+def write_streaming(file_path, coordinates, elevations):
+    with open(file_path, "w") as open_file:
+        write_gpx_track(open_file, coordinates, elevations)
+
+
+def measure_peak_memory(function, *args):
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    writers = [("gpxpy", write_gpxpy), ("streaming", write_streaming)]
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for point_count in [10000, 100000, 300000]:
+            coordinates = create_synthetic_route_coordinates(point_count).tolist()
+            elevations = numpy.random.RandomState(0).uniform(0, 500, point_count)
+            elevations = elevations.tolist()
+            for name, writer in writers:
+                file_path = os.path.join(directory, name + ".gpx")
+                elapsed, _ = time_function(writer, file_path, coordinates, elevations)
+                peak_memory = measure_peak_memory(
+                    writer, file_path, coordinates, elevations
+                )
+                rows.append(
+                    [
+                        name,
+                        point_count,
+                        elapsed,
+                        point_count / elapsed,
+                        peak_memory / 2 ** 20,
+                        os.path.getsize(file_path) / 2 ** 20,
+                    ]
+                )
+    print_table(
+        ["writer", "points", "time (s)", "points/s", "peak (MiB)", "file (MiB)"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
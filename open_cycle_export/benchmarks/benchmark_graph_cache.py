@@ -0,0 +1,149 @@
+"""Compare saving and loading a waypoint graph as JSON and as memory mapped arrays
+
+Loading is timed both for the graph alone and for the graph plus building the line
+strings of a sample of edges, the work needed before a cached route can be drawn.
+
+Drawing a route from the cache is then run in a fresh process for each format, so
+its peak resident set size can be reported. Cold time covers loading the graph and
+creating the route line string, which builds only the line strings of the edges on
+the route, and warm time covers creating the same route line string again.
+
+"""
+
+import os
+import json
+import time
+import resource
+import tempfile
+import multiprocessing
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    create_synthetic_ways,
+    print_table,
+)
+from open_cycle_export.route_processor.route_processor import (
+    create_graph_route_line_string,
+)
+from open_cycle_export.route_processor.routing_algorithm import heap_route_creator
+from open_cycle_export.route_processor.way_processor import process_ways_to_graph
+from open_cycle_export.route_processor.waypoint_graph import (
+    WaypointGraph,
+    save_waypoint_graph,
+    load_waypoint_graph,
+)
+
+
+def save_json(waypoint_graph: WaypointGraph, file_path: str):
+    with open(file_path, "w") as open_file:
+        json.dump(waypoint_graph.to_dict(), open_file)
+
+
+def load_json(file_path: str) -> WaypointGraph:
+    with open(file_path) as open_file:
+        return WaypointGraph.from_dict(json.load(open_file))
+
+
+def get_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(get_size(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def load_with_connections(load_function, path):
+    "Load a graph and build the line strings of every tenth edge"
+
+    waypoint_graph = load_function(path)
+    for edge in range(0, waypoint_graph.edge_count, 10):
+        edge_path = waypoint_graph.edge_paths[edge]
+        if edge_path >= 0:
+            waypoint_graph.get_path_line_strings(edge_path)
+    return waypoint_graph
+
+
+def load_in_memory(directory: str) -> WaypointGraph:
+    return load_waypoint_graph(directory, mmap_mode=None)
+
+
+def get_peak_rss() -> float:
+    "Peak resident set size of this process in megabytes"
+
+    # ru_maxrss keeps the peak of the parent across fork and exec, VmHWM does not
+    try:
+        with open("/proc/self/status") as open_file:
+            for line in open_file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def draw_route(load_function, path: str, route):
+    "Cold and warm route line string times and peak RSS in megabytes"
+
+    start = time.perf_counter()
+    waypoint_graph = load_function(path)
+    create_graph_route_line_string(waypoint_graph, route)
+    cold_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    create_graph_route_line_string(waypoint_graph, route)
+    warm_elapsed = time.perf_counter() - start
+
+    return cold_elapsed, warm_elapsed, get_peak_rss()
+
+
+def main():
+    rows, route_rows = [], []
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as directory:
+        for way_count in [1000, 10000]:
+            ways = create_synthetic_ways(way_count)
+            coefficients = [1] * way_count
+            waypoint_graph = process_ways_to_graph(
+                ways, coefficients, coefficients, 1000
+            )
+            create_route = heap_route_creator(*waypoint_graph.edge_arrays)
+            route = create_route(0, waypoint_graph.waypoint_count - 1)
+            formats = [
+                ("json", save_json, load_json, ".json"),
+                ("npy", save_waypoint_graph, load_in_memory, ".graph"),
+                ("npy mmap", save_waypoint_graph, load_waypoint_graph, ".graph"),
+            ]
+            for name, save_function, load_function, extension in formats:
+                path = os.path.join(directory, str(way_count) + extension)
+                save_elapsed, _ = time_function(save_function, waypoint_graph, path)
+                load_elapsed, _ = time_function(load_function, path)
+                draw_elapsed, _ = time_function(
+                    load_with_connections, load_function, path
+                )
+                rows.append(
+                    [
+                        way_count,
+                        name,
+                        get_size(path),
+                        save_elapsed,
+                        load_elapsed,
+                        draw_elapsed,
+                    ]
+                )
+                with context.Pool(1) as pool:
+                    cold, warm, peak_rss = pool.apply(
+                        draw_route, (load_function, path, route)
+                    )
+                route_rows.append(
+                    [way_count, name, len(route) - 1, cold, warm, round(peak_rss, 1)]
+                )
+    print_table(
+        ["ways", "format", "bytes", "save (s)", "load (s)", "load + lines (s)"], rows
+    )
+    print()
+    print_table(
+        ["ways", "format", "edges", "cold (s)", "warm (s)", "peak RSS (MB)"],
+        route_rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
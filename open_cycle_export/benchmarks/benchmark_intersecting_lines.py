@@ -0,0 +1,38 @@
+"""Compare finding intersecting ways with a spatial index against testing every pair"""
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    create_synthetic_ways,
+    print_table,
+)
+from open_cycle_export.route_processor.way_processor import (
+    find_intersecting_lines,
+    find_intersecting_lines_pairwise,
+)
+
+PAIRWISE_WAY_LIMIT = 2000
+
+
+def count_intersections(intersecting_lines):
+    return sum(map(len, intersecting_lines))
+
+
+def main():
+    rows = []
+    for way_count in [100, 500, 1000, 2000, 5000, 10000, 20000]:
+        ways = create_synthetic_ways(way_count)
+        indexed_time, result = time_function(find_intersecting_lines, ways, repeat=1)
+        pairwise_time = "-"
+        if way_count <= PAIRWISE_WAY_LIMIT:
+            pairwise_time, expected = time_function(
+                find_intersecting_lines_pairwise, ways, repeat=1
+            )
+            assert result == expected
+        rows.append(
+            [way_count, pairwise_time, indexed_time, count_intersections(result)]
+        )
+    print_table(["ways", "pairwise (s)", "indexed (s)", "intersections"], rows)
+
+
+if __name__ == "__main__":
+    main()
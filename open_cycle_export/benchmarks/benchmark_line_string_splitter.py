@@ -0,0 +1,63 @@
+"""Compare single pass line splitting with recursive splitting for long ways"""
+
+import numpy
+from shapely.geometry import Point, LineString
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    create_synthetic_route_coordinates,
+    print_table,
+)
+from open_cycle_export.shapely_utilities.line_string_splitter import (
+    split_line_at_points,
+    split_line_at_points_recursive,
+)
+
+
+def create_break_points(coordinates: numpy.ndarray, count: int, seed: int = 0):
+    "Break points alternating between vertices and segment midpoints"
+
+    random_state = numpy.random.RandomState(seed)
+    vertex_indexes = random_state.choice(len(coordinates) - 2, count, replace=False) + 1
+    midpoints = (coordinates[vertex_indexes] + coordinates[vertex_indexes + 1]) / 2
+    is_vertex = numpy.arange(count) % 2 == 0
+    break_coordinates = numpy.where(
+        is_vertex[:, numpy.newaxis], coordinates[vertex_indexes], midpoints
+    )
+    return [Point(coordinate) for coordinate in break_coordinates]
+
+
+def time_recursive_split(line, points):
+    try:
+        return time_function(split_line_at_points_recursive, line, points, repeat=1)
+    except RecursionError:
+        return "recursion limit", None
+
+
+def main():
+    coordinates = create_synthetic_route_coordinates(2000)
+    line = LineString(coordinates)
+    rows = []
+    for break_count in [10, 100, 300, 600, 1000]:
+        points = create_break_points(coordinates, break_count)
+        recursive_time, expected_lines = time_recursive_split(line, points)
+        single_pass_time, split_lines = time_function(
+            split_line_at_points, line, points
+        )
+        is_equal = (
+            "-"
+            if expected_lines is None
+            else all(
+                split_line.equals(expected_line)
+                for split_line, expected_line in zip(split_lines, expected_lines)
+            )
+            and len(split_lines) == len(expected_lines)
+        )
+        rows.append([break_count, recursive_time, single_pass_time, is_equal])
+    print_table(
+        ["break points", "recursive (s)", "single pass (s)", "same lines"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compare naming routes by a linear search of places with the place index
+
+The linear search finds the closest place to each route end with a shapely distance
+call per place, as every route once did. The index is built and saved once, then
+loaded and queried with the ends of every route in one batch.
+
+"""
+
+import os
+import tempfile
+
+import numpy
+
+from open_cycle_export.benchmarks.benchmark_tools import time_function, print_table
+from open_cycle_export.shapely_utilities.immutable_point import ImmutablePoint
+from open_cycle_export.spatial_index.place_index import (
+    create_place_index,
+    save_place_index,
+    load_place_index,
+)
+
+ROUTE_COUNT = 245
+
+
+def create_place_features(place_count, seed=0):
+    random_state = numpy.random.RandomState(seed)
+    coordinates = random_state.uniform((-5.5, 50.0), (1.7, 58.5), (place_count, 2))
+    return [
+        {
+            "geometry": {"type": "Point", "coordinates": coordinate},
+            "properties": {"name": "Place {}".format(index)},
+        }
+        for index, coordinate in enumerate(coordinates.tolist())
+    ]
+
+
+def find_linear_names(place_features, coordinates):
+    place_names = [feature["properties"]["name"] for feature in place_features]
+    place_points = [
+        ImmutablePoint(*feature["geometry"]["coordinates"])
+        for feature in place_features
+    ]
+    place_indexes = list(range(len(place_points)))
+    names = []
+    for coordinate in coordinates.tolist():
+        search_point = ImmutablePoint(*coordinate)
+        index = min(place_indexes, key=lambda i: search_point.distance(place_points[i]))
+        names.append(place_names[index])
+    return names
+
+
+def main():
+    rows = []
+    end_coordinates = numpy.random.RandomState(1).uniform(
+        (-5.0, 50.5), (1.5, 58.0), (2 * ROUTE_COUNT, 2)
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for place_count in [1000, 5000, 20000]:
+            place_features = create_place_features(place_count)
+            index_path = os.path.join(directory, "{}.places".format(place_count))
+            elapsed, linear_names = time_function(
+                find_linear_names, place_features, end_coordinates, repeat=1
+            )
+            rows.append(["linear", place_count, elapsed, ""])
+
+            elapsed, place_index = time_function(create_place_index, place_features)
+            save_place_index(place_index, index_path)
+            rows.append(["index build", place_count, elapsed, ""])
+            elapsed, place_index = time_function(load_place_index, index_path)
+            rows.append(["index load", place_count, elapsed, ""])
+            elapsed, names = time_function(
+                place_index.find_nearest_names, end_coordinates
+            )
+            # The index measures metres, so differs from lon/lat where places are close
+            same_fraction = numpy.mean(numpy.array(names) == numpy.array(linear_names))
+            rows.append(["index query", place_count, elapsed, same_fraction])
+    print_table(["method", "places", "time (s)", "same as linear"], rows)
+
+
+if __name__ == "__main__":
+    main()
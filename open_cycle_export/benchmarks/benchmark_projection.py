@@ -0,0 +1,67 @@
+"""Compare projecting ways to a metric CRS one way at a time with one batch
+
+The per way method creates a transformer for each way, as converting each geometry
+separately with a fresh projection does, and the batch method converts the
+coordinates of every way with a single call to the cached transformer.
+
+"""
+
+import numpy
+import pyproj
+from shapely.geometry import LineString
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    print_table,
+    create_synthetic_route_coordinates,
+)
+from open_cycle_export.route_processor.spatial_convertor import (
+    WGS84,
+    BRITISH_NATIONAL_GRID,
+    transform_line_strings,
+)
+
+WAY_LENGTH = 20
+# Creating a transformer takes tens of milliseconds, so the per way method is only
+# timed once on the smaller route sizes
+PER_WAY_LIMIT = 1000
+
+
+def create_ways(way_count):
+    coordinates = create_synthetic_route_coordinates(way_count * (WAY_LENGTH - 1) + 1)
+    return [
+        LineString(coordinates[start : start + WAY_LENGTH])
+        for start in range(0, way_count * (WAY_LENGTH - 1), WAY_LENGTH - 1)
+    ]
+
+
+def transform_each_way(ways):
+    projected_ways = []
+    for way in ways:
+        transformer = pyproj.Transformer.from_crs(
+            WGS84, BRITISH_NATIONAL_GRID, always_xy=True
+        )
+        coordinates = numpy.asarray(way.coords)
+        x, y = transformer.transform(coordinates[:, 0], coordinates[:, 1])
+        projected_ways.append(LineString(numpy.column_stack([x, y])))
+    return projected_ways
+
+
+def transform_batch(ways):
+    return transform_line_strings(ways, WGS84, BRITISH_NATIONAL_GRID)
+
+
+def main():
+    rows = []
+    for way_count in [100, 1000, 10000, 100000]:
+        ways = create_ways(way_count)
+        if way_count <= PER_WAY_LIMIT:
+            elapsed, _ = time_function(transform_each_way, ways, repeat=1)
+            rows.append(["per way", way_count, elapsed, way_count / elapsed])
+        elapsed, _ = time_function(transform_batch, ways)
+        rows.append(["batch", way_count, elapsed, way_count / elapsed])
+    print_table(["method", "ways", "time (s)", "ways/s"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Compare remote elevation lookups for a route exported in both directions
+
+A local stub API answers after a fixed latency plus a time per point, as a server
+looking up each point in its own tiles would. The unchunked finder posts every
+point of a route in one request, as elevations were first requested, and the
+chunked finders split requests over a thread pool. The warm run repeats the
+export with the cache from the previous run.
+
+"""
+
+import json
+import time
+import tempfile
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    print_table,
+    create_synthetic_route_coordinates,
+)
+from open_cycle_export.route_exporter.remote_elevation_finder import (
+    RemoteElevationFinder,
+)
+
+POINT_COUNT = 20000
+LATENCY = 0.05
+POINT_LATENCY = 0.00005
+
+
+class ElevationHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        content_length = int(self.headers.get("Content-Length", 0))
+        locations = json.loads(self.rfile.read(content_length))["locations"]
+        time.sleep(LATENCY + POINT_LATENCY * len(locations))
+        results = [dict(location, elevation=0.0) for location in locations]
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(json.dumps({"results": results}).encode("utf8"))
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+def export_both_directions(find_elevations, coordinates):
+    find_elevations(coordinates)
+    find_elevations(coordinates[::-1])
+
+
+def main():
+    coordinates = create_synthetic_route_coordinates(POINT_COUNT).tolist()
+    http_server = ThreadingHTTPServer(("127.0.0.1", 0), ElevationHandler)
+    http_server.daemon_threads = True
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    endpoint = "http://{}:{}/api/v1/lookup".format(*http_server.server_address[:2])
+
+    finders = [
+        ("unchunked", POINT_COUNT, 1, False),
+        ("chunked", 1000, 1, False),
+        ("chunked", 1000, 4, False),
+        ("cached", 1000, 4, True),
+        ("cached warm", 1000, 4, True),
+    ]
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, chunk_size, workers, cached in finders:
+            find_elevations = RemoteElevationFinder(
+                endpoint,
+                cache_path=directory + "/elevations.sqlite" if cached else None,
+                chunk_size=chunk_size,
+                workers=workers,
+            )
+            elapsed, _ = time_function(
+                export_both_directions, find_elevations, coordinates, repeat=1
+            )
+            statistics = find_elevations.statistics
+            find_elevations.close()
+            rows.append(
+                [
+                    name,
+                    chunk_size,
+                    workers,
+                    elapsed,
+                    statistics.request_count,
+                    statistics.cache_hit_count / statistics.lookup_count,
+                ]
+            )
+    http_server.shutdown()
+    http_server.server_close()
+
+    print_table(
+        ["finder", "chunk size", "workers", "time (s)", "requests", "hit rate"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Compare the dense reference route creator with the heap based route creator
+
+Synthetic routes are chains of waypoints with occasional breaks, gap bridging
+connections exist only between waypoints a few positions apart.
+
+"""
+
+import numpy
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    create_synthetic_route_coordinates,
+    print_table,
+)
+from open_cycle_export.route_processor.routing_algorithm import (
+    route_creator,
+    cost_matrix_to_edge_arrays,
+    heap_route_creator,
+)
+
+
+def create_synthetic_cost_matrix(
+    waypoint_count: int, gap_span: int = 5, unconnected_coefficient: float = 1000
+) -> numpy.ndarray:
+    coordinates = create_synthetic_route_coordinates(waypoint_count)
+    offsets = coordinates[:, numpy.newaxis, :] - coordinates[numpy.newaxis, :, :]
+    distances = numpy.sqrt((offsets ** 2).sum(axis=2))
+    indexes = numpy.arange(waypoint_count)
+    span = numpy.abs(indexes[:, numpy.newaxis] - indexes[numpy.newaxis, :])
+    cost_matrix = numpy.where(span <= gap_span, unconnected_coefficient, numpy.inf)
+    cost_matrix = cost_matrix * distances
+    # Every tenth link of the chain is missing and must be bridged
+    is_connected = (span == 1) & (numpy.minimum.outer(indexes, indexes) % 10 != 9)
+    cost_matrix[is_connected] = distances[is_connected]
+    numpy.fill_diagonal(cost_matrix, 0)
+    return cost_matrix
+
+
+def main():
+    rows = []
+    for waypoint_count in [100, 500, 1000, 2000, 4000]:
+        cost_matrix = create_synthetic_cost_matrix(waypoint_count)
+        waypoints = list(range(waypoint_count))
+        end = waypoint_count - 1
+        dense_create_route = route_creator(waypoints, cost_matrix)
+        heap_create_route = heap_route_creator(*cost_matrix_to_edge_arrays(cost_matrix))
+        dense_time, dense_route = time_function(dense_create_route, 0, end, repeat=1)
+        heap_time, heap_route = time_function(heap_create_route, 0, end)
+        is_equal = list(dense_route) == heap_route
+        rows.append([waypoint_count, dense_time, heap_time, is_equal])
+    print_table(["waypoints", "dense (s)", "heap (s)", "same route"], rows)
+
+
+if __name__ == "__main__":
+    main()
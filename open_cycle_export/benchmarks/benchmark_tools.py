@@ -0,0 +1,103 @@
+"""Shared helpers for benchmark scripts
+
+Benchmarks are not collected by the unit tests, run them as modules, for example
+
+    python -m open_cycle_export.benchmarks.benchmark_routing_algorithm
+
+"""
+
+from typing import Any, Callable, List, Sequence, Tuple
+
+import time
+
+import numpy
+from shapely.geometry import LineString
+
+
+def time_function(
+    function: Callable, *args, repeat: int = 3, **kwargs
+) -> Tuple[float, Any]:
+    """Time a function call taking the best of several repeats
+    
+    Arguments:
+        function {Callable} -- Function to time
+    
+    Keyword Arguments:
+        repeat {int} -- Number of times to call the function (default: {3})
+    
+    Returns:
+        Tuple[float, Any] -- Best elapsed time in seconds and result of the last call
+    """
+
+    best_elapsed = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function(*args, **kwargs)
+        best_elapsed = min(best_elapsed, time.perf_counter() - start_time)
+    return best_elapsed, result
+
+
+def create_synthetic_route_coordinates(
+    waypoint_count: int, seed: int = 0, step: float = 0.001
+) -> numpy.ndarray:
+    """Create lon/lat coordinates of a meandering route in southern England
+    
+    Arguments:
+        waypoint_count {int} -- Number of coordinates to create
+    
+    Keyword Arguments:
+        seed {int} -- Random seed (default: {0})
+        step {float} -- Approximate spacing between coordinates in degrees (default: {0.001})
+    
+    Returns:
+        numpy.ndarray -- Coordinates with shape (waypoint_count, 2)
+    """
+
+    random_state = numpy.random.RandomState(seed)
+    headings = numpy.cumsum(random_state.normal(0, 0.3, waypoint_count))
+    steps = step * numpy.column_stack([numpy.cos(headings), numpy.sin(headings)])
+    return numpy.array([-1.0, 51.0]) + numpy.cumsum(steps, axis=0)
+
+
+def create_synthetic_ways(
+    way_count: int, points_per_way: int = 5, gap_every: int = 20, seed: int = 0
+) -> List[LineString]:
+    """Create ways joined end to end along a synthetic route with occasional gaps
+    
+    Arguments:
+        way_count {int} -- Number of ways to create
+    
+    Keyword Arguments:
+        points_per_way {int} -- Number of coordinates in each way (default: {5})
+        gap_every {int} -- Leave a gap before every nth way (default: {20})
+        seed {int} -- Random seed (default: {0})
+    
+    Returns:
+        List[LineString] -- Ways in order along the route
+    """
+
+    step_count = points_per_way - 1
+    coordinates = create_synthetic_route_coordinates(way_count * step_count + 1, seed)
+    ways = []
+    for way_index in range(way_count):
+        start = way_index * step_count
+        way_coordinates = coordinates[start : start + step_count + 1].copy()
+        if gap_every and way_index % gap_every == gap_every - 1:
+            way_coordinates = way_coordinates[1:]
+        ways.append(LineString(way_coordinates))
+    return ways
+
+
+def print_table(headers: Sequence[str], rows: List[Sequence[Any]]):
+    "Print rows of results as an aligned plain text table"
+
+    cells = [list(map(str, headers))] + [
+        [
+            "{:.4f}".format(cell) if isinstance(cell, float) else str(cell)
+            for cell in row
+        ]
+        for row in rows
+    ]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(headers))]
+    for row in cells:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
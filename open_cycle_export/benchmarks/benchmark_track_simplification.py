@@ -0,0 +1,65 @@
+"""Compare track simplification methods on a long synthetic route
+
+The route is built from connections which each repeat the last point of the
+connection before them, as routes joined from the waypoint graph do, with points a
+few metres apart.
+
+"""
+
+import numpy
+
+from open_cycle_export.benchmarks.benchmark_tools import (
+    time_function,
+    print_table,
+    create_synthetic_route_coordinates,
+)
+from open_cycle_export.route_exporter.track_simplifier import (
+    DOUGLAS_PEUCKER,
+    VISVALINGAM,
+    find_simplified_points,
+)
+
+POINT_COUNT = 200000
+CONNECTION_LENGTH = 50
+
+
+def create_joined_route():
+    coordinates = create_synthetic_route_coordinates(POINT_COUNT, step=0.00005)
+    joint_indexes = numpy.arange(CONNECTION_LENGTH, POINT_COUNT, CONNECTION_LENGTH)
+    return numpy.insert(coordinates, joint_indexes, coordinates[joint_indexes], axis=0)
+
+
+def main():
+    coordinates = create_joined_route()
+    options = [(DOUGLAS_PEUCKER, None, None)] + [
+        (method, tolerance, max_point_count)
+        for method in [DOUGLAS_PEUCKER, VISVALINGAM]
+        for tolerance, max_point_count in [(1.0, None), (5.0, None), (None, 5000)]
+    ]
+    rows = []
+    for method, tolerance, max_point_count in options:
+        elapsed, indexes = time_function(
+            find_simplified_points,
+            coordinates,
+            tolerance,
+            max_point_count,
+            method,
+            repeat=1 if method == VISVALINGAM else 3,
+        )
+        rows.append(
+            [
+                method,
+                tolerance,
+                max_point_count,
+                elapsed,
+                len(indexes),
+                len(indexes) / len(coordinates),
+            ]
+        )
+    print_table(
+        ["method", "tolerance", "max points", "time (s)", "points", "kept"], rows
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Crash and concurrency safe cache files
+
+Entries are written to a temporary file in the same folder and renamed over the
+entry, so readers only ever see a complete old or new entry and an interrupted write
+leaves no truncated file behind. An exclusive lock file per entry lets concurrent
+processes wait for one of them to create an expensive entry instead of each creating
+it. Entries which cannot be parsed are counted, logged and moved aside.
+
+JSON entries may be compressed, with the format recorded in the file extension (see
+compression.py), and are read the same way whichever format they were written in.
+When a cache index is configured (see cache_index.py) entries are found through it
+and recorded in it when written.
+
+"""
+
+from typing import Any, Callable, NamedTuple, Optional
+
+import os
+import json
+import logging
+import tempfile
+import threading
+import contextlib
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from open_cycle_export.cache_utilities.cache_index import (
+    get_lock_path,
+    find_indexed_entry,
+    record_entry,
+    remove_entry,
+)
+from open_cycle_export.cache_utilities.compression import (
+    CORRUPT_ERRORS,
+    get_compression,
+    get_entry_paths,
+    find_entry_path,
+    open_entry_reader,
+    compressed_text_writer,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class CacheStatistics(NamedTuple):
+    hit_count: int
+    miss_count: int
+    corrupt_count: int
+
+
+_statistics_lock = threading.Lock()
+_statistics = CacheStatistics(0, 0, 0)
+
+
+def count(**increments):
+    global _statistics
+    with _statistics_lock:
+        _statistics = _statistics._replace(
+            **{
+                name: getattr(_statistics, name) + increment
+                for name, increment in increments.items()
+            }
+        )
+
+
+def get_cache_statistics() -> CacheStatistics:
+    return _statistics
+
+
+def reset_cache_statistics():
+    global _statistics
+    with _statistics_lock:
+        _statistics = CacheStatistics(0, 0, 0)
+
+
+@contextlib.contextmanager
+def atomic_write(file_path: str, mode: str = "w"):
+    """Open a temporary file which replaces file_path once it is closed without error
+
+    Arguments:
+        file_path {str} -- Path of the file to write
+
+    Keyword Arguments:
+        mode {str} -- File mode, "w" or "wb" (default: {"w"})
+    """
+
+    folder, filename = os.path.split(os.path.abspath(file_path))
+    os.makedirs(folder, exist_ok=True)
+    file_descriptor, temporary_path = tempfile.mkstemp(
+        prefix=".{}.".format(filename), suffix=".tmp", dir=folder
+    )
+    try:
+        with os.fdopen(file_descriptor, mode) as open_file:
+            yield open_file
+            open_file.flush()
+            os.fsync(open_file.fileno())
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temporary_path)
+        raise
+
+
+def store_json_atomic(
+    file_path: str, data: Any, compression: str = None, source: str = None, **kwargs
+) -> str:
+    """Write data as JSON, replacing any existing entry only once it is complete
+
+    Copies of the entry in other compression formats are removed so they are not
+    read in place of the new entry.
+
+    Arguments:
+        file_path {str} -- Path of the entry without a compression extension
+        data {Any} -- Data to write
+
+    Keyword Arguments:
+        compression {str} -- Compression format name, the configured default when None (default: {None})
+        source {str} -- Query or description of what created the entry, for the cache index (default: {None})
+
+    Returns:
+        str -- Path the entry was written to
+    """
+
+    compression_format = get_compression(compression)
+    entry_path = file_path + compression_format.extension
+    with atomic_write(entry_path, "wb") as open_file:
+        with compressed_text_writer(open_file, compression_format) as text_file:
+            json.dump(data, text_file, **kwargs)
+    for other_path in get_entry_paths(file_path):
+        if other_path != entry_path:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(other_path)
+    record_entry(file_path, entry_path, source)
+    return entry_path
+
+
+@contextlib.contextmanager
+def file_lock(file_path: str):
+    """Hold an exclusive lock on a cache entry, shared between processes
+
+    The lock is taken on a separate .lock file so the entry itself can be replaced
+    while the lock is held. Lock files are removed when their entry is evicted, so
+    the lock is taken again if the file was removed while waiting for it. Without
+    fcntl no lock is taken.
+
+    Arguments:
+        file_path {str} -- Path of the cache entry to lock
+    """
+
+    if fcntl is None:
+        yield
+        return
+    lock_path = get_lock_path(file_path)
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    while True:
+        lock_file = open(lock_path, "a")
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        with contextlib.suppress(FileNotFoundError):
+            if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(lock_path)):
+                break
+        lock_file.close()
+    with lock_file:
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def locate_entry(file_path: str) -> Optional[str]:
+    "Path of a stored entry through the cache index, or by probing each format"
+
+    entry_path = find_indexed_entry(file_path)
+    if entry_path is None:
+        entry_path = find_entry_path(file_path)
+    return entry_path or None
+
+
+def read_json_entry(file_path: str, **kwargs) -> Any:
+    """Read a JSON entry stored in any compression format
+
+    Raises:
+        FileNotFoundError -- When the entry is not stored in any format
+
+    Returns:
+        Any -- Data of the entry
+    """
+
+    entry_path = locate_entry(file_path)
+    if entry_path is None:
+        raise FileNotFoundError("no cache entry {}".format(file_path))
+    with open_entry_reader(entry_path) as open_file:
+        return json.load(open_file, **kwargs)
+
+
+def load_json_entry(file_path: str, default: Any = None, **kwargs) -> Any:
+    """Load a JSON cache entry, counting hits, misses and corrupt entries
+
+    A corrupt entry is renamed with a .corrupt suffix so it is not read again and
+    can be inspected.
+
+    Arguments:
+        file_path {str} -- Path of the cache entry
+
+    Keyword Arguments:
+        default {Any} -- Value returned when the entry is missing or corrupt (default: {None})
+
+    Returns:
+        Any -- Data of the entry or the default
+    """
+
+    entry_path = locate_entry(file_path)
+    if entry_path is None:
+        count(miss_count=1)
+        return default
+    try:
+        with open_entry_reader(entry_path) as open_file:
+            data = json.load(open_file, **kwargs)
+    except FileNotFoundError:
+        # Removed since it was indexed
+        count(miss_count=1)
+        remove_entry(file_path)
+        return default
+    except CORRUPT_ERRORS as error:
+        count(miss_count=1, corrupt_count=1)
+        logger.warning("corrupt cache entry %s (%r)", entry_path, error)
+        with contextlib.suppress(FileNotFoundError):
+            os.replace(entry_path, entry_path + ".corrupt")
+        remove_entry(file_path)
+        return default
+    count(hit_count=1)
+    return data
+
+
+_MISSING = object()
+
+
+def get_or_create_json(
+    file_path: str,
+    create_data: Callable[[], Any],
+    compression: str = None,
+    source: str = None,
+    **kwargs
+) -> Any:
+    """Load a JSON cache entry or create it while holding the entry's lock
+
+    A process which finds the entry missing waits for any other process creating
+    it and reads its result rather than creating the entry again.
+
+    Arguments:
+        file_path {str} -- Path of the cache entry
+        create_data {Callable[[], Any]} -- Function creating the data when not cached
+
+    Keyword Arguments:
+        compression {str} -- Compression format of a new entry (default: {None})
+        source {str} -- Query or description of what created the entry (default: {None})
+
+    Returns:
+        Any -- Cached or newly created data
+    """
+
+    data = load_json_entry(file_path, _MISSING)
+    if data is not _MISSING:
+        return data
+    with file_lock(file_path):
+        data = load_json_entry(file_path, _MISSING)
+        if data is not _MISSING:
+            return data
+        data = create_data()
+        store_json_atomic(file_path, data, compression, source, **kwargs)
+        return data
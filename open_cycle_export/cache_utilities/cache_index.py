@@ -0,0 +1,536 @@
+"""SQLite index of cache entries with least recently used eviction
+
+The index records the size, creation time, last access time and source query of
+every entry in a cache folder, so the cache can be inspected and kept under a
+maximum size by removing the least recently used entries, with their lock files
+unless another process holds the lock. The database is opened in WAL mode so
+parallel worker processes can read while one of them writes.
+
+An index finds an entry with a single primary key lookup, where probing the folder
+checks for the entry in every compression format, and answers a miss without
+touching the folder at all. Paths found are remembered by each process and access
+times are buffered in memory and written in batches, so repeated lookups do not
+query the database and lookups do not each need a write transaction. Buffered times
+are written every few seconds and when the process exits, including worker
+processes of a multiprocessing pool, which skip atexit handlers. A remembered path
+evicted by another process fails to open and is treated as a miss.
+
+The index is enabled by setting OPEN_CYCLE_EXPORT_CACHE_INDEX to the database path,
+inside the cache folder it indexes, and OPEN_CYCLE_EXPORT_CACHE_MAX_SIZE to a size
+such as 2G to bound the folder. Entries already in the folder are indexed when the
+database is created.
+
+    python -m open_cycle_export.cache_utilities.cache_index .cache/index.sqlite stats
+
+"""
+
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+import os
+import re
+import time
+import shutil
+import sqlite3
+import logging
+import argparse
+import threading
+import contextlib
+import multiprocessing.util
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from open_cycle_export.cache_utilities.compression import COMPRESSIONS
+
+logger = logging.getLogger(__name__)
+
+INDEX_VARIABLE = "OPEN_CYCLE_EXPORT_CACHE_INDEX"
+MAX_SIZE_VARIABLE = "OPEN_CYCLE_EXPORT_CACHE_MAX_SIZE"
+
+LOCK_EXTENSION = ".lock"
+
+SIZE_UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY,
+        path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created REAL NOT NULL,
+        accessed REAL NOT NULL,
+        source TEXT
+    );
+    CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+class CacheEntry(NamedTuple):
+    key: str
+    path: str
+    size: int
+    created: float
+    accessed: float
+    source: Optional[str]
+
+
+class CacheIndexStatistics(NamedTuple):
+    entry_count: int
+    total_size: int
+    max_size: Optional[int]
+    oldest_access: Optional[float]
+
+
+def parse_size(size: str) -> int:
+    "Number of bytes in a size such as 512M or 2G"
+
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", size.upper())
+    if match is None:
+        raise ValueError("invalid size {}".format(size))
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def format_size(size: int) -> str:
+    for unit in ["", "K", "M", "G"]:
+        if size < 1024:
+            return "{:.1f}{}".format(size, unit) if unit else "{}B".format(size)
+        size /= 1024
+    return "{:.1f}T".format(size)
+
+
+def get_path_size(path: str) -> int:
+    "Size of a file or of all files in a directory"
+
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(folder, filename))
+        for folder, _, filenames in os.walk(path)
+        for filename in filenames
+    )
+
+
+def remove_path(path: str):
+    with contextlib.suppress(FileNotFoundError):
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def get_lock_path(file_path: str) -> str:
+    "Lock file of a cache entry, without the entry's compression extension"
+
+    return file_path + LOCK_EXTENSION
+
+
+def remove_lock_file(file_path: str) -> bool:
+    """Remove the lock file of an entry unless a process holds the lock
+
+    A process which opened the lock file before it was removed notices the file
+    was replaced once it holds the lock and locks the new file instead (see
+    atomic_cache.file_lock).
+
+    Arguments:
+        file_path {str} -- Path of the cache entry, without a compression extension
+
+    Returns:
+        bool -- Whether the lock file was removed
+    """
+
+    lock_path = get_lock_path(file_path)
+    try:
+        lock_file = open(lock_path, "a")
+    except FileNotFoundError:
+        return False
+    with lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(lock_path)
+        return True
+
+
+class CacheIndex:
+    """Index of the entries in a cache folder, stored beside them in SQLite
+
+    Arguments:
+        database_path {str} -- SQLite database, the indexed folder is its folder
+
+    Keyword Arguments:
+        max_size {int} -- Evict least recently used entries above this many bytes (default: {None})
+        flush_interval {int} -- Entries accessed between writing access times (default: {10000})
+        flush_seconds {float} -- Longest time access times are buffered before a lookup writes them (default: {5.0})
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+        max_size: int = None,
+        flush_interval: int = 10000,
+        flush_seconds: float = 5.0,
+    ):
+        self.database_path = os.path.abspath(database_path)
+        self.folder = os.path.dirname(self.database_path)
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.flush_seconds = flush_seconds
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.accessed: Dict[str, float] = {}
+        self.flush_time = time.time()
+        self.paths: Dict[str, str] = {}
+
+        os.makedirs(self.folder, exist_ok=True)
+        is_new = not os.path.exists(self.database_path)
+        self.connection.executescript(SCHEMA)
+        if is_new:
+            self.scan()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        "Connection for the current thread, sqlite3 connections are not shared"
+
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.database_path, timeout=30, isolation_level=None
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def get_key(self, file_path: str) -> Optional[str]:
+        "Key of a path inside the indexed folder or None for paths outside it"
+
+        relative_path = os.path.relpath(os.path.abspath(file_path), self.folder)
+        if relative_path.startswith(os.pardir):
+            return None
+        return relative_path
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Path of an entry, recording the access, or None when not indexed
+
+        Arguments:
+            key {str} -- Path of the entry relative to the folder, without a compression extension
+
+        Returns:
+            Optional[str] -- Path of the stored entry
+        """
+
+        path = self.paths.get(key)
+        if path is None:
+            row = self.connection.execute(
+                "SELECT path FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            path = self.paths[key] = os.path.join(self.folder, row[0])
+        now = self.accessed[key] = time.time()
+        if (
+            len(self.accessed) >= self.flush_interval
+            or now - self.flush_time >= self.flush_seconds
+        ):
+            self.flush()
+        return path
+
+    def flush(self):
+        "Write buffered access times"
+
+        with self.lock:
+            accessed, self.accessed = self.accessed, {}
+            self.flush_time = time.time()
+        if accessed:
+            with self.transaction() as connection:
+                connection.executemany(
+                    "UPDATE entries SET accessed = max(accessed, ?) WHERE key = ?",
+                    [(access_time, key) for key, access_time in accessed.items()],
+                )
+
+    def record(self, key: str, path: str, source: str = None):
+        """Add or replace an entry, evicting old entries if the cache is too large
+
+        Arguments:
+            key {str} -- Path of the entry relative to the folder, without a compression extension
+            path {str} -- Path the entry is stored at
+
+        Keyword Arguments:
+            source {str} -- Query or description of what created the entry (default: {None})
+        """
+
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, self.get_key(path), get_path_size(path), now, now, source),
+            )
+        self.paths[key] = os.path.abspath(path)
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+    def remove(self, key: str):
+        self.paths.pop(key, None)
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def remove_files(self, entry: CacheEntry):
+        "Remove the files of an entry and its lock file"
+
+        remove_path(os.path.join(self.folder, entry.path))
+        remove_lock_file(os.path.join(self.folder, entry.key))
+
+    def get_total_size(self) -> int:
+        return self.connection.execute(
+            "SELECT coalesce(sum(size), 0) FROM entries"
+        ).fetchone()[0]
+
+    def evict(self, max_size: int) -> List[CacheEntry]:
+        """Remove least recently used entries until the cache is within max_size
+
+        Arguments:
+            max_size {int} -- Maximum total size of the entries in bytes
+
+        Returns:
+            List[CacheEntry] -- Entries removed
+        """
+
+        self.flush()
+        evicted = []
+        with self.transaction() as connection:
+            total_size = connection.execute(
+                "SELECT coalesce(sum(size), 0) FROM entries"
+            ).fetchone()[0]
+            if total_size <= max_size:
+                return evicted
+            for row in connection.execute(
+                "SELECT * FROM entries ORDER BY accessed"
+            ).fetchall():
+                if total_size <= max_size:
+                    break
+                entry = CacheEntry(*row)
+                connection.execute("DELETE FROM entries WHERE key = ?", (entry.key,))
+                self.paths.pop(entry.key, None)
+                self.remove_files(entry)
+                total_size -= entry.size
+                evicted.append(entry)
+        logger.info(
+            "evicted %s cache entries, %s", len(evicted), format_size(total_size)
+        )
+        return evicted
+
+    def get_entries(self, order: str = "accessed") -> List[CacheEntry]:
+        self.flush()
+        if order not in CacheEntry._fields:
+            raise ValueError("cannot order entries by {}".format(order))
+        return [
+            CacheEntry(*row)
+            for row in self.connection.execute(
+                "SELECT * FROM entries ORDER BY {}".format(order)
+            )
+        ]
+
+    def get_statistics(self) -> CacheIndexStatistics:
+        entry_count, total_size, oldest_access = self.connection.execute(
+            "SELECT count(*), coalesce(sum(size), 0), min(accessed) FROM entries"
+        ).fetchone()
+        return CacheIndexStatistics(
+            entry_count, total_size, self.max_size, oldest_access
+        )
+
+    def scan(self) -> int:
+        """Index entries in the folder which are missing from the index
+
+        Files of each cache entry are indexed by their key, and every other file
+        or directory directly inside the folder as an entry of its own. Entries
+        whose files no longer exist are removed from the index.
+
+        Returns:
+            int -- Number of entries added
+        """
+
+        indexed_paths = {entry.path for entry in self.get_entries()}
+        database_filename = os.path.basename(self.database_path)
+        extensions = [
+            compression.extension
+            for compression in COMPRESSIONS.values()
+            if compression.extension
+        ]
+        new_rows = []
+        for filename in sorted(os.listdir(self.folder)):
+            path = os.path.join(self.folder, filename)
+            if (
+                filename.startswith(database_filename)
+                or filename.endswith((LOCK_EXTENSION, ".tmp", ".corrupt"))
+                or filename in indexed_paths
+            ):
+                continue
+            key = next(
+                (
+                    filename[: -len(extension)]
+                    for extension in extensions
+                    if filename.endswith(extension)
+                ),
+                filename,
+            )
+            modified = os.path.getmtime(path)
+            new_rows.append((key, filename, get_path_size(path), modified, modified))
+
+        missing_keys = [
+            (entry.key,)
+            for entry in self.get_entries()
+            if not os.path.exists(os.path.join(self.folder, entry.path))
+        ]
+        with self.transaction() as connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, NULL)", new_rows
+            )
+            connection.executemany("DELETE FROM entries WHERE key = ?", missing_keys)
+        self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return len(new_rows)
+
+    def close(self):
+        self.flush()
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+            connection.close()
+            self.local.connection = None
+
+
+_index: Optional[CacheIndex] = None
+_index_settings = None
+_index_lock = threading.Lock()
+
+
+def get_cache_index() -> Optional[CacheIndex]:
+    "Index configured by the environment or None when the cache is not indexed"
+
+    global _index, _index_settings
+    database_path = os.environ.get(INDEX_VARIABLE)
+    if not database_path:
+        return None
+    max_size = os.environ.get(MAX_SIZE_VARIABLE)
+    # Connections must not be shared with forked worker processes
+    settings = (os.getpid(), os.path.abspath(database_path), max_size)
+    with _index_lock:
+        if settings != _index_settings:
+            if _index is not None and _index_settings[0] == os.getpid():
+                _index.close()
+            _index = CacheIndex(
+                database_path, parse_size(max_size) if max_size else None
+            )
+            _index_settings = settings
+            # Run on exit by multiprocessing, in pool workers as well as the main process
+            multiprocessing.util.Finalize(_index, _index.flush, exitpriority=0)
+        return _index
+
+
+def find_indexed_entry(file_path: str) -> Optional[str]:
+    """Path of an entry found through the configured index
+
+    Returns:
+        Optional[str] -- Path of the stored entry, "" when the index has no entry, or None when the path is not indexed
+    """
+
+    cache_index = get_cache_index()
+    key = cache_index.get_key(file_path) if cache_index else None
+    if key is None:
+        return None
+    return cache_index.lookup(key) or ""
+
+
+def record_entry(file_path: str, entry_path: str, source: str = None):
+    "Record a newly written entry in the configured index"
+
+    cache_index = get_cache_index()
+    key = cache_index.get_key(file_path) if cache_index else None
+    if key is not None:
+        cache_index.record(key, entry_path, source)
+
+
+def remove_entry(file_path: str):
+    "Remove an entry which is missing or corrupt from the configured index"
+
+    cache_index = get_cache_index()
+    key = cache_index.get_key(file_path) if cache_index else None
+    if key is not None:
+        cache_index.remove(key)
+
+
+def touch_entry(file_path: str, source: str = None):
+    "Record an access to an entry, indexing it if it was written without the index"
+
+    if find_indexed_entry(file_path) == "":
+        record_entry(file_path, file_path, source)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and prune a cache index")
+    parser.add_argument("database_path")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("stats", help="show the number and size of entries")
+    list_parser = subparsers.add_parser("list", help="list entries")
+    list_parser.add_argument("--order", default="accessed")
+    list_parser.add_argument("--limit", type=int)
+    prune_parser = subparsers.add_parser("prune", help="evict old entries")
+    prune_parser.add_argument("--max-size", type=parse_size)
+    prune_parser.add_argument(
+        "--older-than", type=float, help="also evict entries unused for days"
+    )
+    subparsers.add_parser("scan", help="index entries missing from the index")
+    args = parser.parse_args()
+
+    cache_index = CacheIndex(args.database_path)
+    if args.command == "list":
+        for entry in cache_index.get_entries(args.order)[: args.limit]:
+            print(
+                "{}  {:>8}  {}  {}".format(
+                    time.strftime("%Y-%m-%d %H:%M", time.localtime(entry.accessed)),
+                    format_size(entry.size),
+                    entry.path,
+                    (entry.source or "")[:60],
+                )
+            )
+    elif args.command == "prune":
+        if args.older_than is not None:
+            cutoff = time.time() - args.older_than * 86400
+            old_entries = [
+                entry for entry in cache_index.get_entries() if entry.accessed < cutoff
+            ]
+            for entry in old_entries:
+                cache_index.remove(entry.key)
+                cache_index.remove_files(entry)
+            print("evicted {} unused entries".format(len(old_entries)))
+        if args.max_size is not None:
+            evicted = cache_index.evict(args.max_size)
+            print("evicted {} entries".format(len(evicted)))
+    elif args.command == "scan":
+        print("indexed {} entries".format(cache_index.scan()))
+    statistics = cache_index.get_statistics()
+    print(
+        "{} entries, {}".format(
+            statistics.entry_count, format_size(statistics.total_size)
+        )
+    )
+    cache_index.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,141 @@
+"""Compression formats for cache entries, recorded in the entry's file extension
+
+An entry stored as "name.json" may be found on disk as "name.json", "name.json.gz",
+"name.json.xz" or "name.json.zst", so readers open whichever exists without knowing
+how it was written. zstd is only available when the zstandard package is installed.
+
+The format of new entries is set with the OPEN_CYCLE_EXPORT_CACHE_COMPRESSION
+environment variable, which is inherited by worker processes, and defaults to none.
+
+"""
+
+from typing import BinaryIO, Callable, Dict, List, NamedTuple, Optional, TextIO
+
+import io
+import os
+import gzip
+import lzma
+import contextlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSION_VARIABLE = "OPEN_CYCLE_EXPORT_CACHE_COMPRESSION"
+
+
+class Compression(NamedTuple):
+    name: str
+    extension: str
+    open_reader: Callable[[str], TextIO]
+    wrap_writer: Optional[Callable[[BinaryIO], BinaryIO]]
+
+
+def open_zstd_reader(entry_path: str) -> TextIO:
+    return zstandard.open(entry_path, "rt", encoding="utf8")
+
+
+def wrap_zstd_writer(open_file: BinaryIO) -> BinaryIO:
+    return zstandard.ZstdCompressor(level=10).stream_writer(open_file, closefd=False)
+
+
+COMPRESSIONS: Dict[str, Compression] = {
+    "none": Compression(
+        "none", "", lambda entry_path: open(entry_path, encoding="utf8"), None
+    ),
+    "gzip": Compression(
+        "gzip",
+        ".gz",
+        lambda entry_path: gzip.open(entry_path, "rt", encoding="utf8"),
+        lambda open_file: gzip.GzipFile(fileobj=open_file, mode="wb", compresslevel=6),
+    ),
+    "lzma": Compression(
+        "lzma",
+        ".xz",
+        lambda entry_path: lzma.open(entry_path, "rt", encoding="utf8"),
+        lambda open_file: lzma.LZMAFile(open_file, "wb", preset=6),
+    ),
+}
+if zstandard is not None:
+    COMPRESSIONS["zstd"] = Compression(
+        "zstd", ".zst", open_zstd_reader, wrap_zstd_writer
+    )
+
+# Errors raised when reading a truncated or corrupt entry
+CORRUPT_ERRORS = (
+    ValueError,
+    UnicodeDecodeError,
+    EOFError,
+    lzma.LZMAError,
+    getattr(gzip, "BadGzipFile", OSError),
+) + ((zstandard.ZstdError,) if zstandard is not None else ())
+
+
+def get_compression(name: Optional[str] = None) -> Compression:
+    """Compression format by name, the configured default when None
+
+    Raises:
+        ValueError -- When the format is unknown or its package is not installed
+
+    Returns:
+        Compression -- Format used for new cache entries
+    """
+
+    if name is None:
+        name = os.environ.get(COMPRESSION_VARIABLE) or "none"
+    if name not in COMPRESSIONS:
+        raise ValueError(
+            "cache compression {} not available, use one of {}".format(
+                name, ", ".join(COMPRESSIONS.keys())
+            )
+        )
+    return COMPRESSIONS[name]
+
+
+def get_entry_paths(file_path: str) -> List[str]:
+    "Paths an entry may be stored at, one for each available format"
+
+    return [file_path + compression.extension for compression in COMPRESSIONS.values()]
+
+
+def find_entry_path(file_path: str) -> Optional[str]:
+    "Path of the stored entry in whichever format it was written or None"
+
+    for entry_path in get_entry_paths(file_path):
+        if os.path.exists(entry_path):
+            return entry_path
+    return None
+
+
+def get_path_compression(entry_path: str) -> Compression:
+    for compression in COMPRESSIONS.values():
+        if compression.extension and entry_path.endswith(compression.extension):
+            return compression
+    return COMPRESSIONS["none"]
+
+
+def open_entry_reader(entry_path: str) -> TextIO:
+    "Open a stored entry for reading text, decompressing it if needed"
+
+    return get_path_compression(entry_path).open_reader(entry_path)
+
+
+@contextlib.contextmanager
+def compressed_text_writer(open_file: BinaryIO, compression: Compression):
+    """Write text compressed into an open binary file, leaving the file open
+
+    Arguments:
+        open_file {BinaryIO} -- File to write the compressed text to
+        compression {Compression} -- Format to compress the text with
+    """
+
+    compressed_file = open_file
+    if compression.wrap_writer is not None:
+        compressed_file = compression.wrap_writer(open_file)
+    text_file = io.TextIOWrapper(compressed_file, encoding="utf8")
+    yield text_file
+    text_file.flush()
+    text_file.detach()
+    if compressed_file is not open_file:
+        compressed_file.close()
@@ -0,0 +1,108 @@
+import os
+import json
+import time
+import tempfile
+import unittest
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from open_cycle_export.cache_utilities.atomic_cache import (
+    atomic_write,
+    file_lock,
+    store_json_atomic,
+    load_json_entry,
+    get_or_create_json,
+    get_cache_statistics,
+    reset_cache_statistics,
+)
+
+
+def create_entry_once(file_path, log_path):
+    def create_data():
+        with open(log_path, "a") as log_file:
+            log_file.write("created\n")
+        time.sleep(0.2)
+        return {"value": 1}
+
+    return get_or_create_json(file_path, create_data)
+
+
+class TestAtomicCache(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temporary_directory.name, "entry.json")
+        reset_cache_statistics()
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_failed_write_keeps_old_entry(self):
+        store_json_atomic(self.file_path, {"value": 1})
+        with self.assertRaises(RuntimeError):
+            with atomic_write(self.file_path) as open_file:
+                open_file.write('{"val')
+                raise RuntimeError("interrupted")
+        self.assertEqual(load_json_entry(self.file_path), {"value": 1})
+        self.assertEqual(os.listdir(self.temporary_directory.name), ["entry.json"])
+
+    def test_count_and_move_corrupt_entry(self):
+        with open(self.file_path, "w") as open_file:
+            open_file.write('{"val')
+        self.assertIsNone(load_json_entry(self.file_path))
+        self.assertIsNone(load_json_entry(self.file_path))
+        self.assertEqual(get_cache_statistics().corrupt_count, 1)
+        self.assertEqual(get_cache_statistics().miss_count, 2)
+        self.assertTrue(os.path.exists(self.file_path + ".corrupt"))
+
+    def test_create_missing_entry(self):
+        self.assertEqual(get_or_create_json(self.file_path, lambda: [1, 2]), [1, 2])
+        self.assertEqual(get_or_create_json(self.file_path, lambda: [3]), [1, 2])
+        with open(self.file_path) as open_file:
+            self.assertEqual(json.load(open_file), [1, 2])
+
+    def test_lock_file_removed_while_waiting(self):
+        "Should lock the new lock file when the one waited on was removed"
+
+        events = []
+
+        def hold_lock(name, seconds):
+            with file_lock(self.file_path):
+                events.append((name, "enter"))
+                time.sleep(seconds)
+                events.append((name, "exit"))
+
+        waiting = threading.Thread(target=hold_lock, args=("waiting", 0))
+        replacing = threading.Thread(target=hold_lock, args=("replacing", 0.2))
+        with file_lock(self.file_path):
+            waiting.start()
+            time.sleep(0.05)
+            os.remove(self.file_path + ".lock")
+            replacing.start()
+            time.sleep(0.05)
+        waiting.join()
+        replacing.join()
+        self.assertEqual(
+            events,
+            [
+                ("replacing", "enter"),
+                ("replacing", "exit"),
+                ("waiting", "enter"),
+                ("waiting", "exit"),
+            ],
+        )
+
+    def test_create_entry_once_between_processes(self):
+        log_path = os.path.join(self.temporary_directory.name, "log.txt")
+        with ProcessPoolExecutor(4) as executor:
+            futures = [
+                executor.submit(create_entry_once, self.file_path, log_path)
+                for _ in range(4)
+            ]
+            results = [future.result() for future in futures]
+        self.assertEqual(results, [{"value": 1}] * 4)
+        with open(log_path) as log_file:
+            self.assertEqual(log_file.readlines(), ["created\n"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import os
+import time
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor
+
+from open_cycle_export.cache_utilities.cache_index import (
+    INDEX_VARIABLE,
+    CacheIndex,
+    parse_size,
+    get_cache_index,
+)
+from open_cycle_export.cache_utilities.atomic_cache import (
+    file_lock,
+    store_json_atomic,
+    load_json_entry,
+)
+
+
+def load_entries(file_paths):
+    return [load_json_entry(file_path) for file_path in file_paths]
+
+
+class TestCacheIndex(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.folder = self.temporary_directory.name
+        self.database_path = os.path.join(self.folder, "index.sqlite")
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def write_file(self, filename, size):
+        file_path = os.path.join(self.folder, filename)
+        with open(file_path, "w") as open_file:
+            open_file.write("x" * size)
+        return file_path
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("512"), 512)
+        self.assertEqual(parse_size("2G"), 2 << 30)
+        self.assertEqual(parse_size("1.5mb"), 3 << 19)
+        with self.assertRaises(ValueError):
+            parse_size("large")
+
+    def test_record_and_lookup(self):
+        cache_index = CacheIndex(self.database_path)
+        file_path = self.write_file("a.json.gz", 100)
+        cache_index.record("a.json", file_path, "node(1);")
+        self.assertEqual(cache_index.lookup("a.json"), file_path)
+        self.assertIsNone(cache_index.lookup("b.json"))
+        (entry,) = cache_index.get_entries()
+        self.assertEqual(entry.path, "a.json.gz")
+        self.assertEqual((entry.size, entry.source), (100, "node(1);"))
+        cache_index.close()
+
+    def test_evict_least_recently_used(self):
+        cache_index = CacheIndex(self.database_path, max_size=350)
+        for filename in ["a.json", "b.json", "c.json"]:
+            cache_index.record(filename, self.write_file(filename, 100))
+            time.sleep(0.01)
+        cache_index.lookup("a.json")
+        time.sleep(0.01)
+        cache_index.record("d.json", self.write_file("d.json", 100))
+        keys = [entry.key for entry in cache_index.get_entries()]
+        self.assertEqual(keys, ["c.json", "a.json", "d.json"])
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "b.json")))
+        self.assertEqual(cache_index.get_statistics().total_size, 300)
+        cache_index.close()
+
+    def test_flush_after_interval(self):
+        cache_index = CacheIndex(self.database_path, flush_seconds=0.05)
+        cache_index.record("a.json", self.write_file("a.json", 10))
+        cache_index.record("b.json", self.write_file("b.json", 10))
+        (recorded,) = cache_index.connection.execute(
+            "SELECT accessed FROM entries WHERE key = 'a.json'"
+        ).fetchone()
+        time.sleep(0.06)
+        cache_index.lookup("a.json")
+        self.assertEqual(cache_index.accessed, {})
+        (accessed,) = cache_index.connection.execute(
+            "SELECT accessed FROM entries WHERE key = 'a.json'"
+        ).fetchone()
+        self.assertGreater(accessed, recorded)
+        cache_index.close()
+
+    def test_flush_lookups_of_worker_processes(self):
+        "Should write access times of pool workers, which exit without atexit"
+
+        file_paths = [os.path.join(self.folder, "{}.json".format(i)) for i in range(3)]
+        with mock.patch.dict(os.environ, {INDEX_VARIABLE: self.database_path}):
+            for file_path in file_paths:
+                store_json_atomic(file_path, [1])
+            recorded = {
+                entry.key: entry.accessed for entry in get_cache_index().get_entries()
+            }
+            time.sleep(0.01)
+            with ProcessPoolExecutor(1) as executor:
+                results = executor.submit(load_entries, file_paths).result()
+            get_cache_index().close()
+        self.assertEqual(results, [[1]] * 3)
+        cache_index = CacheIndex(self.database_path)
+        for entry in cache_index.get_entries():
+            self.assertGreater(entry.accessed, recorded[entry.key])
+        cache_index.close()
+
+    def test_evict_removes_unused_lock_files(self):
+        "Should remove lock files of evicted entries unless they are held"
+
+        cache_index = CacheIndex(self.database_path, max_size=150)
+        for filename in ["a.json", "b.json"]:
+            cache_index.record(filename, self.write_file(filename + ".gz", 100))
+            self.write_file(filename + ".lock", 0)
+            time.sleep(0.01)
+        with file_lock(os.path.join(self.folder, "b.json")):
+            cache_index.record("c.json", self.write_file("c.json", 100))
+            cache_index.evict(0)
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "a.json.lock")))
+        self.assertTrue(os.path.exists(os.path.join(self.folder, "b.json.lock")))
+        self.assertFalse(os.path.exists(os.path.join(self.folder, "b.json.gz")))
+        cache_index.close()
+
+    def test_index_existing_entries(self):
+        self.write_file("a.json.xz", 10)
+        self.write_file("b.json", 20)
+        self.write_file("b.json.lock", 0)
+        os.makedirs(os.path.join(self.folder, "c.graph"))
+        self.write_file(os.path.join("c.graph", "header.json"), 30)
+        cache_index = CacheIndex(self.database_path)
+        entries = {entry.key: entry.size for entry in cache_index.get_entries("key")}
+        self.assertEqual(entries, {"a.json": 10, "b.json": 20, "c.graph": 30})
+        cache_index.close()
+
+    def test_cache_through_configured_index(self):
+        file_path = os.path.join(self.folder, "entry.json")
+        with mock.patch.dict(os.environ, {INDEX_VARIABLE: self.database_path}):
+            store_json_atomic(file_path, [1, 2], source="node(1);")
+            self.assertEqual(load_json_entry(file_path), [1, 2])
+            cache_index = get_cache_index()
+            self.assertEqual(cache_index.get_entries()[0].source, "node(1);")
+
+            # Entries removed behind the index are misses and leave the index
+            os.remove(file_path)
+            self.assertIsNone(load_json_entry(file_path))
+            self.assertEqual(cache_index.get_entries(), [])
+            cache_index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from open_cycle_export.cache_utilities.atomic_cache import (
+    store_json_atomic,
+    read_json_entry,
+    load_json_entry,
+    get_cache_statistics,
+    reset_cache_statistics,
+)
+from open_cycle_export.cache_utilities.compression import (
+    COMPRESSIONS,
+    COMPRESSION_VARIABLE,
+    get_compression,
+)
+
+DATA = {"features": [{"name": "Café {}".format(index)} for index in range(100)]}
+
+
+class TestCompression(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.file_path = os.path.join(self.temporary_directory.name, "entry.json")
+        reset_cache_statistics()
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_read_every_format(self):
+        for name in COMPRESSIONS.keys():
+            with self.subTest(name):
+                entry_path = store_json_atomic(self.file_path, DATA, name)
+                self.assertTrue(os.path.exists(entry_path))
+                self.assertEqual(read_json_entry(self.file_path), DATA)
+
+    def test_compressed_entry_is_smaller(self):
+        plain_path = store_json_atomic(self.file_path, DATA, "none")
+        plain_size = os.path.getsize(plain_path)
+        gzip_path = store_json_atomic(self.file_path, DATA, "gzip")
+        self.assertLess(os.path.getsize(gzip_path), plain_size)
+
+    def test_replace_entry_in_other_format(self):
+        store_json_atomic(self.file_path, {"old": True}, "gzip")
+        store_json_atomic(self.file_path, {"new": True}, "none")
+        self.assertEqual(os.listdir(self.temporary_directory.name), ["entry.json"])
+        self.assertEqual(read_json_entry(self.file_path), {"new": True})
+
+    def test_default_compression_from_environment(self):
+        with mock.patch.dict(os.environ, {COMPRESSION_VARIABLE: "lzma"}):
+            entry_path = store_json_atomic(self.file_path, DATA)
+        self.assertEqual(entry_path, self.file_path + ".xz")
+
+    def test_unknown_compression(self):
+        with self.assertRaises(ValueError):
+            get_compression("brotli")
+
+    def test_count_truncated_compressed_entry(self):
+        entry_path = store_json_atomic(self.file_path, DATA, "gzip")
+        with open(entry_path, "rb") as open_file:
+            truncated_data = open_file.read()[:50]
+        with open(entry_path, "wb") as open_file:
+            open_file.write(truncated_data)
+        self.assertIsNone(load_json_entry(self.file_path))
+        self.assertEqual(get_cache_statistics().corrupt_count, 1)
+        self.assertTrue(os.path.exists(entry_path + ".corrupt"))
+
+    def test_missing_entry(self):
+        with self.assertRaises(FileNotFoundError):
+            read_json_entry(self.file_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,294 @@
+"""Run a stream of items through stages of worker threads joined by bounded queues
+
+Each stage has its own pool of worker threads reading from a bounded input queue, so
+a slow stage blocks the stages before it rather than letting results pile up in
+memory. Stages waiting on the network overlap with stages doing CPU work on other
+items, which can be handed to a process pool from inside the stage function.
+
+An item which raises an exception in a stage skips the remaining stages and is
+returned with the error and the name of the stage which failed. Closing the results
+early cancels the pipeline, so threads waiting on full queues stop instead of hanging.
+
+"""
+
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple, Optional
+
+import time
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+STOP = object()
+
+# Seconds between checks for cancellation while waiting on a queue
+CANCEL_POLL_INTERVAL = 0.1
+
+
+class PipelineResult(NamedTuple):
+    index: int
+    value: Any
+    error: Optional[BaseException] = None
+    failed_stage: Optional[str] = None
+
+
+class StageStatistics(NamedTuple):
+    name: str
+    worker_count: int
+    queue_depth: int
+    max_queue_depth: int
+    processed_count: int
+    failed_count: int
+    busy_seconds: float
+    throughput: float
+    utilisation: float
+
+
+class PipelineStage:
+    """A function applied to each item by a number of worker threads"""
+
+    def __init__(self, name: str, function: Callable[[Any], Any], worker_count=1):
+        self.name = name
+        self.function = function
+        self.worker_count = worker_count
+        self.input_queue: queue.Queue = None
+        self.lock = threading.Lock()
+        self.running_count = 0
+        self.max_queue_depth = 0
+        self.processed_count = 0
+        self.failed_count = 0
+        self.busy_seconds = 0.0
+
+    def reset(self, queue_size: int):
+        self.input_queue = queue.Queue(queue_size)
+        self.running_count = self.worker_count
+        self.max_queue_depth = 0
+        self.processed_count = 0
+        self.failed_count = 0
+        self.busy_seconds = 0.0
+
+    def get_statistics(self, elapsed: float) -> StageStatistics:
+        queue_depth = self.input_queue.qsize() if self.input_queue else 0
+        with self.lock:
+            self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+            max_queue_depth = self.max_queue_depth
+            busy_seconds = self.busy_seconds
+            processed_count = self.processed_count
+            failed_count = self.failed_count
+        return StageStatistics(
+            self.name,
+            self.worker_count,
+            queue_depth,
+            max_queue_depth,
+            processed_count,
+            failed_count,
+            busy_seconds,
+            processed_count / elapsed if elapsed > 0 else 0.0,
+            busy_seconds / (elapsed * self.worker_count) if elapsed > 0 else 0.0,
+        )
+
+
+class Pipeline:
+    """Stages run concurrently on a stream of items
+
+    Arguments:
+        stages {List[PipelineStage]} -- Stages applied to each item in order
+
+    Keyword Arguments:
+        queue_size {int} -- Maximum number of items waiting before each stage (default: {4})
+        log_interval {float} -- Seconds between logging stage statistics, never when None (default: {None})
+    """
+
+    def __init__(
+        self,
+        stages: List[PipelineStage],
+        queue_size: int = 4,
+        log_interval: float = None,
+    ):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.log_interval = log_interval
+        self.start_time = None
+        self.end_time = None
+
+    def get_elapsed(self) -> float:
+        if self.start_time is None:
+            return 0.0
+        return (self.end_time or time.perf_counter()) - self.start_time
+
+    def get_statistics(self) -> List[StageStatistics]:
+        elapsed = self.get_elapsed()
+        return [stage.get_statistics(elapsed) for stage in self.stages]
+
+    def log_statistics(self):
+        for statistics in self.get_statistics():
+            logger.info(
+                "stage %s: queue %s (max %s), %s done, %s failed, "
+                "%.2f items/s, %.0f%% busy",
+                statistics.name,
+                statistics.queue_depth,
+                statistics.max_queue_depth,
+                statistics.processed_count,
+                statistics.failed_count,
+                statistics.throughput,
+                statistics.utilisation * 100,
+            )
+
+    def run(self, items: Iterable[Any]) -> Iterator[PipelineResult]:
+        """Feed items through all stages, yielding results as they complete
+
+        Items are read from the iterable only as fast as the first stage accepts them
+        and results are yielded in order of completion, not input order
+        """
+
+        for stage in self.stages:
+            stage.reset(self.queue_size)
+        output_queue = queue.Queue(self.queue_size)
+        next_stages = self.stages[1:] + [None]
+
+        self.start_time, self.end_time = time.perf_counter(), None
+        cancelled = threading.Event()
+        threads = [
+            threading.Thread(target=self.feed, args=(items, cancelled), daemon=True)
+        ]
+        for stage, next_stage in zip(self.stages, next_stages):
+            threads.extend(
+                threading.Thread(
+                    target=self.work,
+                    args=(stage, next_stage, output_queue, cancelled),
+                    daemon=True,
+                )
+                for _ in range(stage.worker_count)
+            )
+        for thread in threads:
+            thread.start()
+
+        stop_logging = threading.Event()
+        if self.log_interval:
+            threading.Thread(
+                target=self.log_periodically, args=(stop_logging,), daemon=True
+            ).start()
+
+        try:
+            while True:
+                result = output_queue.get()
+                if result is STOP:
+                    break
+                yield result
+        finally:
+            # Unblock threads waiting on full queues when the consumer stops early
+            cancelled.set()
+            for target_queue in [stage.input_queue for stage in self.stages]:
+                drain(target_queue)
+            drain(output_queue)
+            stop_logging.set()
+            self.end_time = time.perf_counter()
+
+    def feed(self, items: Iterable[Any], cancelled: threading.Event):
+        first_stage = self.stages[0]
+        try:
+            for index, item in enumerate(items):
+                if not self.put(first_stage, PipelineResult(index, item), cancelled):
+                    break
+        except Exception:
+            logger.exception("stopped reading pipeline items")
+        finally:
+            for _ in range(first_stage.worker_count):
+                put_until_cancelled(first_stage.input_queue, STOP, cancelled)
+
+    def put(
+        self, stage: PipelineStage, result: PipelineResult, cancelled: threading.Event
+    ) -> bool:
+        if not put_until_cancelled(stage.input_queue, result, cancelled):
+            return False
+        queue_depth = stage.input_queue.qsize()
+        with stage.lock:
+            stage.max_queue_depth = max(stage.max_queue_depth, queue_depth)
+        return True
+
+    def work(
+        self,
+        stage: PipelineStage,
+        next_stage: Optional[PipelineStage],
+        output_queue: queue.Queue,
+        cancelled: threading.Event,
+    ):
+        try:
+            while True:
+                result = get_until_cancelled(stage.input_queue, cancelled)
+                if result is STOP:
+                    break
+                if result.error is None:
+                    result = self.apply(stage, result)
+                if next_stage is None:
+                    put_until_cancelled(output_queue, result, cancelled)
+                else:
+                    self.put(next_stage, result, cancelled)
+        finally:
+            # The last worker of a stage to stop passes the stop on to the next stage,
+            # even when the stage function raised something other than an Exception
+            with stage.lock:
+                stage.running_count -= 1
+                is_last = stage.running_count == 0
+            if is_last and next_stage is None:
+                put_until_cancelled(output_queue, STOP, cancelled)
+            elif is_last:
+                for _ in range(next_stage.worker_count):
+                    put_until_cancelled(next_stage.input_queue, STOP, cancelled)
+
+    def apply(self, stage: PipelineStage, result: PipelineResult) -> PipelineResult:
+        start = time.perf_counter()
+        try:
+            result = result._replace(value=stage.function(result.value))
+            failed = False
+        except Exception as error:
+            logger.exception("%s failed on item %s", stage.name, result.index)
+            result = result._replace(error=error, failed_stage=stage.name)
+            failed = True
+        with stage.lock:
+            stage.busy_seconds += time.perf_counter() - start
+            stage.processed_count += 1
+            stage.failed_count += failed
+        return result
+
+    def log_periodically(self, stop_logging: threading.Event):
+        while not stop_logging.wait(self.log_interval):
+            self.log_statistics()
+
+
+def put_until_cancelled(
+    target_queue: queue.Queue, item: Any, cancelled: threading.Event
+) -> bool:
+    """Put an item on a bounded queue, giving up if the pipeline is cancelled
+
+    Returns:
+        bool -- Whether the item was put on the queue
+    """
+
+    while not cancelled.is_set():
+        try:
+            target_queue.put(item, timeout=CANCEL_POLL_INTERVAL)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def get_until_cancelled(target_queue: queue.Queue, cancelled: threading.Event) -> Any:
+    """Get an item from a queue, returning STOP if the pipeline is cancelled"""
+
+    while not cancelled.is_set():
+        try:
+            return target_queue.get(timeout=CANCEL_POLL_INTERVAL)
+        except queue.Empty:
+            pass
+    return STOP
+
+
+def drain(target_queue: queue.Queue):
+    while True:
+        try:
+            target_queue.get_nowait()
+        except queue.Empty:
+            return
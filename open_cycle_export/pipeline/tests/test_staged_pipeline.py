@@ -0,0 +1,121 @@
+import time
+import unittest
+import threading
+
+from unittest import mock
+
+from open_cycle_export.pipeline.staged_pipeline import Pipeline, PipelineStage
+
+
+def double(value):
+    return value * 2
+
+
+def fail_on_three(value):
+    if value == 3:
+        raise ValueError("three")
+    return value
+
+
+class TestPipeline(unittest.TestCase):
+    """Test items flow through every stage with bounded queues"""
+
+    def test_all_stages_applied(self):
+        pipeline = Pipeline(
+            [PipelineStage("double", double, 3), PipelineStage("add", lambda x: x + 1)]
+        )
+        results = sorted(pipeline.run(range(20)))
+
+        self.assertListEqual([result.index for result in results], list(range(20)))
+        self.assertListEqual(
+            [result.value for result in results], [i * 2 + 1 for i in range(20)]
+        )
+
+    def test_failed_items_skip_later_stages(self):
+        calls = []
+        pipeline = Pipeline(
+            [
+                PipelineStage("fail", fail_on_three, 2),
+                PipelineStage("record", lambda x: calls.append(x) or x),
+            ]
+        )
+        with self.assertLogs("open_cycle_export.pipeline.staged_pipeline", "ERROR"):
+            results = {result.index: result for result in pipeline.run(range(5))}
+
+        self.assertEqual(results[3].failed_stage, "fail")
+        self.assertIsInstance(results[3].error, ValueError)
+        self.assertListEqual(sorted(calls), [0, 1, 2, 4])
+
+        fail_statistics, record_statistics = pipeline.get_statistics()
+        self.assertEqual(fail_statistics.processed_count, 5)
+        self.assertEqual(fail_statistics.failed_count, 1)
+        self.assertEqual(record_statistics.processed_count, 4)
+
+    def test_input_is_read_lazily(self):
+        "Should not read far ahead of a slow stage"
+
+        read_count = 0
+        lock = threading.Lock()
+
+        def items():
+            nonlocal read_count
+            for item in range(100):
+                with lock:
+                    read_count += 1
+                yield item
+
+        pipeline = Pipeline([PipelineStage("slow", lambda x: time.sleep(0.001))], 2)
+        results = pipeline.run(items())
+        next(results)
+        time.sleep(0.05)
+
+        # One item per worker, one in the output queue, two queued and one blocked
+        self.assertLessEqual(read_count, 8)
+        self.assertEqual(len(list(results)), 99)
+        statistics = pipeline.get_statistics()[0]
+        self.assertLessEqual(statistics.max_queue_depth, 2)
+        self.assertEqual(statistics.queue_depth, 0)
+
+    def test_base_exception_stops_pipeline(self):
+        "Should finish the results when a stage raises outside of Exception"
+
+        class Interrupt(BaseException):
+            pass
+
+        def interrupt_on_three(value):
+            if value == 3:
+                raise Interrupt()
+            return value
+
+        pipeline = Pipeline(
+            [PipelineStage("interrupt", interrupt_on_three), PipelineStage("copy", str)]
+        )
+        results = []
+        consumer = threading.Thread(
+            target=lambda: results.extend(pipeline.run(range(10))), daemon=True
+        )
+        with mock.patch("threading.excepthook"):
+            consumer.start()
+            consumer.join(5)
+
+        self.assertFalse(consumer.is_alive())
+        self.assertListEqual([result.value for result in results], ["0", "1", "2"])
+
+    def test_closing_results_stops_threads(self):
+        "Should not leave threads blocked on full queues when the consumer stops"
+
+        thread_count = threading.active_count()
+        pipeline = Pipeline(
+            [PipelineStage("double", double, 2), PipelineStage("add", lambda x: x + 1)],
+            1,
+        )
+        results = pipeline.run(range(1000))
+        next(results)
+        time.sleep(0.05)
+        self.assertGreater(threading.active_count(), thread_count)
+
+        results.close()
+        deadline = time.perf_counter() + 5
+        while threading.active_count() > thread_count:
+            self.assertLess(time.perf_counter(), deadline)
+            time.sleep(0.01)
@@ -0,0 +1,201 @@
+"""Query the Overpass API from asyncio with coalescing, concurrency limits and retries
+
+Identical queries issued while one is already in flight share its result rather than
+sending a second request, using the same SHA-1 key as the query cache. A semaphore
+caps the number of requests sent to the server at once and requests refused with
+429 (too many requests) or 504 (server busy) are retried with exponential backoff.
+
+The blocking overpass.API client runs in an executor so existing query building and
+GeoJSON conversion are reused unchanged. Each executor thread has its own client,
+because overpass.API keeps the status of the last response on the instance.
+
+"""
+
+from typing import Dict, Iterable, List, NamedTuple
+
+import random
+import asyncio
+import logging
+import functools
+import threading
+
+import overpass
+from overpass.errors import MultipleRequestsError, ServerLoadError
+
+from open_cycle_export.cache_utilities.atomic_cache import (
+    load_json_entry,
+    store_json_atomic,
+)
+from open_cycle_export.route_downloader.query_overpass import (
+    minify_query,
+    hash_query,
+    get_cache_path,
+)
+
+logger = logging.getLogger(__name__)
+
+RETRY_ERRORS = (MultipleRequestsError, ServerLoadError)
+
+
+class QueryStatistics(NamedTuple):
+    query_count: int
+    cache_hit_count: int
+    coalesced_count: int
+    request_count: int
+    retry_count: int
+
+
+class AsyncOverpassClient:
+    """Asyncio Overpass client sharing in-flight queries between callers
+
+    Keyword Arguments:
+        endpoint {str} -- Overpass interpreter URL, the public server when None (default: {None})
+        max_concurrent {int} -- Maximum number of requests sent at once (default: {2})
+        max_retries {int} -- Retries after a 429 or 504 response before giving up (default: {5})
+        backoff {float} -- Seconds to wait before the first retry, doubled each retry (default: {1.0})
+        max_backoff {float} -- Longest wait between retries in seconds (default: {60.0})
+        timeout {float} -- Request timeout in seconds (default: {600})
+        cache_folder {str} -- Folder of cached results, no caching when None (default: {".cache"})
+    """
+
+    def __init__(
+        self,
+        endpoint: str = None,
+        max_concurrent: int = 2,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        timeout: float = 600,
+        cache_folder: str = ".cache",
+    ):
+        self.api_kwargs = dict(timeout=timeout)
+        if endpoint is not None:
+            self.api_kwargs["endpoint"] = endpoint
+        self.thread_local = threading.local()
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.cache_folder = cache_folder
+        self.semaphore: asyncio.Semaphore = None
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.statistics = QueryStatistics(0, 0, 0, 0, 0)
+
+    def get_api(self) -> overpass.API:
+        "The overpass client of the calling thread"
+
+        api = getattr(self.thread_local, "api", None)
+        if api is None:
+            api = self.thread_local.api = overpass.API(**self.api_kwargs)
+        return api
+
+    def get(self, minified_query, verbosity, responseformat):
+        return self.get_api().get(
+            minified_query, verbosity=verbosity, responseformat=responseformat
+        )
+
+    def count(self, **increments):
+        self.statistics = self.statistics._replace(
+            **{
+                name: getattr(self.statistics, name) + increment
+                for name, increment in increments.items()
+            }
+        )
+
+    async def query(self, query: str, verbosity="body", responseformat="geojson"):
+        """Query Overpass, sharing the result with identical queries in flight
+
+        Arguments:
+            query {str} -- Overpass QL query
+
+        Keyword Arguments:
+            verbosity {str} -- Output verbosity (default: {"body"})
+            responseformat {str} -- Output format (default: {"geojson"})
+
+        Returns:
+            Any -- Query result, read from the cache when available
+        """
+
+        self.count(query_count=1)
+        minified_query = minify_query(query)
+        query_hash = hash_query(minified_query, verbosity, responseformat)
+
+        cached_data = self.load_cached_result(query_hash)
+        if cached_data is not None:
+            self.count(cache_hit_count=1)
+            return cached_data
+
+        task = self.in_flight.get(query_hash)
+        if task is None:
+            task = asyncio.ensure_future(
+                self.fetch(query_hash, minified_query, verbosity, responseformat)
+            )
+            self.in_flight[query_hash] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(query_hash, None))
+        else:
+            self.count(coalesced_count=1)
+        return await asyncio.shield(task)
+
+    async def fetch(self, query_hash, minified_query, verbosity, responseformat):
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        get = functools.partial(self.get, minified_query, verbosity, responseformat)
+        loop = asyncio.get_event_loop()
+
+        for retry in range(self.max_retries + 1):
+            async with self.semaphore:
+                try:
+                    self.count(request_count=1)
+                    data = await loop.run_in_executor(None, get)
+                    self.store_cached_result(query_hash, data, minified_query)
+                    return data
+                except RETRY_ERRORS as error:
+                    if retry == self.max_retries:
+                        raise
+                    logger.info("overpass refused query (%r), retrying", error)
+            # Wait outside the semaphore so other queries can use the free slot
+            self.count(retry_count=1)
+            delay = min(self.max_backoff, self.backoff * 2 ** retry)
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    def load_cached_result(self, query_hash):
+        if self.cache_folder is None:
+            return None
+        return load_json_entry(get_cache_path(query_hash, self.cache_folder))
+
+    def store_cached_result(self, query_hash, data, source=None):
+        if self.cache_folder is None:
+            return
+        cache_path = get_cache_path(query_hash, self.cache_folder)
+        store_json_atomic(cache_path, data, source=source)
+
+
+async def query_overpass_all(
+    client: AsyncOverpassClient, queries: Iterable[str], **kwargs
+) -> List:
+    "Run queries concurrently through a client returning results in query order"
+
+    return await asyncio.gather(*[client.query(query, **kwargs) for query in queries])
+
+
+def query_overpass_many(queries: Iterable[str], verbosity="body", **client_kwargs):
+    """Run many queries concurrently from synchronous code
+
+    Arguments:
+        queries {Iterable[str]} -- Overpass QL queries, duplicates are only sent once
+
+    Keyword Arguments:
+        verbosity {str} -- Output verbosity (default: {"body"})
+
+    Returns:
+        List -- Result of each query in query order
+    """
+
+    client = AsyncOverpassClient(**client_kwargs)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(
+            query_overpass_all(client, queries, verbosity=verbosity)
+        )
+    finally:
+        loop.close()
@@ -10,10 +10,27 @@ def get_coordinates(geometry):
     return [(coordinate["lon"], coordinate["lat"]) for coordinate in geometry]
 
 
-def get_first_way_coordinates(members):
-    for member in members:
-        if member["type"] == "way":
-            return get_coordinates(member["geometry"])
+def create_boundary_geometry(members):
+    """GeoJSON multi polygon of a boundary relation from the geometry of its ways
+
+    Outer and inner ways are joined into rings, a boundary is usually split across
+    many ways, and inner rings are removed from the outer polygons
+    """
+
+    def polygonize_role(role):
+        lines = [
+            shapely.geometry.LineString(get_coordinates(member["geometry"]))
+            for member in members
+            if member["type"] == "way"
+            and (member.get("role") or "outer") == role
+            and len(member.get("geometry", [])) > 1
+        ]
+        return shapely.ops.unary_union(list(shapely.ops.polygonize(lines)))
+
+    polygons = polygonize_role("outer").difference(polygonize_role("inner"))
+    if isinstance(polygons, shapely.geometry.Polygon):
+        polygons = shapely.geometry.MultiPolygon([polygons])
+    return shapely.geometry.mapping(polygons)
 
 
 def download_city_boundaries(search_area):
@@ -31,19 +48,16 @@ def download_city_boundaries(search_area):
 
     return [
         {
-            "type": "feature",
+            "type": "Feature",
             "properties": {
                 key: value for key, value in element["tags"].items() if ":" not in key
             },
-            "geometry": {
-                "type": "Polygon",
-                "coordinates": get_first_way_coordinates(element["members"]),
-            },
+            "geometry": create_boundary_geometry(element["members"]),
         }
         for element in city_data["elements"]
     ]
 
 
 if __name__ == "__main__":
-    city_features = download_cities("England")
+    city_features = download_city_boundaries("England")
     print(json.dumps(city_features))
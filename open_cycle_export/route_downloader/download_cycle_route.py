@@ -1,11 +1,23 @@
+from typing import Dict, Iterable, Set
+
+import re
 import json
+import logging
 
-from open_cycle_export.route_downloader.query_overpass import query_overpass
+from osm2geojson import json2geojson
 
+from open_cycle_export.route_downloader.query_overpass import (
+    query_overpass,
+    request_overpass,
+    is_query_cached,
+    store_query_result,
+)
+
+logger = logging.getLogger(__name__)
 
-def download_cycle_route(search_area, cycle_network, route_number):
 
-    query = """
+def create_cycle_route_query(search_area, cycle_network, route_number):
+    return """
         area["name"="{search_area}"]->.boundaryarea;
         (
             relation
@@ -19,11 +31,142 @@ def download_cycle_route(search_area, cycle_network, route_number):
         search_area=search_area, cycle_network=cycle_network, route_number=route_number
     )
 
+
+def create_cycle_routes_query(search_area, cycle_network, route_numbers):
+    "Query for every route in a network whose ref is one of the route numbers"
+
+    # Escape regex characters then backslashes for the Overpass QL string
+    ref_pattern = "^({})$".format(
+        "|".join(re.escape(str(route_number)) for route_number in route_numbers)
+    ).replace("\\", "\\\\")
+
+    return """
+        area["name"="{search_area}"]->.boundaryarea;
+        (
+            relation
+                (area.boundaryarea)
+                ["route"="bicycle"]
+                ["network"="{cycle_network}"]
+                ["ref"~"{ref_pattern}"];
+            way(r);
+        );
+    """.format(
+        search_area=search_area, cycle_network=cycle_network, ref_pattern=ref_pattern
+    )
+
+
+def download_cycle_route(search_area, cycle_network, route_number):
+
     # TODO: download relation metadata
     # way(r);
     # node(w);
 
-    return query_overpass(query, "geom")
+    routes = download_cycle_routes(search_area, cycle_network, [route_number])
+    return routes[str(route_number)]
+
+
+def split_cycle_routes(response: Dict, route_numbers: Iterable) -> Dict[str, Dict]:
+    """Split the raw response to a multi-route query into GeoJSON for each route
+
+    Arguments:
+        response {Dict} -- Overpass json response with relations and their ways
+        route_numbers {Iterable} -- Route numbers the query asked for
+
+    Returns:
+        Dict[str, Dict] -- GeoJSON of each route number, as a single route query returns
+    """
+
+    route_relation_ids: Dict[str, Set[int]] = {
+        str(route_number): set() for route_number in route_numbers
+    }
+    way_ids: Dict[int, Set[int]] = {}
+    for element in response["elements"]:
+        if element["type"] == "relation":
+            route_number = element.get("tags", {}).get("ref")
+            if route_number in route_relation_ids:
+                route_relation_ids[route_number].add(element["id"])
+                way_ids[element["id"]] = {
+                    member["ref"]
+                    for member in element.get("members", [])
+                    if member["type"] == "way"
+                }
+
+    def create_route_response(relation_ids: Set[int]) -> Dict:
+        route_way_ids = set().union(
+            *[way_ids[relation_id] for relation_id in relation_ids]
+        )
+        # Keep the order of the response, ways before relations as Overpass outputs
+        # them, so features match a single route query
+        elements = [
+            element
+            for element in response["elements"]
+            if (element["type"] == "way" and element["id"] in route_way_ids)
+            or (element["type"] == "relation" and element["id"] in relation_ids)
+        ]
+        return dict(response, elements=elements)
+
+    return {
+        route_number: json2geojson(create_route_response(relation_ids))
+        for route_number, relation_ids in route_relation_ids.items()
+    }
+
+
+def download_cycle_routes(
+    search_area, cycle_network, route_numbers, chunk_size=100
+) -> Dict[str, Dict]:
+    """Download many routes of one network with one query per chunk of routes
+
+    Routes in the same area and network share one Overpass query, so the area is
+    resolved once rather than once per route. Each route is cached under the key of
+    its single route query, so later calls to download_cycle_route read the cache.
+    Routes without a relation are returned empty but not cached, so they are
+    searched for again next time.
+
+    Arguments:
+        search_area {str} -- Name of the area containing the routes
+        cycle_network {str} -- Network of the routes, for example ncn
+        route_numbers {Iterable} -- Refs of the routes
+
+    Keyword Arguments:
+        chunk_size {int} -- Maximum number of routes in each query (default: {100})
+
+    Returns:
+        Dict[str, Dict] -- GeoJSON of each route number
+    """
+
+    route_numbers = list(dict.fromkeys(map(str, route_numbers)))
+    route_queries = {
+        route_number: create_cycle_route_query(search_area, cycle_network, route_number)
+        for route_number in route_numbers
+    }
+    routes = {
+        route_number: query_overpass(query, "geom")
+        for route_number, query in route_queries.items()
+        if is_query_cached(query, "geom")
+    }
+    missing_numbers = [
+        route_number for route_number in route_numbers if route_number not in routes
+    ]
+    logger.info("download %s routes, %s cached", len(missing_numbers), len(routes))
+
+    for first in range(0, len(missing_numbers), chunk_size):
+        chunk_numbers = missing_numbers[first : first + chunk_size]
+        query = create_cycle_routes_query(search_area, cycle_network, chunk_numbers)
+        # Only the split routes are cached, the combined response would be a copy
+        response = request_overpass(query, "geom", "json")
+        for route_number, route in split_cycle_routes(response, chunk_numbers).items():
+            if route["features"]:
+                store_query_result(route_queries[route_number], route, "geom")
+            else:
+                logger.warning(
+                    "no %s route %s found in %s",
+                    cycle_network,
+                    route_number,
+                    search_area,
+                )
+            routes[route_number] = route
+
+    return routes
 
 
 if __name__ == "__main__":
@@ -1,6 +1,5 @@
 import os
 import re
-import json
 import os.path
 import hashlib
 import logging
@@ -8,6 +7,12 @@ import logging
 import requests
 import overpass
 
+from open_cycle_export.cache_utilities.atomic_cache import (
+    get_or_create_json,
+    store_json_atomic,
+)
+from open_cycle_export.cache_utilities.compression import find_entry_path
+
 api = overpass.API(timeout=600)
 
 logger = logging.getLogger(__name__)
@@ -33,23 +38,64 @@ def hash_string(string):
     return hashlib.sha1(byte_array).digest().hex()
 
 
-def get_cache_path(query_hash):
-    cache_folder = ".cache"
+def get_cache_path(query_hash, cache_folder=".cache"):
     os.makedirs(cache_folder, exist_ok=True)
     return os.path.join(cache_folder, "{}.json".format(query_hash))
 
 
+def hash_query(minified_query, verbosity, responseformat):
+    "Cache key shared by every query with the same text and output options"
+
+    return hash_string(minified_query + verbosity + responseformat)
+
+
+def get_query_cache_path(query, verbosity="body", responseformat="geojson"):
+    "Cache file holding the result of a query"
+
+    return get_cache_path(hash_query(minify_query(query), verbosity, responseformat))
+
+
+def is_query_cached(query, verbosity="body", responseformat="geojson"):
+    entry_path = find_entry_path(get_query_cache_path(query, verbosity, responseformat))
+    return entry_path is not None
+
+
+def store_query_result(query, data, verbosity="body", responseformat="geojson"):
+    "Cache the result of a query as if it had been sent with query_overpass"
+
+    cache_path = get_query_cache_path(query, verbosity, responseformat)
+    store_json_atomic(cache_path, data, source=minify_query(query))
+
+
+def create_api():
+    """Client with the settings of the module client for a single request
+
+    overpass.API keeps the status of the last response on the instance, so threads
+    sharing one client can read each other's status
+    """
+
+    return overpass.API(
+        endpoint=api.endpoint,
+        timeout=api.timeout,
+        headers=api.headers,
+        proxies=api.proxies,
+    )
+
+
+def request_overpass(query, verbosity="body", responseformat="geojson"):
+    "Send a query to Overpass without reading or writing the cache"
+
+    logger.info("query overpass")
+    kwargs = dict(verbosity=verbosity, responseformat=responseformat)
+    return create_api().get(minify_query(query), **kwargs)
+
+
 def query_overpass(query, verbosity="body", responseformat="geojson"):
     minified_query = minify_query(query)
-    query_hash = hash_string(minified_query + verbosity + responseformat)
+    query_hash = hash_query(minified_query, verbosity, responseformat)
     cache_path = get_cache_path(query_hash)
-    try:
-        data = json.load(open(cache_path))
-        logger.info("return cached result")
-        return data
-    except:
-        logger.info("query overpass")
-        kwargs = dict(verbosity=verbosity, responseformat=responseformat)
-        data = api.get(minified_query, **kwargs)
-        json.dump(data, open(cache_path, "w"))
-        return data
+
+    def send_query():
+        return request_overpass(minified_query, verbosity, responseformat)
+
+    return get_or_create_json(cache_path, send_query, source=minified_query)
@@ -0,0 +1,205 @@
+"""Local stand-in for the Overpass API which replays recorded responses
+
+Responses are stored as files named by the SHA-1 hash of the full query posted to
+the interpreter. When an upstream endpoint is given, queries without a recording are
+forwarded to it and the response is recorded, so a set of queries can be recorded
+once and replayed offline. Latency, a limit on concurrent requests answered with 429
+and periodic 504 responses can be simulated to test clients under rate limiting.
+
+    python -m open_cycle_export.route_downloader.replay_server responses --port 8080
+
+"""
+
+from typing import NamedTuple, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import os
+import time
+import logging
+import argparse
+import threading
+
+import requests
+
+from open_cycle_export.cache_utilities.atomic_cache import atomic_write
+from open_cycle_export.route_downloader.query_overpass import hash_string
+
+logger = logging.getLogger(__name__)
+
+
+class ReplayStatistics(NamedTuple):
+    request_count: int
+    replayed_count: int
+    recorded_count: int
+    missing_count: int
+    rejected_count: int
+    busy_count: int
+
+
+def get_response_path(responses_folder: str, full_query: str) -> str:
+    return os.path.join(responses_folder, "{}.json".format(hash_string(full_query)))
+
+
+def record_response(responses_folder: str, full_query: str, response_text: str):
+    "Store the response to a full Overpass query for replay"
+
+    with atomic_write(get_response_path(responses_folder, full_query)) as open_file:
+        open_file.write(response_text)
+
+
+class ReplayServer:
+    """Threaded HTTP server replaying recorded Overpass responses
+
+    Arguments:
+        responses_folder {str} -- Folder of recorded responses
+
+    Keyword Arguments:
+        upstream {str} -- Endpoint to record missing responses from (default: {None})
+        default_response {str} -- Response to queries with no recording (default: {None})
+        latency {float} -- Seconds to wait before answering each request (default: {0.0})
+        max_concurrent {int} -- Answer 429 beyond this many requests at once (default: {None})
+        busy_every {int} -- Answer every nth request with 504 (default: {0})
+        host {str} -- Address to listen on (default: {"127.0.0.1"})
+        port {int} -- Port to listen on, any free port when 0 (default: {0})
+    """
+
+    def __init__(
+        self,
+        responses_folder: str,
+        upstream: str = None,
+        default_response: str = None,
+        latency: float = 0.0,
+        max_concurrent: int = None,
+        busy_every: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.responses_folder = responses_folder
+        self.upstream = upstream
+        self.default_response = default_response
+        self.latency = latency
+        self.max_concurrent = max_concurrent
+        self.busy_every = busy_every
+        self.lock = threading.Lock()
+        self.active_count = 0
+        self.statistics = ReplayStatistics(0, 0, 0, 0, 0, 0)
+        self.http_server = ThreadingHTTPServer((host, port), self.create_handler())
+        self.http_server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.http_server.server_address[:2]
+        return "http://{}:{}/api/interpreter".format(host, port)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.http_server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, **increments):
+        with self.lock:
+            self.statistics = self.statistics._replace(
+                **{
+                    name: getattr(self.statistics, name) + increment
+                    for name, increment in increments.items()
+                }
+            )
+
+    def respond(self, full_query: str):
+        "Status code and body for a query"
+
+        with self.lock:
+            self.active_count += 1
+            active_count = self.active_count
+            request_count = self.statistics.request_count + 1
+            self.statistics = self.statistics._replace(request_count=request_count)
+        try:
+            if self.max_concurrent and active_count > self.max_concurrent:
+                self.count(rejected_count=1)
+                return 429, "Too Many Requests"
+            if self.busy_every and request_count % self.busy_every == 0:
+                self.count(busy_count=1)
+                return 504, "Gateway Timeout"
+            time.sleep(self.latency)
+            return self.replay(full_query)
+        finally:
+            with self.lock:
+                self.active_count -= 1
+
+    def replay(self, full_query: str):
+        response_path = get_response_path(self.responses_folder, full_query)
+        if os.path.exists(response_path):
+            self.count(replayed_count=1)
+            with open(response_path) as open_file:
+                return 200, open_file.read()
+        if self.upstream is not None:
+            response = requests.post(self.upstream, data={"data": full_query})
+            if response.status_code == 200:
+                record_response(self.responses_folder, full_query, response.text)
+                self.count(recorded_count=1)
+            return response.status_code, response.text
+        self.count(missing_count=1)
+        if self.default_response is not None:
+            return 200, self.default_response
+        return 404, "No recorded response"
+
+    def create_handler(self):
+        replay_server = self
+
+        class ReplayRequestHandler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                content_length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(content_length).decode("utf8")
+                full_query = parse_qs(body).get("data", [""])[0]
+                status, text = replay_server.respond(full_query)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(text.encode("utf8"))
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                logger.debug(format, *args)
+
+        return ReplayRequestHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Overpass responses")
+    parser.add_argument("responses_folder")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--upstream", help="record missing responses from here")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--max-concurrent", type=int)
+    parser.add_argument("--busy-every", type=int, default=0)
+    args = parser.parse_args()
+
+    replay_server = ReplayServer(
+        args.responses_folder,
+        upstream=args.upstream,
+        latency=args.latency,
+        max_concurrent=args.max_concurrent,
+        busy_every=args.busy_every,
+        port=args.port,
+    )
+    logger.info("replaying overpass responses at %s", replay_server.endpoint)
+    replay_server.http_server.serve_forever()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,170 @@
+import json
+import asyncio
+import tempfile
+import unittest
+import threading
+import collections
+
+from unittest import mock
+
+import overpass
+from overpass.errors import ServerLoadError
+
+from open_cycle_export.route_downloader.replay_server import (
+    ReplayServer,
+    record_response,
+)
+from open_cycle_export.route_downloader.async_query_overpass import (
+    AsyncOverpassClient,
+    query_overpass_all,
+)
+
+EMPTY_RESPONSE = json.dumps({"elements": []})
+
+NODE_RESPONSE = json.dumps(
+    {"elements": [{"type": "node", "id": 1, "lat": 51.5, "lon": -0.1}]}
+)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncQueryOverpass(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.responses_folder = self.temporary_directory.name + "/responses"
+        self.cache_folder = self.temporary_directory.name + "/cache"
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def create_client(self, replay_server, **kwargs):
+        return AsyncOverpassClient(
+            endpoint=replay_server.endpoint,
+            backoff=0.01,
+            cache_folder=self.cache_folder,
+            **kwargs
+        )
+
+    def test_replay_recorded_response(self):
+        full_query = "[out:json];node(1);out body;"
+        record_response(self.responses_folder, full_query, NODE_RESPONSE)
+        with ReplayServer(self.responses_folder) as replay_server:
+            client = self.create_client(replay_server)
+            data = run(client.query("node(1);"))
+        coordinates = data["features"][0]["geometry"]["coordinates"]
+        self.assertEqual(coordinates, [-0.1, 51.5])
+        self.assertEqual(replay_server.statistics.replayed_count, 1)
+
+    def test_coalesce_identical_queries(self):
+        with ReplayServer(
+            self.responses_folder, default_response=EMPTY_RESPONSE, latency=0.1
+        ) as replay_server:
+            client = self.create_client(replay_server)
+            queries = ["node(1);", "node( 1 );", "node(2);", "node(1);"]
+            results = run(query_overpass_all(client, queries))
+        self.assertEqual(len(results), 4)
+        self.assertEqual(replay_server.statistics.request_count, 2)
+        self.assertEqual(client.statistics.coalesced_count, 2)
+
+    def test_cached_queries_are_not_sent(self):
+        with ReplayServer(
+            self.responses_folder, default_response=EMPTY_RESPONSE
+        ) as replay_server:
+            client = self.create_client(replay_server)
+            run(client.query("node(1);"))
+            run(client.query("node(1);"))
+        self.assertEqual(replay_server.statistics.request_count, 1)
+        self.assertEqual(client.statistics.cache_hit_count, 1)
+
+    def test_limit_concurrent_requests(self):
+        with ReplayServer(
+            self.responses_folder,
+            default_response=EMPTY_RESPONSE,
+            latency=0.05,
+            max_concurrent=2,
+        ) as replay_server:
+            client = self.create_client(replay_server, max_concurrent=2)
+            queries = ["node({});".format(node) for node in range(8)]
+            run(query_overpass_all(client, queries))
+        self.assertEqual(replay_server.statistics.request_count, 8)
+        self.assertEqual(replay_server.statistics.rejected_count, 0)
+
+    def test_retry_too_many_requests(self):
+        with ReplayServer(
+            self.responses_folder,
+            default_response=EMPTY_RESPONSE,
+            latency=0.05,
+            max_concurrent=1,
+        ) as replay_server:
+            client = self.create_client(replay_server, max_concurrent=4)
+            queries = ["node({});".format(node) for node in range(4)]
+            results = run(query_overpass_all(client, queries))
+        self.assertEqual(len(results), 4)
+        self.assertGreater(replay_server.statistics.rejected_count, 0)
+        self.assertEqual(
+            client.statistics.retry_count, replay_server.statistics.rejected_count
+        )
+
+    def test_concurrent_refusals_do_not_mix(self):
+        "Should keep each response status with its own request across threads"
+
+        api_threads = collections.defaultdict(set)
+        get_from_overpass = overpass.API._get_from_overpass
+
+        def record_thread(api, *args, **kwargs):
+            api_threads[id(api)].add(threading.get_ident())
+            return get_from_overpass(api, *args, **kwargs)
+
+        with ReplayServer(
+            self.responses_folder,
+            default_response=NODE_RESPONSE,
+            latency=0.02,
+            max_concurrent=2,
+        ) as replay_server, mock.patch.object(
+            overpass.API, "_get_from_overpass", record_thread
+        ):
+            client = self.create_client(replay_server, max_concurrent=8, max_retries=20)
+            queries = ["node({});".format(node) for node in range(32)]
+            results = run(query_overpass_all(client, queries))
+        self.assertEqual(len(results), 32)
+        # overpass.API stores the last response status, so clients are not shared
+        for threads in api_threads.values():
+            self.assertEqual(len(threads), 1)
+        for data in results:
+            self.assertEqual(len(data["features"]), 1)
+        self.assertGreater(replay_server.statistics.rejected_count, 0)
+        self.assertEqual(
+            client.statistics.retry_count, replay_server.statistics.rejected_count
+        )
+        self.assertEqual(
+            replay_server.statistics.request_count, client.statistics.request_count
+        )
+
+    def test_retry_server_busy(self):
+        with ReplayServer(
+            self.responses_folder, default_response=EMPTY_RESPONSE, busy_every=2
+        ) as replay_server:
+            client = self.create_client(replay_server, max_concurrent=1)
+            queries = ["node({});".format(node) for node in range(3)]
+            run(query_overpass_all(client, queries))
+        self.assertEqual(replay_server.statistics.busy_count, 2)
+        self.assertEqual(client.statistics.retry_count, 2)
+
+    def test_give_up_after_max_retries(self):
+        with ReplayServer(
+            self.responses_folder, default_response=EMPTY_RESPONSE, busy_every=1
+        ) as replay_server:
+            client = self.create_client(replay_server, max_retries=2)
+            with self.assertRaises(ServerLoadError):
+                run(client.query("node(1);"))
+        self.assertEqual(replay_server.statistics.request_count, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
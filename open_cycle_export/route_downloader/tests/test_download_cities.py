@@ -0,0 +1,36 @@
+import unittest
+
+import shapely.geometry
+
+from open_cycle_export.route_downloader.download_cities import create_boundary_geometry
+
+
+def way_member(coordinates, role="outer"):
+    return {
+        "type": "way",
+        "role": role,
+        "geometry": [{"lon": lon, "lat": lat} for lon, lat in coordinates],
+    }
+
+
+class TestCreateBoundaryGeometry(unittest.TestCase):
+    """Test boundary relations are joined into polygons"""
+
+    def test_boundary_split_across_ways(self):
+        members = [
+            way_member([(0, 0), (4, 0), (4, 4)]),
+            way_member([(4, 4), (0, 4), (0, 0)]),
+            way_member([(1, 1), (2, 1), (2, 2), (1, 2), (1, 1)], "inner"),
+            {"type": "node", "role": "admin_centre", "lon": 2, "lat": 2},
+        ]
+        geometry = create_boundary_geometry(members)
+        self.assertEqual(geometry["type"], "MultiPolygon")
+        self.assertEqual(shapely.geometry.shape(geometry).area, 15)
+
+    def test_incomplete_boundary(self):
+        geometry = create_boundary_geometry([way_member([(0, 0), (4, 0), (4, 4)])])
+        self.assertEqual(shapely.geometry.shape(geometry).area, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from osm2geojson import json2geojson
+
+from open_cycle_export.route_downloader import query_overpass
+from open_cycle_export.route_downloader.replay_server import ReplayServer
+from open_cycle_export.route_downloader.download_cycle_route import (
+    create_cycle_routes_query,
+    split_cycle_routes,
+    download_cycle_route,
+    download_cycle_routes,
+)
+
+
+def create_way(way_id, coordinates):
+    return {
+        "type": "way",
+        "id": way_id,
+        "nodes": [way_id * 10, way_id * 10 + 1],
+        "geometry": [{"lat": lat, "lon": lon} for lon, lat in coordinates],
+        "tags": {"highway": "cycleway"},
+    }
+
+
+def create_relation(relation_id, route_number, ways):
+    return {
+        "type": "relation",
+        "id": relation_id,
+        "members": [
+            {"type": "way", "ref": way["id"], "role": "", "geometry": way["geometry"]}
+            for way in ways
+        ],
+        "tags": {"route": "bicycle", "network": "ncn", "ref": route_number},
+    }
+
+
+WAY_A = create_way(1, [(0, 0), (1, 0)])
+WAY_B = create_way(2, [(1, 0), (2, 0)])
+WAY_C = create_way(3, [(5, 5), (6, 5)])
+
+# Overpass outputs ways before relations
+RESPONSE = {
+    "elements": [
+        WAY_A,
+        WAY_B,
+        WAY_C,
+        create_relation(10, "1", [WAY_A, WAY_B]),
+        create_relation(11, "2", [WAY_B, WAY_C]),
+        create_relation(12, "22", [WAY_C]),
+    ]
+}
+
+
+def get_way_ids(route):
+    return [
+        feature["properties"]["id"]
+        for feature in route["features"]
+        if feature["properties"]["type"] == "way"
+    ]
+
+
+class TestDownloadCycleRoute(unittest.TestCase):
+    def test_query_matches_exact_refs(self):
+        query = create_cycle_routes_query("France", "icn", ["V43", "1.1"])
+        self.assertIn('["ref"~"^(V43|1\\\\.1)$"]', query)
+
+    def test_split_routes_by_relation(self):
+        routes = split_cycle_routes(RESPONSE, ["1", "2", "3"])
+        self.assertEqual(get_way_ids(routes["1"]), [1, 2])
+        self.assertEqual(get_way_ids(routes["2"]), [2, 3])
+        self.assertEqual(routes["3"]["features"], [])
+        self.assertNotIn("22", routes)
+
+    def test_split_routes_match_single_route_geojson(self):
+        "Should convert each route as the response to its single route query"
+
+        routes = split_cycle_routes(RESPONSE, ["1", "2"])
+        for route_number, ways in [("1", [WAY_A, WAY_B]), ("2", [WAY_B, WAY_C])]:
+            relation = next(
+                element
+                for element in RESPONSE["elements"]
+                if element.get("tags", {}).get("ref") == route_number
+            )
+            expected_route = json2geojson({"elements": [*ways, relation]})
+            self.assertEqual(routes[route_number], expected_route)
+
+    def download_routes(self, route_numbers):
+        "Download routes through a replay server, returning routes and cache files"
+
+        with tempfile.TemporaryDirectory() as directory:
+            working_directory = os.getcwd()
+            os.chdir(directory)
+            try:
+                with ReplayServer(
+                    "responses", default_response=json.dumps(RESPONSE)
+                ) as replay_server, mock.patch.object(
+                    query_overpass.api, "endpoint", replay_server.endpoint
+                ):
+                    routes = download_cycle_routes("England", "ncn", route_numbers)
+                    route = download_cycle_route("England", "ncn", route_numbers[-1])
+                cache_files = os.listdir(".cache")
+            finally:
+                os.chdir(working_directory)
+        return replay_server, routes, route, cache_files
+
+    def test_download_routes_in_one_query(self):
+        replay_server, routes, route, cache_files = self.download_routes([1, 2])
+        self.assertEqual(replay_server.statistics.request_count, 1)
+        self.assertEqual(route, routes["2"])
+        self.assertEqual(get_way_ids(route), [2, 3])
+        # One entry per route, the combined response is not cached
+        self.assertEqual(len(cache_files), 2)
+
+    def test_missing_routes_are_not_cached(self):
+        with self.assertLogs(
+            "open_cycle_export.route_downloader.download_cycle_route", "WARNING"
+        ) as logs:
+            replay_server, routes, route, cache_files = self.download_routes([1, 3])
+        self.assertEqual(routes["3"]["features"], [])
+        self.assertEqual(route, routes["3"])
+        self.assertEqual(len(cache_files), 1)
+        # The missing route is searched for again
+        self.assertEqual(replay_server.statistics.request_count, 2)
+        self.assertEqual(len(logs.records), 2)
+        self.assertIn("route 3", logs.output[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
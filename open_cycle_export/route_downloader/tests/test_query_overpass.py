@@ -1,5 +1,8 @@
 import unittest
 
+from unittest import mock
+
+from open_cycle_export.route_downloader import query_overpass
 from open_cycle_export.route_downloader.query_overpass import minify_query
 
 
@@ -29,3 +32,14 @@ class TestQueryOverpass(unittest.TestCase):
         )
         expected_query = """area["name"="United Kingdom"]->.boundaryarea;(relation(area.boundaryarea)["route"="bicycle"]["network"="ncn"]["ref"="22"];way(r););"""
         self.assertEqual(minified_query, expected_query)
+
+    def test_each_request_has_its_own_client(self):
+        "Should not share response status between threads"
+
+        with mock.patch.object(query_overpass.api, "endpoint", "http://localhost/api"):
+            first_api = query_overpass.create_api()
+            second_api = query_overpass.create_api()
+        self.assertIsNot(first_api, second_api)
+        self.assertIsNot(first_api, query_overpass.api)
+        self.assertEqual(first_api.endpoint, "http://localhost/api")
+        self.assertEqual(first_api.timeout, query_overpass.api.timeout)
@@ -0,0 +1,192 @@
+"""Find elevations offline from SRTM style tiles in a local directory
+
+Each tile covers one degree of latitude and longitude and is named by its south west
+corner, for example N51W001 covers latitudes 51 to 52 and longitudes -1 to 0. Tiles
+are square grids of samples running from the north west corner, one row per line of
+latitude, with the samples on the edges shared with the neighbouring tiles.
+
+.hgt files hold big-endian 16 bit samples, 1201 per row for 3 arc second data and
+3601 for 1 arc second data. Rasters converted from other formats, such as GeoTIFF,
+can be stored as .npy files holding the same grid. Tiles are memory mapped so only
+the pages around a route are read from disk.
+
+"""
+
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import os
+import math
+import logging
+import threading
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+HGT_VOID = -32768
+
+Coordinate = Tuple[float, float]
+
+
+def get_tile_name(latitude: int, longitude: int) -> str:
+    "Name of the tile with its south west corner at a whole degree"
+
+    return "{}{:02d}{}{:03d}".format(
+        "N" if latitude >= 0 else "S",
+        abs(latitude),
+        "E" if longitude >= 0 else "W",
+        abs(longitude),
+    )
+
+
+def load_tile(directory: str, tile_name: str) -> Optional[numpy.ndarray]:
+    """Memory map a tile from a directory
+
+    Arguments:
+        directory {str} -- Directory of .hgt or .npy tiles
+        tile_name {str} -- Name of the tile, for example N51W001
+
+    Raises:
+        ValueError -- When a tile is not a square grid
+
+    Returns:
+        Optional[numpy.ndarray] -- Samples from the north west corner or None when there is no tile
+    """
+
+    hgt_path = os.path.join(directory, tile_name + ".hgt")
+    npy_path = os.path.join(directory, tile_name + ".npy")
+    if os.path.exists(hgt_path):
+        sample_count = int(round(math.sqrt(os.path.getsize(hgt_path) // 2)))
+        if sample_count * sample_count * 2 != os.path.getsize(hgt_path):
+            raise ValueError("{} is not a square grid".format(hgt_path))
+        return numpy.memmap(
+            hgt_path, dtype=">i2", mode="r", shape=(sample_count, sample_count)
+        )
+    if os.path.exists(npy_path):
+        samples = numpy.load(npy_path, mmap_mode="r")
+        if samples.ndim != 2 or samples.shape[0] != samples.shape[1]:
+            raise ValueError("{} is not a square grid".format(npy_path))
+        return samples
+    return None
+
+
+def interpolate_tile(
+    samples: numpy.ndarray,
+    latitude_fractions: numpy.ndarray,
+    longitude_fractions: numpy.ndarray,
+    void_value: float = HGT_VOID,
+) -> numpy.ndarray:
+    """Bilinear interpolation of the samples of a tile at many coordinates
+
+    Void samples are left out and the remaining samples around a coordinate are
+    weighted as before, so a coordinate is only void when all four samples are.
+
+    Arguments:
+        samples {numpy.ndarray} -- Tile samples from the north west corner
+        latitude_fractions {numpy.ndarray} -- Latitudes from 0 on the south edge of the tile to 1 on the north edge
+        longitude_fractions {numpy.ndarray} -- Longitudes from 0 on the west edge of the tile to 1 on the east edge
+
+    Keyword Arguments:
+        void_value {float} -- Sample value marking missing data (default: {-32768})
+
+    Returns:
+        numpy.ndarray -- Elevation at each coordinate, NaN where there is no data
+    """
+
+    last = samples.shape[0] - 1
+    rows = (1 - latitude_fractions) * last
+    columns = longitude_fractions * last
+    # Coordinates on the south or east edge use the last cell of the tile
+    row_starts = numpy.minimum(rows.astype(numpy.int64), last - 1)
+    column_starts = numpy.minimum(columns.astype(numpy.int64), last - 1)
+    row_fractions = rows - row_starts
+    column_fractions = columns - column_starts
+
+    corner_weights, corner_values = [], []
+    for row_offset, row_weights in [(0, 1 - row_fractions), (1, row_fractions)]:
+        for column_offset, column_weights in [
+            (0, 1 - column_fractions),
+            (1, column_fractions),
+        ]:
+            values = numpy.asarray(
+                samples[row_starts + row_offset, column_starts + column_offset],
+                dtype=float,
+            )
+            weights = row_weights * column_weights
+            weights[values == void_value] = 0.0
+            corner_weights.append(weights)
+            corner_values.append(values)
+
+    weights = numpy.array(corner_weights)
+    weight_sums = weights.sum(axis=0)
+    weighted_sums = (weights * numpy.array(corner_values)).sum(axis=0)
+    elevations = numpy.full(len(rows), numpy.nan)
+    has_data = weight_sums > 0
+    elevations[has_data] = weighted_sums[has_data] / weight_sums[has_data]
+    return elevations
+
+
+def create_dem_elevation_finder(
+    directory: str, void_value: float = HGT_VOID
+) -> Callable[[Sequence[Coordinate]], List[Optional[float]]]:
+    """Create a function finding elevations from the tiles in a directory
+
+    Tiles are memory mapped the first time a coordinate falls inside them and kept
+    open for later routes.
+
+    Arguments:
+        directory {str} -- Directory of .hgt or .npy tiles
+
+    Keyword Arguments:
+        void_value {float} -- Sample value marking missing data (default: {-32768})
+
+    Returns:
+        Callable[[Sequence[Coordinate]], List[Optional[float]]] -- Function finding the elevation of longitude, latitude coordinates, None where there is no data
+    """
+
+    tiles: Dict[Tuple[int, int], Optional[numpy.ndarray]] = {}
+    tiles_lock = threading.Lock()
+
+    def get_tile(tile_latitude: int, tile_longitude: int):
+        with tiles_lock:
+            key = (tile_latitude, tile_longitude)
+            if key not in tiles:
+                tile_name = get_tile_name(tile_latitude, tile_longitude)
+                tiles[key] = load_tile(directory, tile_name)
+                if tiles[key] is None:
+                    logger.warning("no elevation tile %s in %s", tile_name, directory)
+            return tiles[key]
+
+    def find_elevation_array(coordinates: Sequence[Coordinate]) -> numpy.ndarray:
+        coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+        longitudes, latitudes = coordinates[:, 0], coordinates[:, 1]
+        elevations = numpy.full(len(coordinates), numpy.nan)
+        tile_latitudes = numpy.floor(latitudes).astype(numpy.int64)
+        tile_longitudes = numpy.floor(longitudes).astype(numpy.int64)
+        tile_keys, tile_indexes = numpy.unique(
+            (tile_latitudes + 90) * 360 + tile_longitudes + 180, return_inverse=True
+        )
+        for tile_index, tile_key in enumerate(tile_keys.tolist()):
+            tile_latitude, tile_longitude = tile_key // 360 - 90, tile_key % 360 - 180
+            samples = get_tile(tile_latitude, tile_longitude)
+            if samples is None:
+                continue
+            in_tile = tile_indexes == tile_index
+            elevations[in_tile] = interpolate_tile(
+                samples,
+                latitudes[in_tile] - tile_latitude,
+                longitudes[in_tile] - tile_longitude,
+                void_value,
+            )
+        return elevations
+
+    def find_elevations(coordinates: Sequence[Coordinate]) -> List[Optional[float]]:
+        elevations = find_elevation_array(coordinates)
+        is_void = numpy.isnan(elevations)
+        if not is_void.any():
+            return elevations.tolist()
+        elevations = elevations.astype(object)
+        elevations[is_void] = None
+        return elevations.tolist()
+
+    return find_elevations
@@ -1,29 +1,80 @@
-from typing import List, Tuple
+from typing import Callable, List, Optional, Sequence, Tuple
 
-import re
-import json
+import os
 import logging
+import functools
 
-import requests
+from open_cycle_export.route_exporter.dem_elevation_finder import (
+    create_dem_elevation_finder,
+)
+from open_cycle_export.route_exporter.remote_elevation_finder import (
+    RemoteElevationFinder,
+)
 
 logger = logging.getLogger(__name__)
 
+DEM_DIRECTORY_VARIABLE = "OPEN_CYCLE_EXPORT_DEM_DIRECTORY"
+ELEVATION_CACHE_VARIABLE = "OPEN_CYCLE_EXPORT_ELEVATION_CACHE"
+ELEVATION_CHUNK_SIZE_VARIABLE = "OPEN_CYCLE_EXPORT_ELEVATION_CHUNK_SIZE"
+ELEVATION_WORKERS_VARIABLE = "OPEN_CYCLE_EXPORT_ELEVATION_WORKERS"
 
-def find_elevations(coordinates: List[Tuple[float, float]]) -> List[float]:
-    endpoint = "https://api.open-elevation.com/api/v1/lookup"
-    request = requests.post(
-        endpoint,
-        {
-            "locations": [
-                {"latitude": latitude, "longitude": longitude}
-                for (longitude, latitude) in coordinates
-            ]
-        },
+# A folder of its own keeps the database and its WAL files together as one entry
+# of the cache index
+DEFAULT_ELEVATION_CACHE = os.path.join(".cache", "elevations", "elevations.sqlite")
+
+ElevationFinder = Callable[[Sequence[Tuple[float, float]]], List[Optional[float]]]
+
+
+@functools.lru_cache(maxsize=None)
+def create_elevation_finder(
+    dem_directory: str = None,
+    cache_path: Optional[str] = DEFAULT_ELEVATION_CACHE,
+    chunk_size: int = 500,
+    workers: int = 4,
+) -> ElevationFinder:
+    """Elevation finder reading local tiles from a directory, or the remote API
+
+    Arguments:
+        dem_directory {str} -- Directory of .hgt or .npy tiles, the remote API when None
+
+    Keyword Arguments:
+        cache_path {str} -- Database caching remote elevations, no caching when None (default: {DEFAULT_ELEVATION_CACHE})
+        chunk_size {int} -- Maximum number of coordinates in each remote request (default: {500})
+        workers {int} -- Maximum number of remote requests sent at once (default: {4})
+
+    Returns:
+        ElevationFinder -- Function finding the elevation of longitude, latitude coordinates
+    """
+
+    if dem_directory is None:
+        return RemoteElevationFinder(
+            cache_path=cache_path, chunk_size=chunk_size, workers=workers
+        )
+    return create_dem_elevation_finder(dem_directory)
+
+
+def get_elevation_finder() -> ElevationFinder:
+    "Elevation finder for the tile directory and remote settings in the environment"
+
+    return create_elevation_finder(
+        os.environ.get(DEM_DIRECTORY_VARIABLE) or None,
+        os.environ.get(ELEVATION_CACHE_VARIABLE, DEFAULT_ELEVATION_CACHE) or None,
+        int(os.environ.get(ELEVATION_CHUNK_SIZE_VARIABLE) or 500),
+        int(os.environ.get(ELEVATION_WORKERS_VARIABLE) or 4),
     )
-    try:
-        response = request.json()
-        return [result["elevation"] for result in response["results"]]
-    except json.decoder.JSONDecodeError:
-        error = re.search(r"<title>(.*)</title>", request.text)
-        logger.error("Elevation not found - %s", error.group(1))
-        return []
+
+
+def find_elevations(
+    coordinates: Sequence[Tuple[float, float]]
+) -> List[Optional[float]]:
+    "Elevation of longitude, latitude coordinates from the remote API"
+
+    return create_elevation_finder()(coordinates)
+
+
+def log_elevation_statistics():
+    "Log how many remote elevations were found in the cache, when the API was used"
+
+    elevation_finder = get_elevation_finder()
+    if isinstance(elevation_finder, RemoteElevationFinder):
+        elevation_finder.log_statistics()
@@ -0,0 +1,325 @@
+"""Find elevations from an Open-Elevation style web API with a persistent cache
+
+Coordinates are rounded to a fixed precision, about a metre by default, and looked
+up in a SQLite cache before any request is sent, so exporting a route in the reverse
+direction or exporting it again finds every elevation without a network call. Each
+distinct coordinate missing from the cache is requested once, in chunks posted over
+one keep-alive session from a small thread pool, and chunks refused by the server
+are retried with exponential backoff.
+
+"""
+
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import os
+import time
+import random
+import sqlite3
+import logging
+import threading
+import concurrent.futures
+
+import numpy
+import requests
+
+from requests.adapters import HTTPAdapter
+
+from open_cycle_export.route_processor.node_registry import (
+    quantize_coordinates,
+    pack_coordinate_keys,
+)
+
+logger = logging.getLogger(__name__)
+
+OPEN_ELEVATION_ENDPOINT = "https://api.open-elevation.com/api/v1/lookup"
+
+COORDINATE_PRECISION = 1e-5
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS elevations (
+        longitude INTEGER NOT NULL,
+        latitude INTEGER NOT NULL,
+        elevation REAL NOT NULL,
+        PRIMARY KEY (longitude, latitude)
+    ) WITHOUT ROWID;
+"""
+
+Coordinate = Tuple[float, float]
+QuantizedCoordinate = Tuple[int, int]
+
+
+class ElevationStatistics(NamedTuple):
+    lookup_count: int
+    cache_hit_count: int
+    request_count: int
+    retry_count: int
+    failed_count: int
+
+
+class ElevationError(Exception):
+    pass
+
+
+def parse_elevations(payload, point_count: int) -> List[Optional[float]]:
+    """Elevations from the json body of a lookup response
+
+    Arguments:
+        payload {Any} -- Parsed json body
+        point_count {int} -- Number of points requested
+
+    Raises:
+        ElevationError -- When the body is not a list of results for every point
+
+    Returns:
+        List[Optional[float]] -- Elevation of each point, None where it is missing
+    """
+
+    results = payload.get("results") if isinstance(payload, dict) else None
+    if not isinstance(results, list):
+        raise ElevationError("no results in response {:.200}".format(str(payload)))
+    if len(results) != point_count:
+        raise ElevationError(
+            "{} results for {} points".format(len(results), point_count)
+        )
+    elevations = []
+    for result in results:
+        if not isinstance(result, dict):
+            raise ElevationError("invalid result {!r}".format(result))
+        elevation = result.get("elevation")
+        if not isinstance(elevation, (int, float, type(None))):
+            raise ElevationError("invalid elevation {!r}".format(elevation))
+        elevations.append(elevation)
+    return elevations
+
+
+class ElevationCache:
+    """SQLite table of elevations keyed by quantized longitude and latitude
+
+    Arguments:
+        database_path {str} -- Path of the database, created when missing
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self.local = threading.local()
+        folder = os.path.dirname(os.path.abspath(database_path))
+        os.makedirs(folder, exist_ok=True)
+        with self.connect() as connection:
+            connection.executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        "Connection of the current thread, opened the first time it is used"
+
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.database_path, timeout=60)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TEMP TABLE lookup (longitude INTEGER, latitude INTEGER)"
+            )
+            self.local.connection = connection
+        return connection
+
+    def lookup(
+        self, keys: Iterable[QuantizedCoordinate]
+    ) -> Dict[QuantizedCoordinate, float]:
+        "Cached elevation of each quantized coordinate found in the cache"
+
+        connection = self.connect()
+        with connection:
+            connection.execute("DELETE FROM lookup")
+            connection.executemany("INSERT INTO lookup VALUES (?, ?)", keys)
+            rows = connection.execute(
+                """
+                SELECT elevations.longitude, elevations.latitude, elevation
+                FROM lookup JOIN elevations USING (longitude, latitude)
+                """
+            ).fetchall()
+        return {
+            (longitude, latitude): elevation for longitude, latitude, elevation in rows
+        }
+
+    def store(self, elevations: Dict[QuantizedCoordinate, float]):
+        connection = self.connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO elevations VALUES (?, ?, ?)",
+                [(*key, elevation) for key, elevation in elevations.items()],
+            )
+
+    def __len__(self) -> int:
+        return self.connect().execute("SELECT COUNT(*) FROM elevations").fetchone()[0]
+
+    def close(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+class RemoteElevationFinder:
+    """Elevation finder sending cached, chunked requests to an elevation API
+
+    Instances are callable with a sequence of longitude, latitude coordinates and can
+    be shared between threads, which then share the session and the thread pool.
+
+    Keyword Arguments:
+        endpoint {str} -- Lookup URL of an Open-Elevation style API (default: {OPEN_ELEVATION_ENDPOINT})
+        cache_path {str} -- SQLite database of elevations, no caching when None (default: {None})
+        chunk_size {int} -- Maximum number of coordinates in each request (default: {500})
+        workers {int} -- Maximum number of requests sent at once (default: {4})
+        precision {float} -- Coordinates closer than this share an elevation (default: {1e-5})
+        max_retries {int} -- Retries of a failed request before giving up (default: {3})
+        backoff {float} -- Seconds to wait before the first retry, doubled each retry (default: {1.0})
+        timeout {float} -- Request timeout in seconds (default: {60})
+    """
+
+    def __init__(
+        self,
+        endpoint: str = OPEN_ELEVATION_ENDPOINT,
+        cache_path: str = None,
+        chunk_size: int = 500,
+        workers: int = 4,
+        precision: float = COORDINATE_PRECISION,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        timeout: float = 60,
+    ):
+        self.endpoint = endpoint
+        self.cache = ElevationCache(cache_path) if cache_path is not None else None
+        self.chunk_size = chunk_size
+        self.precision = precision
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self.lock = threading.Lock()
+        self.statistics = ElevationStatistics(0, 0, 0, 0, 0)
+
+    def count(self, **increments):
+        with self.lock:
+            self.statistics = self.statistics._replace(
+                **{
+                    name: getattr(self.statistics, name) + increment
+                    for name, increment in increments.items()
+                }
+            )
+
+    def __call__(self, coordinates: Sequence[Coordinate]) -> List[Optional[float]]:
+        """Elevation of each coordinate, None where it could not be found
+
+        Arguments:
+            coordinates {Sequence[Coordinate]} -- Longitude, latitude coordinates
+
+        Returns:
+            List[Optional[float]] -- Elevation of each coordinate in order
+        """
+
+        if len(coordinates) == 0:
+            return []
+        quantized_coordinates = quantize_coordinates(coordinates, self.precision)
+        _, first_indexes, inverse = numpy.unique(
+            pack_coordinate_keys(quantized_coordinates),
+            return_index=True,
+            return_inverse=True,
+        )
+        keys = [tuple(key) for key in quantized_coordinates[first_indexes].tolist()]
+
+        elevations = self.cache.lookup(keys) if self.cache is not None else {}
+        missing_keys = [key for key in keys if key not in elevations]
+        self.count(lookup_count=len(keys), cache_hit_count=len(elevations))
+        if missing_keys:
+            found_elevations = self.request_elevations(missing_keys)
+            if self.cache is not None and found_elevations:
+                self.cache.store(found_elevations)
+            elevations.update(found_elevations)
+        logger.debug(
+            "found %s elevations, %s cached, %s requested",
+            len(keys),
+            len(keys) - len(missing_keys),
+            len(missing_keys),
+        )
+
+        unique_elevations = [elevations.get(key) for key in keys]
+        return [unique_elevations[index] for index in inverse.tolist()]
+
+    def request_elevations(
+        self, keys: List[QuantizedCoordinate]
+    ) -> Dict[QuantizedCoordinate, float]:
+        "Elevations of quantized coordinates from the API, leaving out failed chunks"
+
+        chunks = [
+            keys[first : first + self.chunk_size]
+            for first in range(0, len(keys), self.chunk_size)
+        ]
+        futures = [self.executor.submit(self.request_chunk, chunk) for chunk in chunks]
+        elevations = {}
+        for chunk, future in zip(chunks, futures):
+            try:
+                chunk_elevations = future.result()
+            except ElevationError as error:
+                logger.error("no elevation for %s points - %s", len(chunk), error)
+                self.count(failed_count=len(chunk))
+                continue
+            for key, elevation in zip(chunk, chunk_elevations):
+                if elevation is not None:
+                    elevations[key] = elevation
+        return elevations
+
+    def request_chunk(self, keys: List[QuantizedCoordinate]) -> List[Optional[float]]:
+        locations = [
+            {
+                "latitude": round(latitude * self.precision, 7),
+                "longitude": round(longitude * self.precision, 7),
+            }
+            for longitude, latitude in keys
+        ]
+        for retry in range(self.max_retries + 1):
+            self.count(request_count=1)
+            try:
+                response = self.session.post(
+                    self.endpoint, json={"locations": locations}, timeout=self.timeout
+                )
+                if response.status_code not in RETRY_STATUS_CODES:
+                    if response.status_code >= 400:
+                        raise ElevationError("status {}".format(response.status_code))
+                    return parse_elevations(response.json(), len(keys))
+                error = "status {}".format(response.status_code)
+            except ValueError as value_error:
+                # Error pages are returned as html rather than json
+                error = "invalid response {!r}".format(value_error)
+            except requests.RequestException as request_error:
+                error = repr(request_error)
+            if retry == self.max_retries:
+                raise ElevationError(error)
+            logger.info("elevation request failed (%s), retrying", error)
+            self.count(retry_count=1)
+            time.sleep(self.backoff * 2 ** retry * random.uniform(0.5, 1.0))
+        return []
+
+    def log_statistics(self):
+        "Log the share of elevations found in the cache since the finder was created"
+
+        statistics = self.statistics
+        hit_rate = statistics.cache_hit_count / max(statistics.lookup_count, 1)
+        logger.info(
+            "elevations: %s points, %.1f%% cached, %s requests, %s retries, %s failed",
+            statistics.lookup_count,
+            100 * hit_rate,
+            statistics.request_count,
+            statistics.retry_count,
+            statistics.failed_count,
+        )
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
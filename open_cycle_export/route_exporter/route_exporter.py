@@ -1,8 +1,10 @@
-from typing import Iterable, Tuple
+from typing import IO, Iterable, Optional, Tuple
 
 import logging
 import itertools
 
+from xml.sax.saxutils import escape
+
 import gpxpy.gpx
 
 logger = logging.getLogger(__name__)
@@ -10,6 +12,27 @@ logger = logging.getLogger(__name__)
 Coordinate = Tuple[float, float]
 Coordinates = Iterable[Coordinate]
 
+GPXPY_CREATOR = "gpx.py -- https://github.com/tkrajina/gpxpy"
+
+GPX_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<gpx xmlns="http://www.topografix.com/GPX/1/1"'
+    ' xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance"'
+    ' xsi:schemaLocation="http://www.topografix.com/GPX/1/1'
+    ' http://www.topografix.com/GPX/1/1/gpx.xsd"'
+    ' version="1.1" creator="{creator}">\n'
+    "  <trk>\n"
+    "    <trkseg>"
+)
+
+GPX_FOOTER = "\n    </trkseg>\n  </trk>\n</gpx>"
+
+TRACK_POINT = '\n      <trkpt lat="{}" lon="{}">\n      </trkpt>'
+
+ELEVATION_TRACK_POINT = (
+    '\n      <trkpt lat="{}" lon="{}">\n        <ele>{}</ele>\n      </trkpt>'
+)
+
 
 def generate_gpx_file(coordinates: Coordinates, elevations: Iterable[float] = []):
 
@@ -30,3 +53,68 @@ def generate_gpx_file(coordinates: Coordinates, elevations: Iterable[float] = []
         gpx_segment.points.append(track_point)
 
     return gpx.to_xml()
+
+
+def format_number(value) -> str:
+    "Number as gpxpy writes it, in positional notation as GPX 1.1 requires"
+
+    text = str(value)
+    if isinstance(value, float) and "e" in text:
+        return format(value, ".10f").rstrip("0").rstrip(".")
+    return text
+
+
+def format_track_point(longitude, latitude, elevation: Optional[float]) -> str:
+    if elevation is None:
+        return TRACK_POINT.format(format_number(latitude), format_number(longitude))
+    return ELEVATION_TRACK_POINT.format(
+        format_number(latitude), format_number(longitude), format_number(elevation)
+    )
+
+
+def write_gpx_track(
+    open_file: IO[str],
+    coordinates: Coordinates,
+    elevations: Iterable[Optional[float]] = (),
+    creator: str = GPXPY_CREATOR,
+    chunk_size: int = 4096,
+) -> int:
+    """Write a single track GPX file, streaming track points from the iterables
+
+    The output is the same as generate_gpx_file for the same points, without
+    building a gpxpy object for every point or the whole document in memory.
+
+    Arguments:
+        open_file {IO[str]} -- Text file to write to
+        coordinates {Coordinates} -- Longitude, latitude of each track point
+
+    Keyword Arguments:
+        elevations {Iterable[Optional[float]]} -- Elevation of each track point, none for missing points (default: {()})
+        creator {str} -- Creator attribute of the document (default: {GPXPY_CREATOR})
+        chunk_size {int} -- Number of track points formatted for each write (default: {4096})
+
+    Raises:
+        ValueError -- When there are more elevations than coordinates
+
+    Returns:
+        int -- Number of track points written
+    """
+
+    open_file.write(GPX_HEADER.format(creator=escape(creator, {'"': "&quot;"})))
+    points = itertools.zip_longest(coordinates, elevations)
+    point_count = 0
+    while True:
+        chunk = list(itertools.islice(points, chunk_size))
+        if not chunk:
+            break
+        if chunk[-1][0] is None:
+            raise ValueError("more elevations than coordinates")
+        open_file.write(
+            "".join(
+                format_track_point(longitude, latitude, elevation)
+                for (longitude, latitude), elevation in chunk
+            )
+        )
+        point_count += len(chunk)
+    open_file.write(GPX_FOOTER)
+    return point_count
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+import numpy
+
+from open_cycle_export.route_exporter.dem_elevation_finder import (
+    HGT_VOID,
+    get_tile_name,
+    load_tile,
+    create_dem_elevation_finder,
+)
+
+SAMPLE_COUNT = 121
+
+
+def create_plane_tile(tile_latitude, tile_longitude):
+    "Samples of a plane, which bilinear interpolation reproduces exactly"
+
+    latitudes = numpy.linspace(tile_latitude + 1, tile_latitude, SAMPLE_COUNT)
+    longitudes = numpy.linspace(tile_longitude, tile_longitude + 1, SAMPLE_COUNT)
+    return (
+        (1200 * (latitudes[:, None] - 50) + 120 * (longitudes[None, :] + 2))
+        .round()
+        .astype(">i2")
+    )
+
+
+class TestDemElevationFinder(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = self.temporary_directory.name
+        for tile_latitude, tile_longitude in [(51, -1), (51, 0)]:
+            samples = create_plane_tile(tile_latitude, tile_longitude)
+            tile_name = get_tile_name(tile_latitude, tile_longitude)
+            samples.tofile(os.path.join(self.directory, tile_name + ".hgt"))
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_tile_name(self):
+        self.assertEqual(get_tile_name(51, -1), "N51W001")
+        self.assertEqual(get_tile_name(-34, 151), "S34E151")
+
+    def test_load_hgt_tile(self):
+        samples = load_tile(self.directory, "N51W001")
+        self.assertEqual(samples.shape, (SAMPLE_COUNT, SAMPLE_COUNT))
+        self.assertEqual(samples[0, 0], 2520)
+        self.assertIsNone(load_tile(self.directory, "N10E010"))
+
+    def test_interpolate_across_tiles(self):
+        find_elevations = create_dem_elevation_finder(self.directory)
+        coordinates = [(-0.5, 51.5), (-0.123, 51.456), (0.0, 51.2), (0.75, 51.999)]
+        elevations = find_elevations(coordinates)
+        expected = [1200 * (lat - 50) + 120 * (lon + 2) for lon, lat in coordinates]
+        numpy.testing.assert_allclose(elevations, expected, atol=1e-6)
+
+    def test_missing_tile(self):
+        find_elevations = create_dem_elevation_finder(self.directory)
+        with self.assertLogs(level="WARNING"):
+            elevations = find_elevations([(-0.5, 51.5), (5.5, 45.5)])
+        self.assertIsNotNone(elevations[0])
+        self.assertIsNone(elevations[1])
+
+    def test_skip_void_samples(self):
+        samples = numpy.full((SAMPLE_COUNT, SAMPLE_COUNT), 200, dtype=">i2")
+        samples[:, 60:] = HGT_VOID
+        samples.tofile(os.path.join(self.directory, "N10E010.hgt"))
+        find_elevations = create_dem_elevation_finder(self.directory)
+        elevations = find_elevations([(10.1, 10.5), (10.495, 10.5), (10.9, 10.5)])
+        self.assertEqual(elevations[:2], [200, 200])
+        self.assertIsNone(elevations[2])
+
+    def test_npy_tile(self):
+        samples = numpy.arange(9, dtype=numpy.float32).reshape(3, 3)
+        numpy.save(os.path.join(self.directory, "S01W001.npy"), samples)
+        find_elevations = create_dem_elevation_finder(self.directory)
+        self.assertEqual(find_elevations([(-0.5, -0.5), (-1.0, -1.0)]), [4.0, 6.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+import json
+import tempfile
+import threading
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from open_cycle_export.route_exporter.remote_elevation_finder import (
+    ElevationCache,
+    RemoteElevationFinder,
+)
+
+
+def plane_elevation(longitude, latitude):
+    return round(1000 * latitude + 100 * longitude, 3)
+
+
+class ElevationServer:
+    "Stub elevation API answering with a plane, failing the first requests"
+
+    def __init__(self, failure_count=0, failure_status=503, body=None):
+        self.failure_count = failure_count
+        self.failure_status = failure_status
+        self.body = body
+        self.request_sizes = []
+        self.lock = threading.Lock()
+        elevation_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                content_length = int(self.headers.get("Content-Length", 0))
+                locations = json.loads(self.rfile.read(content_length))["locations"]
+                with elevation_server.lock:
+                    elevation_server.request_sizes.append(len(locations))
+                    fail = len(elevation_server.request_sizes) <= failure_count
+                if fail:
+                    self.send_response(elevation_server.failure_status)
+                    self.end_headers()
+                    self.wfile.write(b"<title>Unavailable</title>")
+                    return
+                results = [
+                    dict(
+                        location,
+                        elevation=plane_elevation(
+                            location["longitude"], location["latitude"]
+                        ),
+                    )
+                    for location in locations
+                ]
+                body = elevation_server.body or {"results": results}
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(json.dumps(body).encode("utf8"))
+
+            def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+                pass
+
+        self.http_server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.http_server.daemon_threads = True
+        self.thread = threading.Thread(target=self.http_server.serve_forever)
+        self.thread.daemon = True
+
+    @property
+    def endpoint(self):
+        host, port = self.http_server.server_address[:2]
+        return "http://{}:{}/api/v1/lookup".format(host, port)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.http_server.shutdown()
+        self.http_server.server_close()
+        self.thread.join()
+
+
+COORDINATES = [(-0.1 - 0.0001 * index, 51.5 + 0.0002 * index) for index in range(25)]
+
+
+class TestRemoteElevationFinder(unittest.TestCase):
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.cache_path = self.temporary_directory.name + "/elevations.sqlite"
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def create_finder(self, endpoint, **kwargs):
+        kwargs.setdefault("cache_path", self.cache_path)
+        finder = RemoteElevationFinder(endpoint, backoff=0.0, **kwargs)
+        self.addCleanup(finder.close)
+        return finder
+
+    def test_chunked_requests(self):
+        with ElevationServer() as server:
+            find_elevations = self.create_finder(server.endpoint, chunk_size=10)
+            elevations = find_elevations(COORDINATES)
+        self.assertEqual(sorted(server.request_sizes), [5, 10, 10])
+        expected = [plane_elevation(*coordinate) for coordinate in COORDINATES]
+        for elevation, expected_elevation in zip(elevations, expected):
+            self.assertAlmostEqual(elevation, expected_elevation, places=2)
+
+    def test_duplicates_requested_once(self):
+        coordinates = COORDINATES[:5] + [(-0.1000001, 51.5000001)] + COORDINATES[:5]
+        with ElevationServer() as server:
+            find_elevations = self.create_finder(server.endpoint, cache_path=None)
+            elevations = find_elevations(coordinates)
+        self.assertEqual(server.request_sizes, [5])
+        self.assertEqual(len(elevations), 11)
+        self.assertEqual(elevations[:5], elevations[6:])
+        self.assertEqual(elevations[5], elevations[0])
+
+    def test_reverse_and_repeat_use_cache(self):
+        with ElevationServer() as server:
+            find_elevations = self.create_finder(server.endpoint)
+            elevations = find_elevations(COORDINATES)
+            reverse_elevations = find_elevations(COORDINATES[::-1])
+            self.assertEqual(reverse_elevations, elevations[::-1])
+            self.assertEqual(find_elevations.statistics.request_count, 1)
+            self.assertEqual(find_elevations.statistics.cache_hit_count, 25)
+
+            # A new finder, as in a later run, reads the database
+            find_elevations = self.create_finder(server.endpoint)
+            self.assertEqual(find_elevations(COORDINATES), elevations)
+        self.assertEqual(len(server.request_sizes), 1)
+        self.assertEqual(find_elevations.statistics.cache_hit_count, 25)
+        with self.assertLogs(level="INFO") as logs:
+            find_elevations.log_statistics()
+        self.assertIn("100.0% cached", logs.output[0])
+
+    def test_retry_busy_server(self):
+        with ElevationServer(failure_count=2) as server:
+            find_elevations = self.create_finder(server.endpoint)
+            elevations = find_elevations(COORDINATES[:3])
+        self.assertNotIn(None, elevations)
+        self.assertEqual(find_elevations.statistics.retry_count, 2)
+        self.assertEqual(len(server.request_sizes), 3)
+
+    def test_failed_chunk_not_cached(self):
+        with ElevationServer(failure_count=1, failure_status=400) as server:
+            find_elevations = self.create_finder(server.endpoint, chunk_size=10)
+            with self.assertLogs(level="ERROR"):
+                elevations = find_elevations(COORDINATES[:10])
+            self.assertEqual(elevations, [None] * 10)
+            self.assertEqual(find_elevations.statistics.failed_count, 10)
+            self.assertEqual(len(ElevationCache(self.cache_path)), 0)
+
+            self.assertNotIn(None, find_elevations(COORDINATES[:10]))
+        self.assertEqual(len(server.request_sizes), 2)
+
+    def test_malformed_results_fail_chunk(self):
+        "Should fail the chunk rather than raise for json without valid results"
+
+        bodies = [
+            {"error": "Invalid JSON."},
+            {"results": None},
+            {"results": "none"},
+            {"results": [1, 2, 3]},
+            {"results": [{"elevation": "high"}] * 3},
+        ]
+        for body in bodies:
+            with self.subTest(body=body), ElevationServer(body=body) as server:
+                find_elevations = self.create_finder(server.endpoint, cache_path=None)
+                with self.assertLogs(level="ERROR"):
+                    elevations = find_elevations(COORDINATES[:3])
+                self.assertEqual(elevations, [None] * 3)
+                self.assertEqual(find_elevations.statistics.failed_count, 3)
+                self.assertEqual(len(server.request_sizes), 1)
+
+    def test_empty_coordinates(self):
+        find_elevations = self.create_finder("http://127.0.0.1:9/unused")
+        self.assertEqual(find_elevations([]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import io
+import unittest
+import xml.etree.ElementTree
+
+import numpy
+import gpxpy
+
+from open_cycle_export.route_exporter.route_exporter import (
+    generate_gpx_file,
+    write_gpx_track,
+)
+
+GPX_NAMESPACE = "{http://www.topografix.com/GPX/1/1}"
+
+
+def write_to_string(*args, **kwargs):
+    open_file = io.StringIO()
+    point_count = write_gpx_track(open_file, *args, **kwargs)
+    return open_file.getvalue(), point_count
+
+
+class TestRouteExporter(unittest.TestCase):
+    def setUp(self):
+        random_state = numpy.random.RandomState(0)
+        self.coordinates = [
+            (longitude, latitude)
+            for longitude, latitude in zip(
+                random_state.uniform(-10, 10, 1000), random_state.uniform(40, 60, 1000)
+            )
+        ]
+        self.elevations = random_state.uniform(-5, 1500, 1000).tolist()
+
+    def test_same_as_gpxpy(self):
+        gpx_data, point_count = write_to_string(
+            self.coordinates, self.elevations, chunk_size=64
+        )
+        self.assertEqual(point_count, 1000)
+        self.assertEqual(gpx_data, generate_gpx_file(self.coordinates, self.elevations))
+
+    def test_missing_and_unusual_values(self):
+        coordinates = [(1e-7, 2), (-0.12345678901, 51.6), (0.5, -1e-9), (3, 4)]
+        elevations = [3, None, 12.25]
+        gpx_data, _ = write_to_string(coordinates, elevations)
+        self.assertEqual(gpx_data, generate_gpx_file(coordinates, elevations))
+        self.assertNotIn("e-", gpx_data)
+
+    def test_empty_track(self):
+        self.assertEqual(write_to_string([])[0], generate_gpx_file([]))
+
+    def test_streams_iterables(self):
+        gpx_data, point_count = write_to_string(
+            iter(self.coordinates), iter(self.elevations)
+        )
+        self.assertEqual(point_count, 1000)
+        gpx = gpxpy.parse(gpx_data)
+        points = gpx.tracks[0].segments[0].points
+        self.assertEqual(len(points), 1000)
+        self.assertAlmostEqual(points[10].longitude, self.coordinates[10][0])
+        self.assertAlmostEqual(points[10].elevation, self.elevations[10])
+
+    def test_valid_gpx_structure(self):
+        gpx_data, _ = write_to_string(self.coordinates[:3], creator='"Route" & <co>')
+        root = xml.etree.ElementTree.fromstring(gpx_data.encode("utf8"))
+        self.assertEqual(root.tag, GPX_NAMESPACE + "gpx")
+        self.assertEqual(root.get("version"), "1.1")
+        self.assertEqual(root.get("creator"), '"Route" & <co>')
+        track_points = root.findall("{0}trk/{0}trkseg/{0}trkpt".format(GPX_NAMESPACE))
+        self.assertEqual(len(track_points), 3)
+        self.assertEqual(set(track_points[0].keys()), {"lat", "lon"})
+
+    def test_more_elevations_than_coordinates(self):
+        with self.assertRaises(ValueError):
+            write_to_string(self.coordinates[:2], self.elevations[:3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+import unittest
+
+import numpy
+
+from shapely.geometry import LineString, Point
+
+from open_cycle_export.route_processor.coordinate_snapper import project_equirectangular
+from open_cycle_export.route_exporter.track_simplifier import (
+    DOUGLAS_PEUCKER,
+    VISVALINGAM,
+    find_distinct_points,
+    find_douglas_peucker_importance,
+    find_visvalingam_importance,
+    find_simplified_points,
+    simplify_track,
+)
+
+
+def recursive_douglas_peucker(points, tolerance):
+    "Reference Douglas-Peucker returning the indexes kept"
+
+    def simplify(start, end):
+        if end - start < 2:
+            return []
+        segment = LineString([points[start], points[end]])
+        distances = [segment.distance(Point(p)) for p in points[start + 1 : end]]
+        index = int(numpy.argmax(distances))
+        if distances[index] <= tolerance:
+            return []
+        split = start + 1 + index
+        return simplify(start, split) + [split] + simplify(split, end)
+
+    return [0] + simplify(0, len(points) - 1) + [len(points) - 1]
+
+
+def create_track(point_count, seed=0):
+    "Lon/lat track wandering around central London"
+
+    random_state = numpy.random.RandomState(seed)
+    headings = numpy.cumsum(random_state.normal(0, 0.4, point_count))
+    steps = 0.0001 * numpy.column_stack([numpy.cos(headings), numpy.sin(headings)])
+    return numpy.array([-0.1, 51.5]) + numpy.cumsum(steps, axis=0)
+
+
+class TestTrackSimplifier(unittest.TestCase):
+    def test_repeated_points_removed(self):
+        coordinates = [(0.0, 51.0), (0.0, 51.0), (0.001, 51.0), (0.001, 51.0)]
+        mask = find_distinct_points(numpy.array(coordinates))
+        self.assertEqual(mask.tolist(), [True, False, True, False])
+        self.assertEqual(simplify_track(coordinates), [(0.0, 51.0), (0.001, 51.0)])
+
+    def test_straight_line(self):
+        coordinates = [(0.0001 * index, 51.0) for index in range(50)]
+        simplified = simplify_track(coordinates, tolerance=0.1)
+        self.assertEqual(simplified, [coordinates[0], coordinates[-1]])
+
+    def test_same_as_recursive_douglas_peucker(self):
+        points = project_equirectangular(create_track(300))
+        for tolerance in [0.5, 2.0, 10.0]:
+            importance = find_douglas_peucker_importance(points, tolerance)
+            kept = numpy.flatnonzero(importance > tolerance).tolist()
+            self.assertEqual(kept, recursive_douglas_peucker(points, tolerance))
+
+    def test_within_tolerance(self):
+        coordinates = create_track(2000)
+        indexes = find_simplified_points(coordinates, 3.0)
+        self.assertLess(len(indexes), 1000)
+        points = project_equirectangular(coordinates)
+        simplified_line = LineString(points[indexes])
+        distances = [simplified_line.distance(Point(point)) for point in points]
+        self.assertLessEqual(max(distances), 3.0 + 1e-6)
+
+        indexes = find_simplified_points(coordinates, 3.0, method=VISVALINGAM)
+        self.assertLess(len(indexes), 2000)
+
+    def test_max_point_count(self):
+        coordinates = create_track(1000)
+        for method in [DOUGLAS_PEUCKER, VISVALINGAM]:
+            indexes = find_simplified_points(
+                coordinates, max_point_count=50, method=method
+            )
+            self.assertEqual(len(indexes), 50)
+            self.assertEqual(indexes[0], 0)
+            self.assertEqual(indexes[-1], 999)
+            self.assertTrue(numpy.all(numpy.diff(indexes) > 0))
+
+    def test_importance_hierarchy(self):
+        points = project_equirectangular(create_track(500))
+        for importance in [
+            find_douglas_peucker_importance(points),
+            find_visvalingam_importance(points),
+        ]:
+            self.assertEqual(importance[0], numpy.inf)
+            self.assertEqual(importance[-1], numpy.inf)
+            # Tightening the maximum only ever removes points
+            kept_20 = set(numpy.argsort(-importance, kind="stable")[:20].tolist())
+            kept_40 = set(numpy.argsort(-importance, kind="stable")[:40].tolist())
+            self.assertLessEqual(kept_20, kept_40)
+
+    def test_visvalingam_removes_smallest_triangle(self):
+        points = numpy.array([[0, 0], [1, 0.1], [2, 0], [3, 5], [4, 0]], dtype=float)
+        importance = find_visvalingam_importance(points)
+        self.assertEqual(int(numpy.argmin(importance)), 1)
+        self.assertAlmostEqual(importance[1], numpy.sqrt(0.1))
+
+    def test_loop_track(self):
+        coordinates = [(0.0, 51.0), (0.001, 51.0), (0.001, 51.001), (0.0, 51.0)]
+        for method in [DOUGLAS_PEUCKER, VISVALINGAM]:
+            simplified = simplify_track(coordinates, tolerance=1.0, method=method)
+            self.assertEqual(simplified, coordinates)
+
+    def test_short_tracks(self):
+        self.assertEqual(simplify_track([], tolerance=1.0), [])
+        self.assertEqual(simplify_track([(0.0, 51.0)], tolerance=1.0), [(0.0, 51.0)])
+
+    def test_invalid_options(self):
+        with self.assertRaises(ValueError):
+            find_simplified_points([(0, 0), (1, 1)], 1.0, method="unknown")
+        with self.assertRaises(ValueError):
+            find_simplified_points([(0, 0), (1, 1)], max_point_count=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,273 @@
+"""Simplify tracks before elevations are found and GPX files written
+
+Routes are joined from many connections, so consecutive connections repeat the
+coordinate where they meet, and OSM ways often have runs of nodes along straight
+roads which add nothing to a track. Repeated coordinates are always removed. Other
+points are removed with the Douglas-Peucker or Visvalingam-Whyatt algorithm while
+the track stays within a tolerance in metres, and optionally until no more than a
+maximum number of points remain.
+
+Both algorithms give every point an importance in metres, infinite for the first
+and last points, and the points kept are those more important than the tolerance,
+or the most important points when there are more than the maximum. Douglas-Peucker
+importance is the distance of a point from the track simplified without it, and
+Visvalingam-Whyatt importance is the square root of the area of the triangle the
+point forms with its neighbours when it is removed.
+
+Simplification is enabled by setting OPEN_CYCLE_EXPORT_SIMPLIFY_TOLERANCE to a
+tolerance in metres, OPEN_CYCLE_EXPORT_SIMPLIFY_MAX_POINTS to a maximum number of
+points or both, and OPEN_CYCLE_EXPORT_SIMPLIFY_METHOD chooses the algorithm.
+
+"""
+
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import os
+import heapq
+import logging
+
+import numpy
+
+from open_cycle_export.route_processor.coordinate_snapper import project_equirectangular
+
+logger = logging.getLogger(__name__)
+
+TOLERANCE_VARIABLE = "OPEN_CYCLE_EXPORT_SIMPLIFY_TOLERANCE"
+MAX_POINTS_VARIABLE = "OPEN_CYCLE_EXPORT_SIMPLIFY_MAX_POINTS"
+METHOD_VARIABLE = "OPEN_CYCLE_EXPORT_SIMPLIFY_METHOD"
+
+DOUGLAS_PEUCKER = "douglas-peucker"
+VISVALINGAM = "visvalingam"
+
+Coordinate = Tuple[float, float]
+
+
+class SimplifyOptions(NamedTuple):
+    tolerance: Optional[float] = None
+    max_point_count: Optional[int] = None
+    method: str = DOUGLAS_PEUCKER
+
+
+def find_distinct_points(coordinates: numpy.ndarray) -> numpy.ndarray:
+    "Mask of the points which differ from the point before them"
+
+    keep = numpy.ones(len(coordinates), dtype=bool)
+    keep[1:] = numpy.any(coordinates[1:] != coordinates[:-1], axis=1)
+    return keep
+
+
+def find_segment_distances(
+    points: numpy.ndarray, starts: numpy.ndarray, ends: numpy.ndarray
+) -> numpy.ndarray:
+    "Distance of each point from the line segment between its start and end"
+
+    directions = ends - starts
+    offsets = points - starts
+    lengths_squared = numpy.einsum("ij,ij->i", directions, directions)
+    fractions = numpy.einsum("ij,ij->i", offsets, directions) / numpy.where(
+        lengths_squared > 0, lengths_squared, 1.0
+    )
+    fractions = numpy.clip(fractions, 0.0, 1.0)
+    nearest_offsets = offsets - fractions[:, None] * directions
+    return numpy.hypot(nearest_offsets[:, 0], nearest_offsets[:, 1])
+
+
+def find_douglas_peucker_importance(
+    points: numpy.ndarray, tolerance: float = 0.0
+) -> numpy.ndarray:
+    """Importance of each point of a track to the Douglas-Peucker algorithm
+
+    Every part of the track at the same depth of recursion is split at once, so
+    the distances of all their points are found with one set of array operations.
+    A point is never more important than the point which split the track before
+    it, so the most important points are always a valid simplification. Parts of
+    the track within the tolerance are not split further and their points are given
+    an importance of zero.
+
+    Arguments:
+        points {numpy.ndarray} -- Projected points with shape (point_count, 2)
+
+    Keyword Arguments:
+        tolerance {float} -- Distance below which parts of the track are not split (default: {0.0})
+
+    Returns:
+        numpy.ndarray -- Importance of each point
+    """
+
+    importance = numpy.zeros(len(points))
+    if len(points) == 0:
+        return importance
+    importance[[0, -1]] = numpy.inf
+    starts = numpy.array([0])
+    ends = numpy.array([len(points) - 1])
+    parent_importance = numpy.array([numpy.inf])
+    while len(starts):
+        inner_counts = ends - starts - 1
+        has_inner = inner_counts > 0
+        starts, ends = starts[has_inner], ends[has_inner]
+        parent_importance = parent_importance[has_inner]
+        inner_counts = inner_counts[has_inner]
+        if not len(starts):
+            break
+
+        # Index of every inner point of every part, grouped by part
+        part_indexes = numpy.repeat(numpy.arange(len(starts)), inner_counts)
+        group_starts = numpy.cumsum(inner_counts) - inner_counts
+        point_indexes = (
+            numpy.arange(len(part_indexes))
+            - group_starts[part_indexes]
+            + starts[part_indexes]
+            + 1
+        )
+        distances = find_segment_distances(
+            points[point_indexes],
+            points[starts[part_indexes]],
+            points[ends[part_indexes]],
+        )
+        max_distances = numpy.maximum.reduceat(distances, group_starts)
+        is_max = distances == max_distances[part_indexes]
+        _, first_max = numpy.unique(part_indexes[is_max], return_index=True)
+        splits = point_indexes[is_max][first_max]
+
+        is_split = max_distances > tolerance
+        splits, starts, ends = splits[is_split], starts[is_split], ends[is_split]
+        split_importance = numpy.minimum(
+            max_distances[is_split], parent_importance[is_split]
+        )
+        importance[splits] = split_importance
+        starts = numpy.concatenate([starts, splits])
+        ends = numpy.concatenate([splits, ends])
+        parent_importance = numpy.concatenate([split_importance, split_importance])
+    return importance
+
+
+def find_triangle_areas(
+    previous_points: numpy.ndarray, points: numpy.ndarray, next_points: numpy.ndarray
+) -> numpy.ndarray:
+    before = previous_points - points
+    after = next_points - points
+    return 0.5 * numpy.abs(before[:, 0] * after[:, 1] - before[:, 1] * after[:, 0])
+
+
+def find_visvalingam_importance(points: numpy.ndarray) -> numpy.ndarray:
+    """Importance of each point of a track to the Visvalingam-Whyatt algorithm
+
+    Points are removed in order of the area of the triangle they form with their
+    remaining neighbours. A point is never less important than a point removed
+    before it.
+
+    Arguments:
+        points {numpy.ndarray} -- Projected points with shape (point_count, 2)
+
+    Returns:
+        numpy.ndarray -- Importance of each point
+    """
+
+    point_count = len(points)
+    importance = numpy.full(point_count, numpy.inf)
+    if point_count < 3:
+        return importance
+    areas = find_triangle_areas(points[:-2], points[1:-1], points[2:]).tolist()
+    areas = [None] + areas + [None]
+    previous_indexes = list(range(-1, point_count - 1))
+    next_indexes = list(range(1, point_count + 1))
+    heap = [(area, index) for index, area in enumerate(areas) if area is not None]
+    heapq.heapify(heap)
+    xs, ys = points[:, 0].tolist(), points[:, 1].tolist()
+
+    def find_area(index):
+        before, after = previous_indexes[index], next_indexes[index]
+        before_x, before_y = xs[before] - xs[index], ys[before] - ys[index]
+        after_x, after_y = xs[after] - xs[index], ys[after] - ys[index]
+        return 0.5 * abs(before_x * after_y - before_y * after_x)
+
+    removed_area = 0.0
+    while heap:
+        area, index = heapq.heappop(heap)
+        if area != areas[index]:
+            continue
+        removed_area = max(removed_area, area)
+        importance[index] = removed_area
+        areas[index] = None
+        previous_index, next_index = previous_indexes[index], next_indexes[index]
+        next_indexes[previous_index] = next_index
+        previous_indexes[next_index] = previous_index
+        for neighbour in (previous_index, next_index):
+            if 0 < neighbour < point_count - 1:
+                areas[neighbour] = find_area(neighbour)
+                heapq.heappush(heap, (areas[neighbour], neighbour))
+    return numpy.sqrt(importance)
+
+
+def find_simplified_points(
+    coordinates: Sequence[Coordinate],
+    tolerance: Optional[float] = None,
+    max_point_count: Optional[int] = None,
+    method: str = DOUGLAS_PEUCKER,
+) -> numpy.ndarray:
+    """Indexes of the points kept when a lon/lat track is simplified
+
+    Arguments:
+        coordinates {Sequence[Coordinate]} -- Longitude, latitude of each point
+
+    Keyword Arguments:
+        tolerance {float} -- Metres the track may move, only repeated points are removed when None (default: {None})
+        max_point_count {int} -- Maximum number of points kept (default: {None})
+        method {str} -- douglas-peucker or visvalingam (default: {"douglas-peucker"})
+
+    Raises:
+        ValueError -- When the method is unknown or fewer than two points are allowed
+
+    Returns:
+        numpy.ndarray -- Indexes of the points kept in track order
+    """
+
+    if method not in (DOUGLAS_PEUCKER, VISVALINGAM):
+        raise ValueError("unknown simplification method {}".format(method))
+    if max_point_count is not None and max_point_count < 2:
+        raise ValueError("tracks need at least two points")
+
+    coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+    distinct_indexes = numpy.flatnonzero(find_distinct_points(coordinates))
+    if tolerance is None and max_point_count is None:
+        return distinct_indexes
+
+    points = project_equirectangular(coordinates[distinct_indexes])
+    tolerance = tolerance or 0.0
+    if method == DOUGLAS_PEUCKER:
+        importance = find_douglas_peucker_importance(points, tolerance)
+    else:
+        importance = find_visvalingam_importance(points)
+    keep = importance > tolerance
+    if max_point_count is not None and numpy.count_nonzero(keep) > max_point_count:
+        keep[:] = False
+        keep[numpy.argsort(-importance, kind="stable")[:max_point_count]] = True
+    return distinct_indexes[keep]
+
+
+def simplify_track(
+    coordinates: Sequence[Coordinate],
+    tolerance: Optional[float] = None,
+    max_point_count: Optional[int] = None,
+    method: str = DOUGLAS_PEUCKER,
+) -> List[Coordinate]:
+    "Simplified lon/lat track, see find_simplified_points"
+
+    indexes = find_simplified_points(coordinates, tolerance, max_point_count, method)
+    simplified_coordinates = [tuple(coordinates[index]) for index in indexes.tolist()]
+    logger.debug(
+        "simplified %s points to %s", len(coordinates), len(simplified_coordinates)
+    )
+    return simplified_coordinates
+
+
+def get_simplify_options() -> SimplifyOptions:
+    "Simplification options set in the environment"
+
+    tolerance = os.environ.get(TOLERANCE_VARIABLE)
+    max_point_count = os.environ.get(MAX_POINTS_VARIABLE)
+    return SimplifyOptions(
+        float(tolerance) if tolerance else None,
+        int(max_point_count) if max_point_count else None,
+        os.environ.get(METHOD_VARIABLE) or DOUGLAS_PEUCKER,
+    )
@@ -0,0 +1,171 @@
+"""Contract chains of line segments joined at degree-2 waypoints
+
+A waypoint where exactly two line segments meet and which leads to two different
+waypoints is not a junction, so a route passing through it can only continue along
+the other segment. Such waypoints are removed and the chain of segments between two
+junctions becomes a single path, with the forward and reverse costs of the segments
+summed. The segments of each path are kept so routes can be expanded back to their
+full geometry.
+
+"""
+
+from typing import List, NamedTuple, Tuple
+
+import numpy
+
+from open_cycle_export.route_processor.waypoint_graph import SegmentPath
+
+
+class ContractedChains(NamedTuple):
+    kept_waypoints: numpy.ndarray
+    path_starts: numpy.ndarray
+    path_ends: numpy.ndarray
+    path_forward_costs: numpy.ndarray
+    path_reverse_costs: numpy.ndarray
+    segment_paths: List[SegmentPath]
+
+
+def find_incident_segments(
+    waypoint_count: int, segment_starts: numpy.ndarray, segment_ends: numpy.ndarray
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    "Segments meeting at each waypoint in compressed sparse row form"
+
+    endpoint_waypoints = numpy.concatenate([segment_starts, segment_ends])
+    order = numpy.argsort(endpoint_waypoints, kind="stable")
+    incident_offsets = numpy.zeros(waypoint_count + 1, dtype=numpy.int64)
+    numpy.cumsum(
+        numpy.bincount(endpoint_waypoints, minlength=waypoint_count),
+        out=incident_offsets[1:],
+    )
+    return incident_offsets, order % max(len(segment_starts), 1)
+
+
+def find_chain_waypoints(
+    segment_starts: numpy.ndarray,
+    segment_ends: numpy.ndarray,
+    incident_offsets: numpy.ndarray,
+    incident_segments: numpy.ndarray,
+) -> numpy.ndarray:
+    "Flag waypoints joining exactly two segments which lead to different waypoints"
+
+    waypoints = numpy.arange(len(incident_offsets) - 1)
+    is_chain = numpy.diff(incident_offsets) == 2
+    first_incident = incident_offsets[:-1][is_chain]
+    neighbours = []
+    for segments in (
+        incident_segments[first_incident],
+        incident_segments[first_incident + 1],
+    ):
+        starts, ends = segment_starts[segments], segment_ends[segments]
+        neighbours.append(numpy.where(starts == waypoints[is_chain], ends, starts))
+    is_chain[is_chain] = neighbours[0] != neighbours[1]
+    return is_chain
+
+
+def contract_chains(
+    waypoint_count: int,
+    segment_starts: numpy.ndarray,
+    segment_ends: numpy.ndarray,
+    forward_costs: numpy.ndarray,
+    reverse_costs: numpy.ndarray,
+    is_kept: numpy.ndarray = None,
+) -> ContractedChains:
+    """Replace chains of segments between junction waypoints with single paths
+
+    Closed loops are split at a waypoint part way round so that no path starts
+    and ends at the same waypoint.
+
+    Arguments:
+        waypoint_count {int} -- Number of waypoints
+        segment_starts {numpy.ndarray} -- Waypoint at the start of each segment
+        segment_ends {numpy.ndarray} -- Waypoint at the end of each segment
+        forward_costs {numpy.ndarray} -- Cost of travel from start to end of each segment
+        reverse_costs {numpy.ndarray} -- Cost of travel from end to start of each segment
+
+    Keyword Arguments:
+        is_kept {numpy.ndarray} -- Flag for waypoints which must not be removed (default: {None})
+
+    Returns:
+        ContractedChains -- Waypoints kept, and the waypoints at each end, costs and segments of each path
+    """
+
+    segment_starts = numpy.asarray(segment_starts, dtype=numpy.int64)
+    segment_ends = numpy.asarray(segment_ends, dtype=numpy.int64)
+    segment_count = len(segment_starts)
+
+    incident_offsets, incident_segments = find_incident_segments(
+        waypoint_count, segment_starts, segment_ends
+    )
+    is_chain = find_chain_waypoints(
+        segment_starts, segment_ends, incident_offsets, incident_segments
+    )
+    if is_kept is not None:
+        is_chain &= ~numpy.asarray(is_kept, dtype=bool)
+
+    incident_offsets = incident_offsets.tolist()
+    incident_segments = incident_segments.tolist()
+    starts, ends = segment_starts.tolist(), segment_ends.tolist()
+    forward = numpy.asarray(forward_costs, dtype=float).tolist()
+    reverse = numpy.asarray(reverse_costs, dtype=float).tolist()
+    is_chain = is_chain.tolist()
+
+    def follow_chain(waypoint: int, segment: int, is_visited: List[bool]):
+        path, forward_cost, reverse_cost, first = [], 0.0, 0.0, waypoint
+        while True:
+            is_visited[segment] = True
+            is_reversed = starts[segment] != waypoint
+            if is_reversed:
+                forward_cost += reverse[segment]
+                reverse_cost += forward[segment]
+                waypoint = starts[segment]
+            else:
+                forward_cost += forward[segment]
+                reverse_cost += reverse[segment]
+                waypoint = ends[segment]
+            path.append((segment, is_reversed))
+            if not is_chain[waypoint]:
+                return first, waypoint, forward_cost, reverse_cost, path
+            incident = incident_offsets[waypoint]
+            segment_a, segment_b = incident_segments[incident : incident + 2]
+            segment = segment_b if segment_a == segment else segment_a
+
+    def follow_all_chains():
+        is_visited = [False] * segment_count
+        paths = []
+
+        def follow_chains_from(waypoint: int):
+            for incident in range(
+                incident_offsets[waypoint], incident_offsets[waypoint + 1]
+            ):
+                segment = incident_segments[incident]
+                if not is_visited[segment]:
+                    paths.append(follow_chain(waypoint, segment, is_visited))
+
+        for waypoint in range(waypoint_count):
+            if not is_chain[waypoint]:
+                follow_chains_from(waypoint)
+
+        # Rings of chain waypoints have no junction to start from so keep one
+        for segment in range(segment_count):
+            if not is_visited[segment]:
+                is_chain[starts[segment]] = False
+                follow_chains_from(starts[segment])
+
+        return paths
+
+    paths = follow_all_chains()
+    loops = [path for path in paths if path[0] == path[1]]
+    if loops:
+        for *_, path in loops:
+            segment, is_reversed = path[0]
+            is_chain[starts[segment] if is_reversed else ends[segment]] = False
+        paths = follow_all_chains()
+
+    return ContractedChains(
+        numpy.flatnonzero(~numpy.array(is_chain, dtype=bool)),
+        numpy.array([path[0] for path in paths], dtype=numpy.int64),
+        numpy.array([path[1] for path in paths], dtype=numpy.int64),
+        numpy.array([path[2] for path in paths], dtype=float),
+        numpy.array([path[3] for path in paths], dtype=float),
+        [path[4] for path in paths],
+    )
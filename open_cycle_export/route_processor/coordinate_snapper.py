@@ -0,0 +1,102 @@
+"""Snap nearly coincident coordinates together
+
+Nodes within a tolerance of one another are found by hashing them into grid cells
+the size of the tolerance, so only nodes in neighbouring cells are compared. Each
+node snaps to the closest earlier node which has not itself been snapped, which
+avoids chains of close nodes collapsing into a single point.
+
+"""
+
+from typing import NamedTuple, Tuple
+
+import numpy
+
+from open_cycle_export.route_processor.node_registry import (
+    COORDINATE_PRECISION,
+    NodeRegistry,
+)
+from open_cycle_export.spatial_index.grid_index import GridIndex
+
+EARTH_RADIUS = 6371008.8
+
+
+class SnapStatistics(NamedTuple):
+    node_count: int
+    snapped_node_count: int
+    merged_node_count: int
+
+
+def project_equirectangular(coordinates: numpy.ndarray) -> numpy.ndarray:
+    "Approximate local metres for lon/lat coordinates which are close together"
+
+    radians = numpy.radians(numpy.asarray(coordinates, dtype=float).reshape(-1, 2))
+    x = radians[:, 0] * EARTH_RADIUS * numpy.cos(radians[:, 1])
+    y = radians[:, 1] * EARTH_RADIUS
+    return numpy.column_stack([x, y])
+
+
+def choose_snap_leaders(
+    node_count: int, sources: numpy.ndarray, targets: numpy.ndarray, distances
+) -> numpy.ndarray:
+    """Choose the node each node snaps to
+    
+    Arguments:
+        node_count {int} -- Number of nodes
+        sources {numpy.ndarray} -- Node of each pair of nodes within tolerance
+        targets {numpy.ndarray} -- Other node of each pair of nodes within tolerance
+        distances {numpy.ndarray} -- Distance between each pair of nodes
+    
+    Returns:
+        numpy.ndarray -- Index of the node each node snaps to, itself when not snapped
+    """
+
+    order = numpy.lexsort((distances, sources))
+    sources, targets = sources[order], targets[order]
+    group_starts = numpy.searchsorted(sources, numpy.arange(node_count + 1)).tolist()
+    targets = targets.tolist()
+
+    leaders = list(range(node_count))
+    for node in range(node_count):
+        for target in targets[group_starts[node] : group_starts[node + 1]]:
+            if target < node and leaders[target] == target:
+                leaders[node] = target
+                break
+    return numpy.array(leaders, dtype=numpy.int64)
+
+
+def snap_coordinates(
+    coordinates: numpy.ndarray,
+    tolerance: float,
+    geographic: bool = True,
+    precision: float = COORDINATE_PRECISION,
+) -> Tuple[numpy.ndarray, SnapStatistics]:
+    """Move coordinates within a tolerance of one another to the same location
+    
+    Arguments:
+        coordinates {numpy.ndarray} -- Coordinates to snap together
+        tolerance {float} -- Distance within which coordinates are merged
+    
+    Keyword Arguments:
+        geographic {bool} -- Coordinates are lon/lat and tolerance is in metres (default: {True})
+        precision {float} -- Coordinates closer than this are the same node (default: {COORDINATE_PRECISION})
+    
+    Returns:
+        Tuple[numpy.ndarray, SnapStatistics] -- Snapped coordinates and merge statistics
+    """
+
+    node_registry = NodeRegistry(coordinates, precision)
+    nodes = node_registry.coordinates
+    node_count = len(nodes)
+    metric_nodes = project_equirectangular(nodes) if geographic else nodes
+
+    grid_index = GridIndex(metric_nodes, tolerance)
+    sources, targets = grid_index.query_pairs(tolerance)
+    offsets = metric_nodes[sources] - metric_nodes[targets]
+    distances = numpy.hypot(offsets[:, 0], offsets[:, 1])
+    leaders = choose_snap_leaders(node_count, sources, targets, distances)
+
+    merged_node_count = int(numpy.count_nonzero(leaders != numpy.arange(node_count)))
+    statistics = SnapStatistics(
+        node_count, node_count - merged_node_count, merged_node_count
+    )
+    return nodes[leaders][node_registry.node_ids], statistics
@@ -0,0 +1,79 @@
+"""Registry of route nodes identified by dense integer ids
+
+Coordinates are quantized to the 1e-7 degree precision OpenStreetMap stores node
+locations with, so endpoints which only differ by floating point noise become the
+same node. Quantized coordinates are packed into a single integer key per node and
+kept in sorted NumPy arrays, lookups are vectorised binary searches.
+
+"""
+
+import numpy
+
+COORDINATE_PRECISION = 1e-7
+KEY_OFFSET = 2 ** 31
+
+
+def quantize_coordinates(
+    coordinates: numpy.ndarray, precision: float = COORDINATE_PRECISION
+) -> numpy.ndarray:
+    "Integer multiples of the precision closest to each coordinate"
+
+    coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+    return numpy.round(coordinates / precision).astype(numpy.int64)
+
+
+def pack_coordinate_keys(quantized_coordinates: numpy.ndarray) -> numpy.ndarray:
+    "Single integer key for each pair of quantized coordinates within ±2^31"
+
+    x_keys, y_keys = quantized_coordinates[:, 0], quantized_coordinates[:, 1]
+    return x_keys * (2 * KEY_OFFSET) + (y_keys + KEY_OFFSET)
+
+
+class NodeRegistry:
+    """Dense integer node ids numbered in order of first appearance"""
+
+    coordinates: numpy.ndarray
+    node_ids: numpy.ndarray
+    precision: float
+
+    def __init__(
+        self, coordinates: numpy.ndarray, precision: float = COORDINATE_PRECISION
+    ):
+        """Register nodes at all the coordinates
+        
+        Arguments:
+            coordinates {numpy.ndarray} -- Coordinates of every node occurrence
+        
+        Keyword Arguments:
+            precision {float} -- Coordinates closer than this are the same node (default: {COORDINATE_PRECISION})
+        """
+
+        coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+        keys = pack_coordinate_keys(quantize_coordinates(coordinates, precision))
+        unique_keys, first_indexes, inverse = numpy.unique(
+            keys, return_index=True, return_inverse=True
+        )
+        appearance_order = numpy.argsort(first_indexes)
+        unique_node_ids = numpy.empty(len(unique_keys), dtype=numpy.int64)
+        unique_node_ids[appearance_order] = numpy.arange(len(unique_keys))
+
+        self.precision = precision
+        self.coordinates = coordinates[first_indexes[appearance_order]]
+        self.node_ids = unique_node_ids[inverse.reshape(-1)]
+        self._sorted_keys = unique_keys
+        self._sorted_node_ids = unique_node_ids
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def find_nodes(self, coordinates: numpy.ndarray) -> numpy.ndarray:
+        "Node id at each coordinate or -1 when there is no node"
+
+        quantized_coordinates = quantize_coordinates(coordinates, self.precision)
+        keys = pack_coordinate_keys(quantized_coordinates)
+        if len(self._sorted_keys) < 1:
+            return numpy.full(len(keys), -1, dtype=numpy.int64)
+        positions = numpy.searchsorted(self._sorted_keys, keys)
+        positions = numpy.minimum(positions, len(self._sorted_keys) - 1)
+        is_found = self._sorted_keys[positions] == keys
+        return numpy.where(is_found, self._sorted_node_ids[positions], -1)
@@ -0,0 +1,150 @@
+"""Distances between waypoint coordinates without per pair geometry calls
+
+The furthest apart pair of points is always a pair of convex hull vertices, so only
+the hull is searched. Points inside the octagon of extreme points in x, y, x + y and
+x - y can not be on the hull and are screened out with array operations before the
+hull is found, which leaves a few hundred points for even large routes.
+
+Full distance matrices are found with one broadcast in float32, after moving the
+coordinates to their mean so absolute lon/lat values do not lose precision.
+
+"""
+
+from typing import Tuple
+
+import numpy
+
+
+def find_distance_matrix(
+    coordinates: numpy.ndarray, dtype: numpy.dtype = numpy.float32
+) -> numpy.ndarray:
+    """Straight line distance between every pair of coordinates
+
+    Arguments:
+        coordinates {numpy.ndarray} -- Coordinates with shape (coordinate_count, 2)
+
+    Keyword Arguments:
+        dtype {numpy.dtype} -- Type of the distances (default: {numpy.float32})
+
+    Returns:
+        numpy.ndarray -- Distances with shape (coordinate_count, coordinate_count)
+    """
+
+    coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+    if len(coordinates):
+        coordinates = coordinates - coordinates.mean(axis=0)
+    x, y = coordinates.astype(dtype).T
+    distances = x[:, numpy.newaxis] - x
+    numpy.square(distances, out=distances)
+    y_offsets = y[:, numpy.newaxis] - y
+    numpy.square(y_offsets, out=y_offsets)
+    distances += y_offsets
+    del y_offsets
+    return numpy.sqrt(distances, out=distances)
+
+
+def find_hull_candidates(coordinates: numpy.ndarray) -> numpy.ndarray:
+    "Indexes of coordinates not strictly inside the octagon of extreme points"
+
+    x, y = coordinates[:, 0], coordinates[:, 1]
+    # Extreme points in anticlockwise order from the west
+    extreme_indexes = [
+        numpy.argmin(x),
+        numpy.argmin(x + y),
+        numpy.argmin(y),
+        numpy.argmax(x - y),
+        numpy.argmax(x),
+        numpy.argmax(x + y),
+        numpy.argmax(y),
+        numpy.argmin(x - y),
+    ]
+    corners = coordinates[extreme_indexes]
+    is_inside = numpy.ones(len(coordinates), dtype=bool)
+    for start, end in zip(corners, numpy.roll(corners, -1, axis=0)):
+        edge = end - start
+        if not numpy.any(edge):
+            continue
+        offsets = coordinates - start
+        is_inside &= edge[0] * offsets[:, 1] - edge[1] * offsets[:, 0] > 0
+    # Extreme points are kept when every corner is the same point
+    is_inside[extreme_indexes] = False
+    return numpy.flatnonzero(~is_inside)
+
+
+def find_convex_hull(coordinates: numpy.ndarray) -> numpy.ndarray:
+    """Indexes of the convex hull vertices of a set of coordinates
+
+    Collinear points along hull edges are not vertices. The first of any repeated
+    coordinates is used.
+
+    Arguments:
+        coordinates {numpy.ndarray} -- Coordinates with shape (coordinate_count, 2)
+
+    Returns:
+        numpy.ndarray -- Indexes of the hull vertices in anticlockwise order
+    """
+
+    coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+    if len(coordinates) < 1:
+        return numpy.zeros(0, dtype=numpy.int64)
+    candidates = find_hull_candidates(coordinates)
+    # Unique coordinates are sorted by x then y, as the monotone chain needs
+    _, first_indexes = numpy.unique(coordinates[candidates], axis=0, return_index=True)
+    indexes = candidates[first_indexes].tolist()
+    if len(indexes) < 3:
+        return numpy.array(indexes, dtype=numpy.int64)
+    xs, ys = coordinates[:, 0].tolist(), coordinates[:, 1].tolist()
+
+    def is_left_turn(a, b, c):
+        cross = (xs[b] - xs[a]) * (ys[c] - ys[a]) - (ys[b] - ys[a]) * (xs[c] - xs[a])
+        return cross > 0
+
+    def find_chain(ordered_indexes):
+        chain = []
+        for index in ordered_indexes:
+            while len(chain) > 1 and not is_left_turn(chain[-2], chain[-1], index):
+                chain.pop()
+            chain.append(index)
+        return chain
+
+    lower, upper = find_chain(indexes), find_chain(reversed(indexes))
+    return numpy.array(lower[:-1] + upper[:-1], dtype=numpy.int64)
+
+
+def find_furthest_pair(
+    coordinates: numpy.ndarray, chunk_size: int = 256
+) -> Tuple[int, int]:
+    """Indexes of the two coordinates furthest apart
+
+    Hull vertices are compared in chunks of rows so a hull with many vertices never
+    needs a full distance matrix. Of equally distant pairs the one with the lowest
+    indexes is found, as when every pair is compared.
+
+    Arguments:
+        coordinates {numpy.ndarray} -- Coordinates with shape (coordinate_count, 2)
+
+    Keyword Arguments:
+        chunk_size {int} -- Hull vertices compared with all others at once (default: {256})
+
+    Returns:
+        Tuple[int, int] -- Lower and higher index of the furthest pair
+    """
+
+    coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+    hull_indexes = numpy.sort(find_convex_hull(coordinates))
+    if len(hull_indexes) < 2:
+        return (0, 0)
+    x, y = coordinates[hull_indexes, 0], coordinates[hull_indexes, 1]
+    furthest_pair, furthest_distance = (0, 0), -1
+    for start in range(0, len(hull_indexes), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        squared_distances = (x[chunk, numpy.newaxis] - x) ** 2 + (
+            y[chunk, numpy.newaxis] - y
+        ) ** 2
+        i, j = numpy.unravel_index(
+            numpy.argmax(squared_distances), squared_distances.shape
+        )
+        if squared_distances[i, j] > furthest_distance:
+            furthest_pair = (int(hull_indexes[start + i]), int(hull_indexes[j]))
+            furthest_distance = squared_distances[i, j]
+    return furthest_pair
@@ -5,16 +5,29 @@ import logging
 import numpy
 from shapely.geometry import Point, LineString, MultiLineString
 
-from open_cycle_export.route_processor.routing_algorithm import route_creator
+from open_cycle_export.route_processor.routing_algorithm import (
+    route_creator,
+    heap_route_creator,
+)
+from open_cycle_export.route_processor.waypoint_graph import WaypointGraph
+from open_cycle_export.route_processor.point_distances import find_furthest_pair
 from open_cycle_export.route_processor.way_processor import (
     Waypoints,
     WaypointConnections,
     Matrix,
     process_ways,
+    process_ways_to_graph,
 )
 from open_cycle_export.route_processor.way_coefficient_calculator import (
     create_way_coefficient_calculator,
 )
+from open_cycle_export.route_processor.spatial_convertor import (
+    WGS84,
+    choose_metric_crs,
+    transform_coordinates,
+    transform_line_strings,
+    transform_multi_line_string,
+)
 
 from open_cycle_export.shapely_utilities.immutable_point import ImmutablePoint
 
@@ -23,17 +36,17 @@ Features = List[Feature]
 
 logger = logging.getLogger(__name__)
 
+# Metres between the ends of a line segment above which it is bridged by a straight
+# line, close to the half a degree used when ways were processed in lon/lat
+CLOSE_WAYPOINT_DISTANCE = 50000.0
+
 
 def create_line_strings(features: Features) -> List[LineString]:
     logger.info("create line strings for %s features", len(features))
     return [LineString(feature["geometry"]["coordinates"]) for feature in features]
 
 
-def process_route_features(
-    features: Features,
-) -> Tuple[Waypoints, Matrix, WaypointConnections, Matrix]:
-
-    ways = create_line_strings(features)
+def create_way_coefficients(features: Features) -> Tuple[List[int], List[int]]:
 
     connected_coefficients = [1, 2, 10, 100]
 
@@ -51,6 +64,15 @@ def process_route_features(
         for feature in features
     ]
 
+    return forward_coefficients, reverse_coefficients
+
+
+def process_route_features(
+    features: Features,
+) -> Tuple[Waypoints, Matrix, WaypointConnections, Matrix]:
+
+    ways = create_line_strings(features)
+    forward_coefficients, reverse_coefficients = create_way_coefficients(features)
     unconnected_coefficient = 1000
 
     logger.info("processing %s ways to find waypoints", len(ways))
@@ -61,12 +83,62 @@ def process_route_features(
     return waypoints, waypoint_distances, waypoint_connections, costs_matrix
 
 
+def choose_ways_crs(ways: List[LineString]) -> int:
+    "Metric CRS covering the bounds of all the ways"
+
+    return choose_metric_crs(
+        numpy.array([way.bounds for way in ways], dtype=float).reshape(-1, 2)
+    )
+
+
+def project_points(points: List[ImmutablePoint], crs: int) -> numpy.ndarray:
+    coordinates = numpy.array(
+        [point.coords[0][:2] for point in points], dtype=float
+    ).reshape(-1, 2)
+    return transform_coordinates(coordinates, WGS84, crs)
+
+
+def process_route_features_to_graph(
+    features: Features, keep_points: List[ImmutablePoint] = None
+) -> WaypointGraph:
+    "Waypoint graph of the features in metres, projected to a metric CRS"
+
+    ways = create_line_strings(features)
+    forward_coefficients, reverse_coefficients = create_way_coefficients(features)
+    unconnected_coefficient = 1000
+
+    crs = choose_ways_crs(ways)
+    logger.info("projecting %s ways to EPSG:%s", len(ways), crs)
+    metric_ways = transform_line_strings(ways, WGS84, crs)
+    keep_coordinates = project_points(keep_points or [], crs)
+
+    logger.info("processing %s ways to find waypoint graph", len(ways))
+    return process_ways_to_graph(
+        metric_ways,
+        forward_coefficients,
+        reverse_coefficients,
+        unconnected_coefficient,
+        close_waypoint_distance=CLOSE_WAYPOINT_DISTANCE,
+        contract=True,
+        keep_coordinates=keep_coordinates,
+        crs=crs,
+    )
+
+
 def find_furthest_waypoints(waypoint_distances: Matrix) -> Tuple[int, int]:
-    waypoint_distances = numpy.array(waypoint_distances)
+    waypoint_distances = numpy.asarray(waypoint_distances)
     max_flat_index = numpy.argmax(waypoint_distances)
     return numpy.unravel_index(max_flat_index, waypoint_distances.shape)
 
 
+def find_furthest_coordinates(
+    coordinates: numpy.ndarray, chunk_size: int = 256
+) -> Tuple[int, int]:
+    "Find the furthest apart coordinates by searching their convex hull"
+
+    return find_furthest_pair(coordinates, chunk_size)
+
+
 def straight_line_creator(waypoints: Waypoints):
     def straight_line(i_a: int, i_b: int) -> LineString:
         return LineString([*waypoints[i_a].coords, *waypoints[i_b].coords])
@@ -89,6 +161,20 @@ def create_route_line_string(
     )
 
 
+def create_graph_route_line_string(
+    waypoint_graph: WaypointGraph, route: List[int]
+) -> MultiLineString:
+
+    connection_indexes = map(lambda i: (route[i - 1], route[i]), range(1, len(route)))
+    return MultiLineString(
+        [
+            line_string
+            for i_a, i_b in connection_indexes
+            for line_string in waypoint_graph.get_connection_line_strings(i_a, i_b)
+        ]
+    )
+
+
 def create_longest_route(
     waypoints: Waypoints,
     waypoint_distances: Matrix,
@@ -127,10 +213,44 @@ def make_route_creator(
     return create_route
 
 
+def make_graph_route_creator(waypoint_graph: WaypointGraph):
+
+    logger.info(
+        "creating route using %s waypoints and %s edges",
+        waypoint_graph.waypoint_count,
+        waypoint_graph.edge_count,
+    )
+    create_route_function = heap_route_creator(*waypoint_graph.edge_arrays)
+
+    def create_route(start_index: int, end_index: int):
+        route = create_route_function(start_index, end_index)
+        return create_graph_route_line_string(waypoint_graph, route)
+
+    return create_route
+
+
 def create_route(
     features: Features, start_point: ImmutablePoint, end_point: ImmutablePoint
 ):
 
+    waypoint_graph = process_route_features_to_graph(features, [start_point, end_point])
+    create_route_function = make_graph_route_creator(waypoint_graph)
+
+    start_coordinates, end_coordinates = project_points(
+        [start_point, end_point], waypoint_graph.crs
+    )
+    start_waypoint_index = waypoint_graph.find_waypoint(
+        ImmutablePoint(*start_coordinates)
+    )
+    end_waypoint_index = waypoint_graph.find_waypoint(ImmutablePoint(*end_coordinates))
+    route = create_route_function(start_waypoint_index, end_waypoint_index)
+    return transform_multi_line_string(route, waypoint_graph.crs, WGS84)
+
+
+def create_dense_route(
+    features: Features, start_point: ImmutablePoint, end_point: ImmutablePoint
+):
+
     processed_features = process_route_features(features)
     waypoints, _, waypoint_connections, costs_matrix = processed_features
 
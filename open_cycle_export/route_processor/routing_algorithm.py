@@ -2,17 +2,40 @@
 Create a route from a collection of waypoints and route segments
 
 Waypoint - Index of point at start or end of a line
+Edge arrays - Compressed sparse row (CSR) graph where the edges leaving waypoint i
+    are edge_targets[edge_offsets[i]:edge_offsets[i + 1]] with matching edge_costs
 
 """
 
 from typing import List, Dict, Set, Tuple, Callable
 
+import math
+import heapq
+
 import numpy
 
 Waypoint = int
 Waypoints = List[Waypoint]
 CostMatrix = List[List[float]]
 CreateRoute = Callable[[Waypoint, Waypoint], Waypoints]
+EdgeArrays = Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]
+
+
+def trace_route(
+    waypoint_parents: Dict[Waypoint, Waypoint],
+    start_waypoint: Waypoint,
+    end_waypoint: Waypoint,
+) -> Waypoints:
+    """Build the route from start to end by traversing the parents backwards"""
+
+    reverse_route = [end_waypoint]
+    current_waypoint = end_waypoint
+    while current_waypoint != start_waypoint:
+        current_waypoint = waypoint_parents[current_waypoint]
+        reverse_route.append(current_waypoint)
+
+    # Return route the correct way around
+    return reverse_route[-1::-1]
 
 
 def route_creator(waypoints: Waypoints, cost_matrix: CostMatrix) -> CreateRoute:
@@ -64,14 +87,97 @@ def route_creator(waypoints: Waypoints, cost_matrix: CostMatrix) -> CreateRoute:
             unvisited_costs = numpy.where(is_unvisited, min_costs, numpy.inf)
             current_waypoint = numpy.argmin(unvisited_costs)
 
-        # Build the route by traversing the parents backwards
-        reverse_route = [end_waypoint]
-        current_waypoint = end_waypoint
-        while current_waypoint != start_waypoint:
-            current_waypoint = waypoint_parents[current_waypoint]
-            reverse_route.append(current_waypoint)
+        return trace_route(waypoint_parents, start_waypoint, end_waypoint)
+
+    return create_route
+
+
+def cost_matrix_to_edge_arrays(cost_matrix: CostMatrix) -> EdgeArrays:
+    """Convert a dense cost matrix into CSR edge arrays
+
+    Self connections and infinite costs are not included as edges
+    
+    Arguments:
+        cost_matrix {CostMatrix} -- Cost of direct travel between all waypoints
+    
+    Returns:
+        EdgeArrays -- edge_offsets, edge_targets, edge_costs
+    """
+
+    cost_matrix = numpy.array(cost_matrix, dtype=float)
+    is_edge = numpy.isfinite(cost_matrix)
+    numpy.fill_diagonal(is_edge, False)
+    edge_sources, edge_targets = numpy.nonzero(is_edge)
+    edge_counts = numpy.bincount(edge_sources, minlength=len(cost_matrix))
+    edge_offsets = numpy.zeros(len(cost_matrix) + 1, dtype=numpy.int64)
+    numpy.cumsum(edge_counts, out=edge_offsets[1:])
+    return edge_offsets, edge_targets, cost_matrix[edge_sources, edge_targets]
+
+
+def heap_route_creator(
+    edge_offsets: numpy.ndarray, edge_targets: numpy.ndarray, edge_costs: numpy.ndarray
+) -> CreateRoute:
+    """Returns a function used to create a route between two points of a sparse graph
+
+    Dijkstra search with a binary heap, each query visits every edge at most once
+    rather than scanning a full cost matrix row for every waypoint
+    
+    Arguments:
+        edge_offsets {numpy.ndarray} -- Index of the first edge leaving each waypoint (length N + 1)
+        edge_targets {numpy.ndarray} -- Waypoint reached by each edge
+        edge_costs {numpy.ndarray} -- Cost of travel along each edge
+    
+    Returns:
+        CreateRoute -- Function to create a route between two locations
+    """
+
+    # Python lists are much faster than numpy arrays for scalar access in the loop
+    edge_offsets = numpy.asarray(edge_offsets).tolist()
+    edge_targets = numpy.asarray(edge_targets).tolist()
+    edge_costs = numpy.asarray(edge_costs, dtype=float).tolist()
+    waypoint_count = len(edge_offsets) - 1
+
+    def create_route(start_waypoint: Waypoint, end_waypoint: Waypoint):
+        """Create a route between two places
+        
+        Arguments:
+            start_waypoint {Waypoint} -- Start waypoint to generate route from
+            end_waypoint {Waypoint} -- End waypoint to find route too
+        
+        Raises:
+            ValueError -- When the end waypoint cannot be reached from the start
+        
+        Returns:
+            route {Waypoints} -- List of waypoints which make a route
+        """
+
+        waypoint_parents = {}
+        min_costs = [math.inf] * waypoint_count
+        min_costs[start_waypoint] = 0
+        is_visited = [False] * waypoint_count
+        queue = [(0, start_waypoint)]
+
+        # Expand cheapest waypoint in the queue until the end waypoint is reached
+        while queue:
+            cost_to_current, current_waypoint = heapq.heappop(queue)
+            if is_visited[current_waypoint]:
+                continue
+            if current_waypoint == end_waypoint:
+                break
+            is_visited[current_waypoint] = True
+            first_edge = edge_offsets[current_waypoint]
+            last_edge = edge_offsets[current_waypoint + 1]
+            for edge in range(first_edge, last_edge):
+                child = edge_targets[edge]
+                cost_from_start = cost_to_current + edge_costs[edge]
+                if cost_from_start < min_costs[child]:
+                    min_costs[child] = cost_from_start
+                    waypoint_parents[child] = current_waypoint
+                    heapq.heappush(queue, (cost_from_start, child))
+        else:
+            message = "No route between waypoints {} and {}"
+            raise ValueError(message.format(start_waypoint, end_waypoint))
 
-        # Return route the correct way around
-        return reverse_route[-1::-1]
+        return trace_route(waypoint_parents, start_waypoint, end_waypoint)
 
     return create_route
@@ -1,19 +1,149 @@
-from shapely.geometry import LineString
+"""Convert coordinates between lon/lat and a metric coordinate reference system
 
-import geopandas
+Routes are processed in a projected CRS with coordinates in metres, so lengths,
+costs and distance thresholds mean the same at every latitude. Routes inside Great
+Britain use the British National Grid (EPSG:27700) and other routes use the UTM zone
+of their centre. Each coordinate array or batch of line strings is converted with a
+single call to a pyproj transformer, which is created once per pair of CRS in each
+thread, as transformers can not be shared between threads.
 
-# http://geopandas.org/projections.html
-# https://spatialreference.org/ref/epsg/27700/
+Coordinates converted back to lon/lat are rounded to the 1e-7 degree precision
+OpenStreetMap stores node locations with, so a coordinate read from OpenStreetMap
+comes back exactly as it was.
 
+"""
 
-def main():
-    lon_lat_series = geopandas.GeoSeries(
-        LineString([(-0.127758, 51.507351), (-0.062218, 51.521301)]),
-        crs={"epsg": 4326},
+from typing import List, Sequence
+
+import threading
+
+import numpy
+import pyproj
+from shapely.geometry import LineString, MultiLineString
+
+from open_cycle_export.route_processor.node_registry import COORDINATE_PRECISION
+
+WGS84 = 4326
+BRITISH_NATIONAL_GRID = 27700
+
+# Area of use of the British National Grid as lon/lat bounds
+GREAT_BRITAIN_BOUNDS = (-9.01, 49.75, 2.01, 61.01)
+
+LON_LAT_DECIMALS = 7
+
+# Nodes in metres are identified to the centimetre, close to 1e-7 degrees, which
+# keeps quantized UTM northings within the range of packed node keys
+METRIC_COORDINATE_PRECISION = 0.01
+
+transformer_cache = threading.local()
+
+
+def get_utm_crs(longitude: float, latitude: float) -> int:
+    "EPSG code of the WGS 84 UTM zone containing a lon/lat coordinate"
+
+    zone = min(max(int(numpy.floor((longitude + 180) / 6)) + 1, 1), 60)
+    return (32600 if latitude >= 0 else 32700) + zone
+
+
+def choose_metric_crs(coordinates: numpy.ndarray) -> int:
+    """Metric CRS suitable for lon/lat coordinates
+
+    Arguments:
+        coordinates {numpy.ndarray} -- Lon/lat coordinates covering the area
+
+    Returns:
+        int -- EPSG code of the British National Grid or a UTM zone
+    """
+
+    coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+    if len(coordinates) < 1:
+        return get_utm_crs(0.0, 0.0)
+    min_corner, max_corner = coordinates.min(axis=0), coordinates.max(axis=0)
+    if numpy.all(min_corner >= GREAT_BRITAIN_BOUNDS[:2]) and numpy.all(
+        max_corner <= GREAT_BRITAIN_BOUNDS[2:]
+    ):
+        return BRITISH_NATIONAL_GRID
+    return get_utm_crs(*((min_corner + max_corner) / 2).tolist())
+
+
+def get_coordinate_precision(crs: int) -> float:
+    "Distance within which coordinates in a CRS are the same node"
+
+    return COORDINATE_PRECISION if crs == WGS84 else METRIC_COORDINATE_PRECISION
+
+
+def get_transformer(source_crs: int, target_crs: int) -> pyproj.Transformer:
+    "Transformer between two CRS, created once for each thread"
+
+    transformers = getattr(transformer_cache, "transformers", None)
+    if transformers is None:
+        transformers = transformer_cache.transformers = {}
+    key = (source_crs, target_crs)
+    if key not in transformers:
+        transformers[key] = pyproj.Transformer.from_crs(
+            source_crs, target_crs, always_xy=True
+        )
+    return transformers[key]
+
+
+def transform_coordinates(
+    coordinates: numpy.ndarray, source_crs: int, target_crs: int
+) -> numpy.ndarray:
+    """Convert x, y coordinates from one CRS to another
+
+    Arguments:
+        coordinates {numpy.ndarray} -- Coordinates with shape (coordinate_count, 2)
+        source_crs {int} -- EPSG code of the coordinates
+        target_crs {int} -- EPSG code to convert to
+
+    Returns:
+        numpy.ndarray -- Converted coordinates, rounded to OpenStreetMap precision in lon/lat
+    """
+
+    coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+    if source_crs == target_crs or len(coordinates) < 1:
+        return coordinates.copy()
+    x, y = get_transformer(source_crs, target_crs).transform(
+        coordinates[:, 0], coordinates[:, 1]
     )
-    print(lon_lat_series)
-    osgb_series = lon_lat_series.to_crs(epsg=27700)
-    print(osgb_series)
+    transformed = numpy.column_stack([x, y])
+    if target_crs == WGS84:
+        transformed = numpy.round(transformed, LON_LAT_DECIMALS)
+    return transformed
+
+
+def transform_line_strings(
+    line_strings: Sequence[LineString], source_crs: int, target_crs: int
+) -> List[LineString]:
+    "Convert line strings from one CRS to another with a single transform"
+
+    coordinate_arrays = [
+        numpy.asarray(line_string.coords, dtype=float)[:, :2]
+        for line_string in line_strings
+    ]
+    if len(coordinate_arrays) < 1:
+        return []
+    offsets = numpy.cumsum([len(array) for array in coordinate_arrays])[:-1]
+    transformed = transform_coordinates(
+        numpy.concatenate(coordinate_arrays), source_crs, target_crs
+    )
+    return [LineString(array) for array in numpy.split(transformed, offsets)]
+
+
+def transform_multi_line_string(
+    multi_line_string: MultiLineString, source_crs: int, target_crs: int
+) -> MultiLineString:
+    return MultiLineString(
+        transform_line_strings(list(multi_line_string.geoms), source_crs, target_crs)
+    )
+
+
+def main():
+    lon_lat_coordinates = numpy.array([(-0.127758, 51.507351), (-0.062218, 51.521301)])
+    crs = choose_metric_crs(lon_lat_coordinates)
+    projected_coordinates = transform_coordinates(lon_lat_coordinates, WGS84, crs)
+    print("EPSG:{}".format(crs), projected_coordinates)
+    print(transform_coordinates(projected_coordinates, crs, WGS84))
 
 
 if __name__ == "__main__":
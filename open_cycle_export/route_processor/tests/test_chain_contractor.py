@@ -0,0 +1,77 @@
+import unittest
+
+import numpy
+
+from open_cycle_export.route_processor.chain_contractor import (
+    contract_chains,
+    find_chain_waypoints,
+    find_incident_segments,
+)
+
+
+def contract(waypoint_count, starts, ends, is_kept=None):
+    starts, ends = numpy.array(starts), numpy.array(ends)
+    forward_costs = numpy.arange(1, len(starts) + 1, dtype=float)
+    return contract_chains(
+        waypoint_count, starts, ends, forward_costs, forward_costs * 10, is_kept
+    )
+
+
+class TestFindChainWaypoints(unittest.TestCase):
+    def test_junctions_and_dead_ends_are_not_chain_waypoints(self):
+        starts, ends = numpy.array([0, 1, 1, 3]), numpy.array([1, 2, 3, 4])
+        incident_offsets, incident_segments = find_incident_segments(5, starts, ends)
+        is_chain = find_chain_waypoints(
+            starts, ends, incident_offsets, incident_segments
+        )
+        self.assertListEqual(is_chain.tolist(), [False, False, False, True, False])
+
+    def test_parallel_segments_are_not_a_chain(self):
+        starts, ends = numpy.array([0, 1, 1]), numpy.array([1, 2, 2])
+        incident_offsets, incident_segments = find_incident_segments(3, starts, ends)
+        is_chain = find_chain_waypoints(
+            starts, ends, incident_offsets, incident_segments
+        )
+        self.assertListEqual(is_chain.tolist(), [False, False, False])
+
+
+class TestContractChains(unittest.TestCase):
+    def test_chain_costs_are_summed(self):
+        "Should contract a line of waypoints to its ends with summed costs"
+
+        chains = contract(4, [0, 2, 2], [1, 1, 3])
+
+        self.assertListEqual(chains.kept_waypoints.tolist(), [0, 3])
+        self.assertListEqual(chains.path_starts.tolist(), [0])
+        self.assertListEqual(chains.path_ends.tolist(), [3])
+        self.assertListEqual(chains.path_forward_costs.tolist(), [1 + 20 + 3])
+        self.assertListEqual(chains.path_reverse_costs.tolist(), [10 + 2 + 30])
+        self.assertListEqual(
+            chains.segment_paths, [[(0, False), (1, True), (2, False)]]
+        )
+
+    def test_kept_waypoints_are_not_contracted(self):
+        chains = contract(4, [0, 1, 2], [1, 2, 3], numpy.array([0, 0, 1, 0], bool))
+
+        self.assertListEqual(chains.kept_waypoints.tolist(), [0, 2, 3])
+        self.assertListEqual(
+            chains.segment_paths, [[(0, False), (1, False)], [(2, False)]]
+        )
+
+    def test_junction_is_kept(self):
+        chains = contract(5, [0, 1, 1, 3], [1, 2, 3, 4])
+
+        self.assertListEqual(chains.kept_waypoints.tolist(), [0, 1, 2, 4])
+        self.assertListEqual(chains.path_starts.tolist(), [0, 1, 1])
+        self.assertListEqual(chains.path_ends.tolist(), [1, 2, 4])
+
+    def test_ring_is_split(self):
+        "Should keep two waypoints of a ring so no path is a loop"
+
+        chains = contract(4, [0, 1, 2, 3], [1, 2, 3, 0])
+
+        self.assertListEqual(chains.kept_waypoints.tolist(), [0, 1])
+        self.assertListEqual(
+            chains.segment_paths, [[(0, False)], [(3, True), (2, True), (1, True)]]
+        )
+        self.assertTrue(numpy.all(chains.path_starts != chains.path_ends))
@@ -0,0 +1,39 @@
+import unittest
+
+import numpy
+
+from open_cycle_export.route_processor.coordinate_snapper import (
+    snap_coordinates,
+    project_equirectangular,
+)
+
+
+class TestProjectEquirectangular(unittest.TestCase):
+    def test_one_degree_latitude(self):
+        metres = project_equirectangular([(0, 50), (0, 51)])
+        self.assertAlmostEqual(metres[1, 1] - metres[0, 1], 111195, delta=1)
+
+
+class TestSnapCoordinates(unittest.TestCase):
+    """Test coordinates within tolerance are snapped to the earliest node"""
+
+    def test_snap_close_metric_coordinates(self):
+        coordinates = numpy.array([(0, 0), (10, 0), (0.5, 0), (10, 0.2), (20, 0)])
+        snapped, statistics = snap_coordinates(coordinates, 1, geographic=False)
+        self.assertListEqual(
+            snapped.tolist(), [[0, 0], [10, 0], [0, 0], [10, 0], [20, 0]]
+        )
+        self.assertTupleEqual(tuple(statistics), (5, 3, 2))
+
+    def test_chain_of_close_nodes_does_not_collapse(self):
+        coordinates = numpy.array([(0, 0), (0.8, 0), (1.6, 0), (2.4, 0)])
+        snapped, statistics = snap_coordinates(coordinates, 1, geographic=False)
+        self.assertListEqual(snapped[:, 0].tolist(), [0, 0, 1.6, 1.6])
+        self.assertEqual(statistics.merged_node_count, 2)
+
+    def test_snap_geographic_coordinates(self):
+        coordinates = numpy.array([(-0.9433, 50.9966), (-0.943305, 50.9966)])
+        _, statistics = snap_coordinates(coordinates, 1)
+        self.assertEqual(statistics.merged_node_count, 1)
+        _, statistics = snap_coordinates(coordinates, 0.1)
+        self.assertEqual(statistics.merged_node_count, 0)
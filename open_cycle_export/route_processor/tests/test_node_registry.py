@@ -0,0 +1,41 @@
+import unittest
+
+import numpy
+
+from open_cycle_export.route_processor.node_registry import (
+    NodeRegistry,
+    quantize_coordinates,
+)
+
+
+class TestQuantizeCoordinates(unittest.TestCase):
+    def test_round_to_precision(self):
+        quantized = quantize_coordinates([(-0.94335504, 50.99667496)])
+        self.assertListEqual(quantized.tolist(), [[-9433550, 509966750]])
+
+
+class TestNodeRegistry(unittest.TestCase):
+    """Test nodes are numbered in order of first appearance"""
+
+    def setUp(self):
+        self.coordinates = numpy.array(
+            [(1.5, 2.0), (-0.5, 3.0), (1.5 + 1e-9, 2.0), (0.0, 0.0), (-0.5, 3.0)]
+        )
+        self.node_registry = NodeRegistry(self.coordinates)
+
+    def test_node_ids_first_appearance(self):
+        self.assertEqual(len(self.node_registry), 3)
+        self.assertListEqual(self.node_registry.node_ids.tolist(), [0, 1, 0, 2, 1])
+
+    def test_node_coordinates(self):
+        self.assertListEqual(
+            self.node_registry.coordinates.tolist(), [[1.5, 2.0], [-0.5, 3.0], [0, 0]]
+        )
+
+    def test_find_nodes(self):
+        node_ids = self.node_registry.find_nodes([(0.0, 0.0), (1.5, 2.0), (9, 9)])
+        self.assertListEqual(node_ids.tolist(), [2, 0, -1])
+
+    def test_empty_registry(self):
+        node_registry = NodeRegistry(numpy.zeros((0, 2)))
+        self.assertListEqual(node_registry.find_nodes([(0, 0)]).tolist(), [-1])
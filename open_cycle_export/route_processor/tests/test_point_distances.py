@@ -0,0 +1,73 @@
+import unittest
+
+import numpy
+
+from open_cycle_export.route_processor.point_distances import (
+    find_distance_matrix,
+    find_convex_hull,
+    find_furthest_pair,
+)
+
+
+def brute_force_furthest_pair(coordinates):
+    offsets = coordinates[:, numpy.newaxis] - coordinates
+    squared_distances = numpy.sum(offsets ** 2, axis=2)
+    flat_index = numpy.argmax(squared_distances)
+    i, j = numpy.unravel_index(flat_index, squared_distances.shape)
+    return int(i), int(j)
+
+
+class TestDistanceMatrix(unittest.TestCase):
+    def test_distances(self):
+        distances = find_distance_matrix([(0, 0), (3, 4), (3, 0)])
+        self.assertEqual(distances.dtype, numpy.float32)
+        self.assertListEqual(distances.tolist(), [[0, 5, 3], [5, 0, 4], [3, 4, 0]])
+
+    def test_lon_lat_precision(self):
+        coordinates = numpy.array([(-0.943253, 50.996801), (-0.943146, 50.996985)])
+        expected = numpy.hypot(*(coordinates[1] - coordinates[0]))
+        distances = find_distance_matrix(coordinates)
+        self.assertAlmostEqual(distances[0, 1] / expected, 1, places=6)
+
+    def test_no_coordinates(self):
+        self.assertEqual(find_distance_matrix(numpy.zeros((0, 2))).shape, (0, 0))
+
+
+class TestConvexHull(unittest.TestCase):
+    def test_square_with_inner_and_edge_points(self):
+        coordinates = [(1, 1), (0, 0), (2, 0), (2, 2), (0, 2), (1, 0), (0, 0)]
+        self.assertListEqual(find_convex_hull(coordinates).tolist(), [1, 2, 3, 4])
+
+    def test_collinear_points(self):
+        coordinates = [(1, 1), (0, 0), (3, 3), (2, 2)]
+        self.assertListEqual(sorted(find_convex_hull(coordinates).tolist()), [1, 2])
+
+    def test_few_points(self):
+        self.assertListEqual(find_convex_hull(numpy.zeros((0, 2))).tolist(), [])
+        self.assertListEqual(find_convex_hull([(5, 5)]).tolist(), [0])
+
+
+class TestFurthestPair(unittest.TestCase):
+    def test_same_as_brute_force(self):
+        random_state = numpy.random.RandomState(0)
+        for trial in range(100):
+            point_count = random_state.randint(1, 80)
+            if trial % 2:
+                # Small integer grids have repeated points and equally distant pairs
+                coordinates = random_state.randint(0, 5, (point_count, 2)) * 1.0
+            else:
+                coordinates = random_state.normal(0, 1, (point_count, 2))
+            self.assertTupleEqual(
+                find_furthest_pair(coordinates, chunk_size=3),
+                brute_force_furthest_pair(coordinates),
+            )
+
+    def test_points_on_circle(self):
+        angles = numpy.linspace(0, 2 * numpy.pi, 1000, endpoint=False)
+        coordinates = numpy.column_stack([numpy.cos(angles), numpy.sin(angles)])
+        i, j = find_furthest_pair(coordinates)
+        self.assertEqual(j - i, 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
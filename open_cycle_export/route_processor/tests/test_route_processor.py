@@ -4,9 +4,13 @@ import json
 import os.path
 
 
+import numpy
+
 from open_cycle_export.route_processor.route_processor import (
     find_furthest_waypoints,
+    find_furthest_coordinates,
     create_route,
+    create_dense_route,
 )
 from open_cycle_export.shapely_utilities.immutable_point import ImmutablePoint
 from open_cycle_export.test_data.test_data_loader import load_test_data
@@ -20,6 +24,11 @@ class TestFurthestWaypointFinder(unittest.TestCase):
         furthest_waypoints = find_furthest_waypoints(waypoint_distances)
         self.assertTupleEqual(furthest_waypoints, (0, 2))
 
+    def test_furthest_coordinates(self):
+        coordinates = numpy.array([(1, 1), (0, 0), (2, 1), (4, 4), (3, 2)])
+        furthest_waypoints = find_furthest_coordinates(coordinates, chunk_size=2)
+        self.assertTupleEqual(furthest_waypoints, (1, 3))
+
 
 class TestRouteProcessor(unittest.TestCase):
     """Test overall route processing"""
@@ -52,3 +61,14 @@ class TestRouteProcessor(unittest.TestCase):
         self.assertEqual(route[1].coords[-1], self.roundabout_south)
         self.assertEqual(route[2].coords[0], self.roundabout_south)
         self.assertEqual(route[2].coords[-1], self.roundabout_west)
+
+    def test_roundabout_routes_match_dense_reference(self):
+        for start_point, end_point in [
+            (self.south_west_point, self.north_east_point),
+            (self.north_east_point, self.south_west_point),
+        ]:
+            route = create_route(self.roundabout_features, start_point, end_point)
+            dense_route = create_dense_route(
+                self.roundabout_features, start_point, end_point
+            )
+            self.assertTrue(route.equals(dense_route))
@@ -3,11 +3,15 @@ from typing import Tuple, List, Set
 import math
 import unittest
 
+import numpy
+
 from open_cycle_export.route_processor.routing_algorithm import (
     Waypoint,
     Waypoints,
     CostMatrix,
     route_creator,
+    cost_matrix_to_edge_arrays,
+    heap_route_creator,
 )
 
 Coordinate = Tuple[float, float]
@@ -145,3 +149,70 @@ class TestRouteCreator(unittest.TestCase):
         "Waypoints which are close but there is no connection should return route"
         create_route = route_creator(*disconnected_route_data())
         self.assertListEqual(create_route(0, 4), [0, 1, 2, 3, 4])
+
+
+def heap_route_creator_from_matrix(waypoints: Waypoints, cost_matrix: CostMatrix):
+    return heap_route_creator(*cost_matrix_to_edge_arrays(cost_matrix))
+
+
+def route_cost(cost_matrix: CostMatrix, route: Waypoints) -> float:
+    return sum(cost_matrix[route[i - 1]][route[i]] for i in range(1, len(route)))
+
+
+def random_route_data(waypoint_count: int, seed: int) -> Tuple[Waypoints, CostMatrix]:
+    random_state = numpy.random.RandomState(seed)
+    coordinates = random_state.uniform(0, 100, (waypoint_count, 2)).tolist()
+    connections = set()
+    for i in range(waypoint_count - 1):
+        if random_state.uniform() < 0.8:
+            connections.update([(i, i + 1), (i + 1, i)])
+    waypoints = list(range(waypoint_count))
+    return waypoints, create_costs_matrix(waypoints, coordinates, connections)
+
+
+class TestCostMatrixToEdgeArrays(unittest.TestCase):
+    """Should convert dense cost matrix to CSR edge arrays"""
+
+    def test_skips_self_and_infinite_costs(self):
+        cost_matrix = [[0, 2, math.inf], [2, 0, 3], [math.inf, 4, 0]]
+        edge_offsets, edge_targets, edge_costs = cost_matrix_to_edge_arrays(cost_matrix)
+        self.assertListEqual(edge_offsets.tolist(), [0, 1, 3, 4])
+        self.assertListEqual(edge_targets.tolist(), [1, 0, 2, 1])
+        self.assertListEqual(edge_costs.tolist(), [2, 2, 3, 4])
+
+
+class TestHeapRouteCreator(unittest.TestCase):
+    "Test heap based routes match the dense reference implementation"
+
+    def test_basic_base_case(self):
+        create_route = heap_route_creator_from_matrix(*basic_route_data())
+        self.assertListEqual(create_route(2, 2), [2])
+
+    def test_basic_connected_route(self):
+        create_route = heap_route_creator_from_matrix(*basic_route_data())
+        self.assertListEqual(create_route(0, 2), [0, 1, 2])
+
+    def test_disconnected_waypoints_full_route(self):
+        create_route = heap_route_creator_from_matrix(*disconnected_route_data())
+        self.assertListEqual(create_route(0, 4), [0, 1, 2, 3, 4])
+
+    def test_unreachable_waypoint_raises(self):
+        create_route = heap_route_creator_from_matrix(
+            [0, 1, 2], [[0, 1, math.inf], [1, 0, math.inf], [math.inf, math.inf, 0]]
+        )
+        with self.assertRaises(ValueError):
+            create_route(0, 2)
+
+    def test_random_routes_match_dense_reference(self):
+        for seed in range(5):
+            waypoints, cost_matrix = random_route_data(40, seed)
+            create_dense_route = route_creator(waypoints, cost_matrix)
+            create_heap_route = heap_route_creator_from_matrix(waypoints, cost_matrix)
+            for start, end in [(0, 39), (39, 0), (5, 30)]:
+                dense_route = create_dense_route(start, end)
+                heap_route = create_heap_route(start, end)
+                self.assertListEqual(heap_route, list(dense_route))
+                self.assertAlmostEqual(
+                    route_cost(cost_matrix, heap_route),
+                    route_cost(cost_matrix, dense_route),
+                )
@@ -0,0 +1,78 @@
+import unittest
+
+import numpy
+from shapely.geometry import LineString, MultiLineString
+
+from open_cycle_export.route_processor.spatial_convertor import (
+    WGS84,
+    BRITISH_NATIONAL_GRID,
+    choose_metric_crs,
+    get_transformer,
+    transform_coordinates,
+    transform_line_strings,
+    transform_multi_line_string,
+)
+
+
+class TestChooseMetricCrs(unittest.TestCase):
+    def test_british_national_grid_in_great_britain(self):
+        coordinates = [(-0.127758, 51.507351), (-3.188267, 55.953252)]
+        self.assertEqual(choose_metric_crs(coordinates), BRITISH_NATIONAL_GRID)
+
+    def test_utm_zone_elsewhere(self):
+        self.assertEqual(choose_metric_crs([(2.35, 48.85), (2.4, 48.9)]), 32631)
+        self.assertEqual(choose_metric_crs([(151.2, -33.87)]), 32756)
+
+
+class TestTransformCoordinates(unittest.TestCase):
+    def setUp(self):
+        self.coordinates = numpy.array(
+            [(-0.943253, 50.996801), (-0.942975, 50.996905), (-0.127758, 51.507351)]
+        )
+
+    def test_distances_in_metres(self):
+        projected = transform_coordinates(
+            [(0.0, 50.0), (0.0, 51.0)], WGS84, BRITISH_NATIONAL_GRID
+        )
+        distance = numpy.hypot(*(projected[1] - projected[0]))
+        self.assertAlmostEqual(distance, 111229, delta=100)
+
+    def test_round_trip_is_exact(self):
+        projected = transform_coordinates(
+            self.coordinates, WGS84, BRITISH_NATIONAL_GRID
+        )
+        lon_lat = transform_coordinates(projected, BRITISH_NATIONAL_GRID, WGS84)
+        self.assertListEqual(lon_lat.tolist(), self.coordinates.tolist())
+
+    def test_same_crs_copies(self):
+        copied = transform_coordinates(self.coordinates, WGS84, WGS84)
+        self.assertListEqual(copied.tolist(), self.coordinates.tolist())
+        self.assertIsNot(copied, self.coordinates)
+
+    def test_transformer_reused(self):
+        self.assertIs(
+            get_transformer(WGS84, BRITISH_NATIONAL_GRID),
+            get_transformer(WGS84, BRITISH_NATIONAL_GRID),
+        )
+
+
+class TestTransformLineStrings(unittest.TestCase):
+    def test_line_strings_keep_their_points(self):
+        line_strings = [
+            LineString([(-0.94, 50.99), (-0.93, 50.98), (-0.92, 50.97)]),
+            LineString([(-0.92, 50.97), (-0.91, 50.96)]),
+        ]
+        projected = transform_line_strings(line_strings, WGS84, BRITISH_NATIONAL_GRID)
+        self.assertListEqual([len(line.coords) for line in projected], [3, 2])
+        self.assertEqual(projected[0].coords[-1], projected[1].coords[0])
+        lon_lat = transform_multi_line_string(
+            MultiLineString(projected), BRITISH_NATIONAL_GRID, WGS84
+        )
+        self.assertTrue(lon_lat.equals(MultiLineString(line_strings)))
+
+    def test_no_line_strings(self):
+        self.assertListEqual(transform_line_strings([], WGS84, 27700), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
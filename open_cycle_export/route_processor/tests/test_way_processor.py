@@ -1,6 +1,9 @@
 import unittest
+from unittest import mock
 
+import numpy
 from shapely.geometry import LineString
+from shapely.strtree import STRtree
 
 from open_cycle_export.shapely_utilities.immutable_point import ImmutablePoint
 from open_cycle_export.route_processor.way_processor import (
@@ -8,7 +11,15 @@ from open_cycle_export.route_processor.way_processor import (
     create_line_segments,
     create_waypoints,
     process_ways,
+    process_ways_to_graph,
+    find_dead_ends,
+    find_closest_component_pairs,
+    find_component_bridges,
+    find_intersecting_lines,
+    find_intersecting_lines_pairwise,
 )
+from open_cycle_export.route_processor.routing_algorithm import heap_route_creator
+from open_cycle_export.route_processor.waypoint_graph import find_connected_components
 
 
 class TestWaypointConnectionStorage(unittest.TestCase):
@@ -26,6 +37,52 @@ class TestWaypointConnectionStorage(unittest.TestCase):
         self.assertListEqual(connections, [1, 2])
 
 
+class TestFindIntersectingLines(unittest.TestCase):
+    """Test the spatial index matches testing every pair of lines"""
+
+    def test_no_lines(self):
+        self.assertListEqual(find_intersecting_lines([]), [])
+
+    def test_random_lines_match_pairwise(self):
+        random_state = numpy.random.RandomState(0)
+        starts = random_state.uniform(0, 10, (200, 2))
+        ends = starts + random_state.normal(0, 1, (200, 2))
+        lines = [LineString([start, end]) for start, end in zip(starts, ends)]
+        lines.append(LineString(lines[0].coords))
+
+        intersecting_lines = find_intersecting_lines(lines)
+        expected_lines = find_intersecting_lines_pairwise(lines)
+        self.assertListEqual(
+            [list(map(id, line_list)) for line_list in intersecting_lines],
+            [list(map(id, line_list)) for line_list in expected_lines],
+        )
+
+    def test_repeated_line_objects_match_pairwise(self):
+        "Should match a line object at every position it appears"
+
+        line = LineString([(0, 0), (2, 2)])
+        lines = [line, LineString([(0, 2), (2, 0)]), line, LineString([(5, 5), (6, 6)])]
+        self.assertListEqual(
+            find_intersecting_lines(lines), find_intersecting_lines_pairwise(lines)
+        )
+        self.assertListEqual(
+            [
+                len(intersecting_lines)
+                for intersecting_lines in find_intersecting_lines(lines)
+            ],
+            [2, 2, 2, 0],
+        )
+
+    def test_unindexed_geometry_raises(self):
+        "Should not silently drop lines when the index returns new geometries"
+
+        lines = [LineString([(0, 0), (2, 2)]), LineString([(0, 2), (2, 0)])]
+        copies = [LineString(line.coords) for line in lines]
+        with mock.patch.object(STRtree, "query", return_value=copies):
+            with self.assertRaises(ValueError):
+                find_intersecting_lines(lines)
+
+
 class TestLineSegmentCreator(unittest.TestCase):
     """Test ways can be split into line segments"""
 
@@ -129,3 +186,223 @@ class TestWayProcessor(unittest.TestCase):
         )
 
         self.assertListEqual(cost_matrix, [[0, 3, 5000], [3, 0, 4], [5000, 4, 0]])
+
+
+class TestWayProcessorToGraph(unittest.TestCase):
+    """Test ways can be converted to a sparse waypoint graph"""
+
+    def test_single_way(self):
+        "Should create edges in both directions along a single way"
+
+        ways = [LineString([(0, 0), (3, 4)])]
+        waypoint_graph = process_ways_to_graph(ways, [1], [10], 100, 10)
+
+        self.assertListEqual(waypoint_graph.coordinates.tolist(), [[0, 0], [3, 4]])
+        self.assertListEqual(waypoint_graph.edge_offsets.tolist(), [0, 1, 2])
+        self.assertListEqual(waypoint_graph.edge_costs.tolist(), [5, 50])
+        self.assertEqual(waypoint_graph.get_connection(0, 1), ways[0])
+        self.assertEqual(
+            waypoint_graph.get_connection(1, 0), LineString([(3, 4), (0, 0)])
+        )
+
+    def test_two_connected_ways(self):
+        "Should bridge the gap between unconnected waypoints with a straight line"
+
+        ways = [LineString([(0, 0), (3, 0)]), LineString([(3, 0), (3, 4)])]
+        waypoint_graph = process_ways_to_graph(ways, [1, 1], [1, 1], 1000, 10)
+
+        self.assertListEqual(waypoint_graph.edge_targets.tolist(), [1, 2, 0, 2, 0, 1])
+        self.assertListEqual(
+            waypoint_graph.edge_costs.tolist(), [3, 5000, 3, 4, 5000, 4]
+        )
+        self.assertListEqual(waypoint_graph.edge_paths.tolist(), [0, -1, 0, 1, -1, 1])
+
+    def test_near_coincident_endpoints_share_waypoint(self):
+        "Should merge endpoints which only differ by floating point noise"
+
+        ways = [LineString([(0, 0), (1, 0)]), LineString([(1 + 1e-12, 0), (2, 0)])]
+        waypoint_graph = process_ways_to_graph(ways, [1, 1], [1, 1], 1000, 10)
+
+        self.assertEqual(waypoint_graph.waypoint_count, 3)
+        self.assertEqual(waypoint_graph.edge_paths[waypoint_graph.find_edge(1, 2)], 1)
+
+    def test_snap_tolerance_joins_nearby_endpoints(self):
+        "Should merge endpoints within the snap tolerance and join their geometry"
+
+        ways = [
+            LineString([(-0.9433, 50.9966), (-0.9423, 50.9966)]),
+            LineString([(-0.942295, 50.9966), (-0.9413, 50.9966)]),
+        ]
+        waypoint_graph = process_ways_to_graph(ways, [1, 1], [1, 1], 1000, 10)
+        self.assertEqual(waypoint_graph.waypoint_count, 4)
+
+        waypoint_graph = process_ways_to_graph(
+            ways, [1, 1], [1, 1], 1000, 10, snap_tolerance=1
+        )
+        self.assertEqual(waypoint_graph.waypoint_count, 3)
+        connection = waypoint_graph.get_connection(1, 2)
+        self.assertEqual(connection.coords[0], (-0.9423, 50.9966))
+
+    def test_broken_route_is_bridged(self):
+        "Should join parts of a route even when they are not nearest neighbours"
+
+        ways = [
+            LineString([(0, 0), (1, 0)]),
+            LineString([(1, 0), (2, 0)]),
+            LineString([(10, 0), (11, 0)]),
+            LineString([(11, 0), (12, 0)]),
+        ]
+        waypoint_graph = process_ways_to_graph(ways, [1] * 4, [1] * 4, 1000, 10, 1)
+
+        create_route = heap_route_creator(*waypoint_graph.edge_arrays)
+        self.assertListEqual(create_route(0, 5), [0, 1, 2, 3, 4, 5])
+        self.assertListEqual(create_route(5, 0), [5, 4, 3, 2, 1, 0])
+
+    def test_contracted_broken_route_is_bridged(self):
+        "Should keep the waypoints either side of a gap when contracting chains"
+
+        ways = [
+            LineString([(0, 0), (1, 0)]),
+            LineString([(1, 0), (2, 0)]),
+            LineString([(10, 0), (11, 0)]),
+            LineString([(11, 0), (12, 0)]),
+        ]
+        waypoint_graph = process_ways_to_graph(
+            ways, [1] * 4, [1] * 4, 1000, 10, 1, contract=True
+        )
+
+        self.assertListEqual(
+            waypoint_graph.coordinates.tolist(), [[0, 0], [2, 0], [10, 0], [12, 0]]
+        )
+        create_route = heap_route_creator(*waypoint_graph.edge_arrays)
+        self.assertListEqual(create_route(0, 3), [0, 1, 2, 3])
+
+    def test_distant_fragments_are_bridged(self):
+        "Should route across gaps wider than the nearest neighbours of every waypoint"
+
+        ways = [
+            LineString([(fragment * 100 + x, 0), (fragment * 100 + x + 1, 0)])
+            for fragment in range(3)
+            for x in range(12)
+        ]
+        coefficients = [1] * len(ways)
+
+        for options in [{}, {"contract": True}, {"gap_radius": 2}]:
+            waypoint_graph = process_ways_to_graph(
+                ways, coefficients, coefficients, 1000, 10, **options
+            )
+            start = waypoint_graph.find_waypoint(ImmutablePoint(0, 0))
+            end = waypoint_graph.find_waypoint(ImmutablePoint(212, 0))
+            route = heap_route_creator(*waypoint_graph.edge_arrays)(start, end)
+            edges = [
+                waypoint_graph.find_edge(route[i - 1], route[i])
+                for i in range(1, len(route))
+            ]
+            # Every way plus two straight line gaps of 88
+            self.assertEqual(waypoint_graph.edge_costs[edges].sum(), 36 + 2 * 88000)
+
+    def test_gap_radius(self):
+        "Should only bridge waypoints within the gap radius"
+
+        ways = [LineString([(0, 0), (1, 0)]), LineString([(1.5, 0), (3, 0)])]
+        waypoint_graph = process_ways_to_graph(ways, [1, 1], [1, 1], 1000, 10, 8, 0.6)
+
+        self.assertEqual(waypoint_graph.find_edge(0, 3), -1)
+        self.assertEqual(waypoint_graph.edge_costs[waypoint_graph.find_edge(1, 2)], 500)
+
+    def test_contracted_route_matches_full_route(self):
+        "Should route over contracted chains and expand them to the same geometry"
+
+        ways = [
+            LineString([(0, 0), (1, 0), (2, 0)]),
+            LineString([(2, 0), (3, 1), (4, 0)]),
+            LineString([(2, 0), (2, 2)]),
+            LineString([(4, 0), (5, 0), (6, 0)]),
+        ]
+        args = (ways, [1, 2, 1, 1], [1, 1, 3, 1], 1000, 10)
+        full_graph = process_ways_to_graph(*args)
+        contracted_graph = process_ways_to_graph(*args, contract=True)
+        self.assertLess(contracted_graph.waypoint_count, full_graph.waypoint_count)
+
+        def find_route(waypoint_graph, start, end):
+            create_route = heap_route_creator(*waypoint_graph.edge_arrays)
+            route = create_route(
+                waypoint_graph.find_waypoint(ImmutablePoint(*start)),
+                waypoint_graph.find_waypoint(ImmutablePoint(*end)),
+            )
+            return [
+                list(line_string.coords)
+                for i_a, i_b in zip(route[:-1], route[1:])
+                for line_string in waypoint_graph.get_connection_line_strings(i_a, i_b)
+            ]
+
+        for start, end in [((0, 0), (6, 0)), ((6, 0), (2, 2)), ((2, 2), (0, 0))]:
+            self.assertListEqual(
+                find_route(contracted_graph, start, end),
+                find_route(full_graph, start, end),
+            )
+
+    def test_keep_coordinates_are_not_contracted(self):
+        ways = [LineString([(0, 0), (1, 0)]), LineString([(1, 0), (2, 0)])]
+        waypoint_graph = process_ways_to_graph(
+            ways, [1, 1], [1, 1], 1000, 10, contract=True
+        )
+        self.assertEqual(waypoint_graph.waypoint_count, 2)
+        self.assertEqual(
+            waypoint_graph.get_connection(0, 1), LineString([(0, 0), (1, 0), (2, 0)])
+        )
+
+        waypoint_graph = process_ways_to_graph(
+            ways,
+            [1, 1],
+            [1, 1],
+            1000,
+            10,
+            contract=True,
+            keep_coordinates=numpy.array([(1, 0)]),
+        )
+        self.assertEqual(waypoint_graph.waypoint_count, 3)
+
+
+class TestFindDeadEnds(unittest.TestCase):
+    def test_chain_ends_are_dead_ends(self):
+        is_dead_end = find_dead_ends(4, numpy.array([0, 1, 2]), numpy.array([1, 2, 1]))
+        self.assertListEqual(is_dead_end.tolist(), [True, False, True, True])
+
+
+class TestComponentBridges(unittest.TestCase):
+    def setUp(self):
+        random_state = numpy.random.RandomState(0)
+        self.coordinates = random_state.uniform(0, 100, (300, 2))
+        self.labels = random_state.randint(0, 12, 300)
+
+    def test_closest_pairs_match_brute_force(self):
+        search_points = numpy.arange(0, 300, 3)
+        sources, targets, squared_distances = find_closest_component_pairs(
+            self.coordinates, self.labels, search_points, 0.5
+        )
+        self.assertListEqual(sorted(self.labels[sources].tolist()), list(range(12)))
+        for source, target, squared_distance in zip(
+            sources, targets, squared_distances
+        ):
+            inside = search_points[self.labels[search_points] == self.labels[source]]
+            outside = numpy.flatnonzero(self.labels != self.labels[source])
+            offsets = self.coordinates[inside, None] - self.coordinates[outside]
+            self.assertNotEqual(self.labels[target], self.labels[source])
+            self.assertAlmostEqual(squared_distance, (offsets ** 2).sum(axis=2).min())
+
+    def test_bridges_join_every_component(self):
+        chain = numpy.flatnonzero(self.labels[:-1] == self.labels[1:])
+        is_dead_end = numpy.zeros(300, dtype=bool)
+        bridge_sources, bridge_targets = find_component_bridges(
+            self.coordinates, chain, chain + 1, is_dead_end
+        )
+        labels = find_connected_components(
+            300,
+            numpy.concatenate([chain, bridge_sources]),
+            numpy.concatenate([chain + 1, bridge_targets]),
+        )
+        self.assertEqual(labels.max(), 0)
+        self.assertEqual(
+            len(bridge_sources), find_connected_components(300, chain, chain + 1).max()
+        )
@@ -0,0 +1,151 @@
+import os
+import json
+import tempfile
+import unittest
+
+import numpy
+from shapely.geometry import LineString
+
+from open_cycle_export.shapely_utilities.immutable_point import ImmutablePoint
+from open_cycle_export.route_processor.waypoint_graph import (
+    NO_PATH,
+    GRAPH_HEADER_FILENAME,
+    WaypointGraph,
+    create_waypoint_graph,
+    save_waypoint_graph,
+    load_waypoint_graph,
+)
+
+
+def simple_waypoint_graph() -> WaypointGraph:
+    "Three waypoints in a line, the first two joined by a bent line segment"
+
+    return create_waypoint_graph(
+        numpy.array([(0, 0), (2, 0), (4, 0)]),
+        numpy.array([0, 1, 1, 2, 0, 1]),
+        numpy.array([1, 0, 2, 1, 1, 0]),
+        numpy.array([3, 30, 2000, 2000, 2000, 2000]),
+        numpy.array([0, 0, NO_PATH, NO_PATH, NO_PATH, NO_PATH]),
+        numpy.array([False, True, False, False, False, False]),
+        [LineString([(0, 0), (1, 1), (2, 0)])],
+    )
+
+
+class TestCreateWaypointGraph(unittest.TestCase):
+    """Test waypoint graph edges are sorted and duplicates removed"""
+
+    def test_edges_sorted_by_source(self):
+        waypoint_graph = simple_waypoint_graph()
+        self.assertListEqual(waypoint_graph.edge_offsets.tolist(), [0, 1, 3, 4])
+        self.assertListEqual(waypoint_graph.edge_targets.tolist(), [1, 0, 2, 1])
+
+    def test_segment_edge_preferred_to_straight_line(self):
+        waypoint_graph = simple_waypoint_graph()
+        self.assertListEqual(waypoint_graph.edge_costs.tolist(), [3, 30, 2000, 2000])
+        self.assertListEqual(waypoint_graph.edge_paths.tolist(), [0, 0, -1, -1])
+
+
+class TestWaypointGraph(unittest.TestCase):
+    """Test waypoints and connections can be retrieved from the graph"""
+
+    def setUp(self):
+        self.waypoint_graph = simple_waypoint_graph()
+
+    def test_find_waypoint(self):
+        self.assertEqual(self.waypoint_graph.find_waypoint(ImmutablePoint(2, 0)), 1)
+        with self.assertRaises(ValueError):
+            self.waypoint_graph.find_waypoint(ImmutablePoint(3, 0))
+
+    def test_get_connection_follows_segment(self):
+        connection = self.waypoint_graph.get_connection(1, 0)
+        self.assertListEqual(list(connection.coords), [(2, 0), (1, 1), (0, 0)])
+
+    def test_get_connection_straight_line(self):
+        connection = self.waypoint_graph.get_connection(1, 2)
+        self.assertListEqual(list(connection.coords), [(2, 0), (4, 0)])
+
+    def test_dict_round_trip(self):
+        waypoint_graph = WaypointGraph.from_dict(self.waypoint_graph.to_dict())
+        self.assertListEqual(
+            waypoint_graph.edge_costs.tolist(), self.waypoint_graph.edge_costs.tolist()
+        )
+        connection = waypoint_graph.get_connection(0, 1)
+        self.assertListEqual(list(connection.coords), [(0, 0), (1, 1), (2, 0)])
+
+
+class TestWaypointGraphPaths(unittest.TestCase):
+    """Test paths of several line segments are expanded in order of travel"""
+
+    def setUp(self):
+        self.waypoint_graph = create_waypoint_graph(
+            numpy.array([(0, 0), (2, 0)]),
+            numpy.array([0, 1]),
+            numpy.array([1, 0]),
+            numpy.array([2, 2]),
+            numpy.array([0, 0]),
+            numpy.array([False, True]),
+            [LineString([(0, 0), (1, 1)]), LineString([(2, 0), (1, 1)])],
+            [[(0, False), (1, True)]],
+        )
+
+    def test_get_connection_line_strings(self):
+        line_strings = self.waypoint_graph.get_connection_line_strings(1, 0)
+        self.assertListEqual(
+            [list(line_string.coords) for line_string in line_strings],
+            [[(2, 0), (1, 1)], [(1, 1), (0, 0)]],
+        )
+
+    def test_get_connection_joins_segments(self):
+        connection = self.waypoint_graph.get_connection(0, 1)
+        self.assertListEqual(list(connection.coords), [(0, 0), (1, 1), (2, 0)])
+
+
+class TestSaveWaypointGraph(unittest.TestCase):
+    """Test graphs are saved as arrays which can be memory mapped"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.temporary_directory.name, "graph")
+        self.waypoint_graph = simple_waypoint_graph()
+        save_waypoint_graph(self.waypoint_graph, self.directory)
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_round_trip(self):
+        waypoint_graph = load_waypoint_graph(self.directory)
+        for name in WaypointGraph.__annotations__.keys():
+            numpy.testing.assert_array_equal(
+                getattr(waypoint_graph, name), getattr(self.waypoint_graph, name)
+            )
+            self.assertEqual(
+                getattr(waypoint_graph, name).dtype,
+                getattr(self.waypoint_graph, name).dtype,
+            )
+        connection = waypoint_graph.get_connection(1, 0)
+        self.assertListEqual(list(connection.coords), [(2, 0), (1, 1), (0, 0)])
+
+    def test_crs_round_trip(self):
+        self.assertEqual(load_waypoint_graph(self.directory).crs, 4326)
+        arrays = self.waypoint_graph.to_dict()
+        arrays["crs"] = 27700
+        metric_graph = WaypointGraph.from_dict(arrays)
+        save_waypoint_graph(metric_graph, self.directory)
+        self.assertEqual(load_waypoint_graph(self.directory).crs, 27700)
+
+    def test_arrays_are_memory_mapped(self):
+        waypoint_graph = load_waypoint_graph(self.directory)
+        self.assertFalse(waypoint_graph.segment_coordinates.flags.owndata)
+        self.assertFalse(waypoint_graph.segment_coordinates.flags.writeable)
+
+    def test_missing_header(self):
+        os.remove(os.path.join(self.directory, GRAPH_HEADER_FILENAME))
+        with self.assertRaises(FileNotFoundError):
+            load_waypoint_graph(self.directory)
+
+    def test_unsupported_version(self):
+        header_path = os.path.join(self.directory, GRAPH_HEADER_FILENAME)
+        with open(header_path, "w") as open_file:
+            json.dump({"version": 0, "arrays": {}}, open_file)
+        with self.assertRaises(ValueError):
+            load_waypoint_graph(self.directory)
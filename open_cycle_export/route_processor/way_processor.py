@@ -4,6 +4,14 @@
 2. Find waypoints at all joins between created line segments
 3. Create cost matrix between all waypoints using line segment length or euclidean distance
 
+process_ways_to_graph replaces step 3 with a sparse waypoint graph which only holds
+connections along line segments and straight line gap bridging connections between
+each waypoint and its nearest neighbours (or neighbours within a radius), plus the
+connections needed to join any disconnected parts of the route. Waypoints in the
+graph are integer nodes from a NodeRegistry rather than hashed shapely points.
+Chains of line segments between junctions can be contracted into single paths so
+the graph only holds waypoints where a route has a choice of direction.
+
 """
 
 from typing import List, Dict, Tuple, Callable
@@ -12,8 +20,12 @@ from collections import OrderedDict
 import time
 import logging
 
+import numpy
 import shapely.ops
+import shapely.prepared
+from shapely.strtree import STRtree
 from shapely.geometry import Point, LineString
+from shapely.geometry.base import BaseGeometry
 
 from open_cycle_export.shapely_utilities.formatting_tools import pretty_geometry_print
 from open_cycle_export.shapely_utilities.immutable_point import ImmutablePoint
@@ -21,6 +33,27 @@ from open_cycle_export.shapely_utilities.line_string_tools import reverse_line_s
 from open_cycle_export.shapely_utilities.line_string_splitter import (
     split_line_by_intersecting_lines,
 )
+from open_cycle_export.route_processor.waypoint_graph import (
+    NO_PATH,
+    WaypointGraph,
+    create_waypoint_graph,
+    find_connected_components,
+)
+from open_cycle_export.route_processor.node_registry import NodeRegistry
+from open_cycle_export.route_processor.chain_contractor import contract_chains
+from open_cycle_export.route_processor.coordinate_snapper import snap_coordinates
+from open_cycle_export.route_processor.point_distances import find_distance_matrix
+from open_cycle_export.route_processor.spatial_convertor import (
+    WGS84,
+    get_coordinate_precision,
+)
+from open_cycle_export.spatial_index.grid_index import (
+    CELL_KEY_OFFSET,
+    GridIndex,
+    estimate_cell_size,
+    expand_ranges,
+    rank_within_groups,
+)
 
 Waypoints = List[ImmutablePoint]
 WaypointConnections = List[List[LineString]]
@@ -32,8 +65,11 @@ RetrieveWaypointConnections = Callable[[ImmutablePoint, ImmutablePoint], List[in
 logger = logging.getLogger(__name__)
 
 
-def find_intersecting_lines(lines: List[LineString]) -> List[List[LineString]]:
-    logger.info("find intersecting lines")
+def find_intersecting_lines_pairwise(
+    lines: List[LineString],
+) -> List[List[LineString]]:
+    "Reference implementation testing every ordered pair of lines"
+
     return [
         [
             line_b
@@ -44,6 +80,74 @@ def find_intersecting_lines(lines: List[LineString]) -> List[List[LineString]]:
     ]
 
 
+def query_line_indexes(
+    tree: STRtree,
+    line: LineString,
+    line_groups: Dict[int, List[int]],
+    tree_groups: List[List[int]],
+) -> List[int]:
+    """Indexes of lines with bounding boxes overlapping the line
+
+    Arguments:
+        tree {STRtree} -- Spatial index of the distinct line objects
+        line {LineString} -- Line to query with
+        line_groups {Dict[int, List[int]]} -- Indexes of each distinct line object by id
+        tree_groups {List[List[int]]} -- Indexes of each line object in the tree
+
+    Raises:
+        ValueError -- When the index returns a geometry which was not indexed
+
+    Returns:
+        List[int] -- Indexes of every line in the original order with an overlapping bounding box
+    """
+
+    indexes = []
+    # Shapely 1.x returns the indexed geometries where 2.x returns their indexes
+    for candidate in tree.query(line):
+        if isinstance(candidate, BaseGeometry):
+            if id(candidate) not in line_groups:
+                raise ValueError("spatial index returned a line which is not indexed")
+            indexes.extend(line_groups[id(candidate)])
+        else:
+            indexes.extend(tree_groups[candidate])
+    return indexes
+
+
+def find_intersecting_lines(lines: List[LineString]) -> List[List[LineString]]:
+    """Find the lines which intersect each line
+
+    Candidates are found by bounding box overlap from a spatial index and each
+    unordered pair of lines is only tested once. A line object which appears more
+    than once is indexed once and matched at every position it appears
+    
+    Arguments:
+        lines {List[LineString]} -- Lines to compare with one another
+    
+    Returns:
+        List[List[LineString]] -- Intersecting lines for each line in original order
+    """
+
+    logger.info("find intersecting lines")
+    if len(lines) < 1:
+        return []
+
+    line_groups: Dict[int, List[int]] = OrderedDict()
+    for index, line in enumerate(lines):
+        line_groups.setdefault(id(line), []).append(index)
+    tree_groups = list(line_groups.values())
+    tree = STRtree([lines[indexes[0]] for indexes in tree_groups])
+    intersecting_indexes = [[] for _ in lines]
+
+    for i, line_a in enumerate(lines):
+        prepared_line_a = shapely.prepared.prep(line_a)
+        for j in query_line_indexes(tree, line_a, line_groups, tree_groups):
+            if j > i and prepared_line_a.intersects(lines[j]):
+                intersecting_indexes[i].append(j)
+                intersecting_indexes[j].append(i)
+
+    return [[lines[j] for j in sorted(indexes)] for indexes in intersecting_indexes]
+
+
 def get_line_endpoints(line: LineString) -> ImmutablePoint:
     return (ImmutablePoint(*line.coords[0]), ImmutablePoint(*line.coords[-1]))
 
@@ -131,6 +235,63 @@ def create_waypoints(
     return sorted(list(waypoints.keys()), key=get_order), retrieve_connections
 
 
+def create_node_registry(
+    line_segments: List[LineString], snap_tolerance: float = None, crs: int = WGS84
+) -> NodeRegistry:
+    """Register integer waypoint nodes at the endpoints of all line segments
+
+    Nodes are numbered in the same order as create_waypoints, the start then end
+    of each line segment in turn
+    
+    Arguments:
+        line_segments {List[LineString]} -- Line segments between every desired waypoint
+    
+    Keyword Arguments:
+        snap_tolerance {float} -- Metres within which endpoints are merged (default: {None})
+        crs {int} -- EPSG code of the line segment coordinates (default: {4326})
+    
+    Returns:
+        NodeRegistry -- Registry with the start and end node of each line segment
+    """
+
+    logger.info("create waypoint nodes from line segments")
+    endpoint_coordinates = numpy.array(
+        [
+            (line_segment.coords[0][:2], line_segment.coords[-1][:2])
+            for line_segment in line_segments
+        ],
+        dtype=float,
+    )
+    precision = get_coordinate_precision(crs)
+    if snap_tolerance:
+        endpoint_coordinates, statistics = snap_coordinates(
+            endpoint_coordinates, snap_tolerance, crs == WGS84, precision
+        )
+        logger.info(
+            "snapped %s of %s waypoints within %sm leaving %s",
+            statistics.merged_node_count,
+            statistics.node_count,
+            snap_tolerance,
+            statistics.snapped_node_count,
+        )
+    return NodeRegistry(endpoint_coordinates, precision)
+
+
+def move_line_endpoints(
+    line_segments: List[LineString],
+    start_coordinates: numpy.ndarray,
+    end_coordinates: numpy.ndarray,
+) -> List[LineString]:
+    "Replace the first and last coordinates of each line segment"
+
+    return [
+        LineString([start, *line_segment.coords[1:-1], end])
+        for line_segment, start, end in zip(
+            line_segments, start_coordinates, end_coordinates
+        )
+    ]
+
+
 def make_matrix(shape: Tuple[int, int], fill=None):
     return [[fill for j in range(shape[1])] for i in range(shape[0])]
 
@@ -177,6 +338,9 @@ def process_ways(
     close_waypoint_distance: float = 0.5,
 ) -> Tuple[Waypoints, WaypointConnections, Matrix, Matrix]:
     """Process ways to be used in route creation
+
+    Waypoint distances are a float32 array found in one broadcast, and only pairs
+    of waypoints joined by a line segment are looked at for connections
     
     Arguments:
         ways {List[LineString]} -- List of all available ways 
@@ -203,38 +367,412 @@ def process_ways(
     waypoints, retrieve_connections = create_waypoints(line_segments)
     matrix_shape = (len(waypoints), len(waypoints))
 
-    logger.info("make empty matrixes for results (%s)", timer.get_elapsed())
+    logger.info("find distances between all waypoints (%s)", timer.get_elapsed())
+    coordinates = numpy.array(
+        [waypoint.coords[0][:2] for waypoint in waypoints], dtype=float
+    ).reshape(-1, 2)
+    waypoint_distances = find_distance_matrix(coordinates)
+
+    logger.info("make matrixes for results (%s)", timer.get_elapsed())
     waypoint_connections: WaypointConnections = make_matrix(matrix_shape)
-    costs_matrix: Matrix = make_matrix(matrix_shape)
-
-    logger.info("loop through all waypoint connections (%s)", timer.get_elapsed())
-    waypoint_distances = [[w_a.distance(w_b) for w_b in waypoints] for w_a in waypoints]
-
-    for i, point_a in enumerate(waypoints):
-        for j, point_b in enumerate(waypoints):
-            if waypoint_distances[i][j] < close_waypoint_distance:
-                connections = [
-                    (index, "forward")
-                    for index in retrieve_connections(point_a, point_b)
-                ] + [
-                    (index, "reverse")
-                    for index in retrieve_connections(point_b, point_a)
-                ]
-                if len(connections):
-                    connection_index, direction = min(
-                        connections, key=get_connection_cost
-                    )
-                    waypoint_connections[i][j] = (
-                        line_segments[connection_index]
-                        if direction == "forward"
-                        else reverse_line_string(line_segments[connection_index])
-                    )
-                    costs_matrix[i][j] = get_connection_cost(
-                        (connection_index, direction)
-                    )
-                    continue
-            costs_matrix[i][j] = waypoint_distances[i][j] * unconnected_coefficient
+    costs_matrix: Matrix = (
+        waypoint_distances.astype(float) * unconnected_coefficient
+    ).tolist()
+
+    logger.info("find connections along line segments (%s)", timer.get_elapsed())
+    waypoint_indexes = {waypoint: index for index, waypoint in enumerate(waypoints)}
+    connected_pairs = set()
+    for line_segment in line_segments:
+        start, end = get_line_endpoints(line_segment)
+        i, j = waypoint_indexes[start], waypoint_indexes[end]
+        connected_pairs.update([(i, j), (j, i)])
+
+    for i, j in sorted(connected_pairs):
+        if waypoint_distances[i, j] >= close_waypoint_distance:
+            continue
+        point_a, point_b = waypoints[i], waypoints[j]
+        connections = [
+            (index, "forward") for index in retrieve_connections(point_a, point_b)
+        ] + [(index, "reverse") for index in retrieve_connections(point_b, point_a)]
+        connection_index, direction = min(connections, key=get_connection_cost)
+        waypoint_connections[i][j] = (
+            line_segments[connection_index]
+            if direction == "forward"
+            else reverse_line_string(line_segments[connection_index])
+        )
+        costs_matrix[i][j] = get_connection_cost((connection_index, direction))
 
     time_elapsed_looping_waypoints = timer.get_elapsed()
     logger.info("process ways complete (%s)", time_elapsed_looping_waypoints)
     return waypoints, waypoint_distances, waypoint_connections, costs_matrix
+
+
+def find_nearest_waypoints(
+    coordinates: numpy.ndarray, neighbour_count: int
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Find the nearest neighbours of every waypoint using a grid index
+    
+    Arguments:
+        coordinates {numpy.ndarray} -- Coordinates of all waypoints
+        neighbour_count {int} -- Number of neighbours to find for each waypoint
+    
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray] -- Waypoint and neighbour index of each pair
+    """
+
+    cell_size = estimate_cell_size(coordinates, neighbour_count)
+    grid_index = GridIndex(coordinates, cell_size)
+    exclude = numpy.arange(len(coordinates))
+    return grid_index.query_nearest(coordinates, neighbour_count, exclude)
+
+
+def find_waypoints_within_radius(
+    coordinates: numpy.ndarray, radius: float
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    "Find all pairs of waypoints within a radius of one another using a grid index"
+
+    return GridIndex(coordinates, radius).query_pairs(radius)
+
+
+def find_dead_ends(
+    waypoint_count: int, edge_sources: numpy.ndarray, edge_targets: numpy.ndarray
+) -> numpy.ndarray:
+    "Flag waypoints connected to at most one other waypoint"
+
+    pairs = numpy.concatenate(
+        [
+            numpy.stack([edge_sources, edge_targets], axis=1),
+            numpy.stack([edge_targets, edge_sources], axis=1),
+        ]
+    ).reshape(-1, 2)
+    pairs = numpy.unique(pairs[pairs[:, 0] != pairs[:, 1]], axis=0)
+    return numpy.bincount(pairs[:, 0], minlength=waypoint_count) <= 1
+
+
+def find_closest_component_pairs(
+    coordinates: numpy.ndarray,
+    labels: numpy.ndarray,
+    search_points: numpy.ndarray,
+    cell_size: float,
+) -> Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    """Find the closest search point and waypoint in another component of each component
+
+    Waypoints are sorted by grid cell then component, so the waypoints of other
+    components in a cell are the two ranges either side of the query component. The
+    3 by 3 cells around each search point are searched, doubling the cell size until
+    a search point of the component has a waypoint of another component within one
+    cell, which is then closer than anything the other search points can find
+    
+    Arguments:
+        coordinates {numpy.ndarray} -- Coordinates of all waypoints
+        labels {numpy.ndarray} -- Component of each waypoint, numbered from zero
+        search_points {numpy.ndarray} -- Waypoints to search from
+        cell_size {float} -- Cell size of the first search
+    
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray] -- Search point, waypoint and squared distance of the closest pair of each component
+    """
+
+    def get_cell_keys(cells):
+        return cells[:, 0] * 2 * CELL_KEY_OFFSET + (cells[:, 1] + CELL_KEY_OFFSET)
+
+    label_count = int(labels.max(initial=0)) + 1
+    origin = coordinates.min(axis=0)
+    extent = float(numpy.ptp(coordinates, axis=0).max())
+    found_sources, found_targets, found_distances = [], [], []
+    pending = search_points
+    while len(pending):
+        cells = numpy.floor((coordinates - origin) / cell_size).astype(numpy.int64)
+        unique_keys, cell_ranks = numpy.unique(
+            get_cell_keys(cells), return_inverse=True
+        )
+        sort_keys = cell_ranks.reshape(-1) * label_count + labels
+        order = numpy.argsort(sort_keys, kind="stable")
+        sorted_keys = sort_keys[order]
+
+        queries, indexes = [], []
+        pending_labels = labels[pending]
+        for offset in [(x, y) for x in [-1, 0, 1] for y in [-1, 0, 1]]:
+            query_keys = get_cell_keys(cells[pending] + offset)
+            ranks = numpy.searchsorted(unique_keys, query_keys)
+            found_keys = unique_keys[numpy.minimum(ranks, len(unique_keys) - 1)]
+            is_occupied = found_keys == query_keys
+            first_keys = ranks[is_occupied] * label_count
+            query_labels = pending_labels[is_occupied]
+            bounds = [
+                numpy.searchsorted(sorted_keys, first_keys, "left"),
+                numpy.searchsorted(sorted_keys, first_keys + query_labels, "left"),
+                numpy.searchsorted(sorted_keys, first_keys + query_labels, "right"),
+                numpy.searchsorted(sorted_keys, first_keys + label_count, "left"),
+            ]
+            occupied = numpy.flatnonzero(is_occupied)
+            for range_starts, range_ends in [bounds[:2], bounds[2:]]:
+                range_queries, positions = expand_ranges(range_starts, range_ends)
+                queries.append(occupied[range_queries])
+                indexes.append(order[positions])
+
+        queries, indexes = numpy.concatenate(queries), numpy.concatenate(indexes)
+        sources = pending[queries]
+        offsets = coordinates[sources] - coordinates[indexes]
+        squared_distances = (offsets ** 2).sum(axis=1)
+        # Every waypoint within one cell of a search point is in the cells searched
+        is_resolved = squared_distances <= cell_size ** 2
+        if cell_size > extent:
+            is_resolved[:] = True
+        sources, indexes = sources[is_resolved], indexes[is_resolved]
+        squared_distances = squared_distances[is_resolved]
+        closest = numpy.lexsort((indexes, sources, squared_distances, labels[sources]))
+        closest = closest[rank_within_groups(labels[sources][closest]) == 0]
+        found_sources.append(sources[closest])
+        found_targets.append(indexes[closest])
+        found_distances.append(squared_distances[closest])
+
+        pending = pending[~numpy.isin(pending_labels, labels[sources[closest]])]
+        cell_size *= 2
+
+    return (
+        numpy.concatenate(found_sources),
+        numpy.concatenate(found_targets),
+        numpy.concatenate(found_distances),
+    )
+
+
+def find_component_bridges(
+    coordinates: numpy.ndarray,
+    edge_sources: numpy.ndarray,
+    edge_targets: numpy.ndarray,
+    is_dead_end: numpy.ndarray,
+) -> Tuple[numpy.ndarray, numpy.ndarray]:
+    """Find straight line connections which join all disconnected parts of a route
+
+    Each round every component is joined to its closest waypoint in another
+    component, searching from dead end waypoints where a component has them, so the
+    number of components at least halves each round
+    
+    Arguments:
+        coordinates {numpy.ndarray} -- Coordinates of all waypoints
+        edge_sources {numpy.ndarray} -- Waypoint at the start of each existing edge
+        edge_targets {numpy.ndarray} -- Waypoint at the end of each existing edge
+        is_dead_end {numpy.ndarray} -- Flag for waypoints at the end of a way
+    
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray] -- Waypoint indexes at each end of the bridges
+    """
+
+    waypoint_count = len(coordinates)
+    labels = find_connected_components(waypoint_count, edge_sources, edge_targets)
+    cell_size = estimate_cell_size(coordinates, 4)
+
+    bridge_sources, bridge_targets = [], []
+    while labels.max(initial=0) > 0:
+        has_dead_end = numpy.bincount(labels, weights=is_dead_end) > 0
+        search_points = numpy.flatnonzero(is_dead_end | ~has_dead_end[labels])
+        sources, targets, squared_distances = find_closest_component_pairs(
+            coordinates, labels, search_points, cell_size
+        )
+        # Components are joined in order of distance, skipping pairs already joined
+        closest = numpy.argsort(squared_distances, kind="stable")
+
+        roots = numpy.arange(labels.max() + 1)
+
+        def find_root(label):
+            while roots[label] != label:
+                roots[label] = roots[roots[label]]
+                label = roots[label]
+            return label
+
+        for source, target in zip(sources[closest], targets[closest]):
+            source_root = find_root(labels[source])
+            target_root = find_root(labels[target])
+            if source_root != target_root:
+                roots[source_root] = target_root
+                bridge_sources.append(source)
+                bridge_targets.append(target)
+
+        labels = numpy.array([find_root(label) for label in range(len(roots))])[labels]
+        labels = numpy.unique(labels, return_inverse=True)[1].reshape(-1)
+
+    return (
+        numpy.array(bridge_sources, dtype=numpy.int64),
+        numpy.array(bridge_targets, dtype=numpy.int64),
+    )
+
+
+def process_ways_to_graph(
+    ways: List[LineString],
+    forward_coefficients: List[float],
+    reverse_coefficients: List[float],
+    unconnected_coefficient: float,
+    close_waypoint_distance: float = 0.5,
+    gap_neighbour_count: int = 8,
+    gap_radius: float = None,
+    snap_tolerance: float = None,
+    contract: bool = False,
+    keep_coordinates: numpy.ndarray = None,
+    crs: int = WGS84,
+) -> WaypointGraph:
+    """Process ways into a sparse waypoint graph to be used in route creation
+    
+    Arguments:
+        ways {List[LineString]} -- List of all available ways 
+        forward_coefficients {List[float]} -- Coefficients for travel along each way in forward direction
+        reverse_coefficients {List[float]} -- Coefficients for travel along each way in reverse direction
+        unconnected_coefficient {float} -- Coefficient to apply to straight line distance when no way exists between waypoints
+    
+    Keyword Arguments:
+        close_waypoint_distance {float} -- Line segments with endpoints further apart are bridged by straight lines (default: {0.5})
+        gap_neighbour_count {int} -- Number of nearest waypoints to bridge to with straight lines (default: {8})
+        gap_radius {float} -- Bridge to all waypoints within this distance instead of the nearest (default: {None})
+        snap_tolerance {float} -- Merge line segment endpoints within this many metres (default: {None})
+        contract {bool} -- Contract chains of line segments between junctions into single paths (default: {False})
+        keep_coordinates {numpy.ndarray} -- Coordinates of waypoints which must not be contracted (default: {None})
+        crs {int} -- EPSG code of the way coordinates, distances are in its units (default: {4326})
+    
+    Returns:
+        WaypointGraph -- Waypoints and the connections between them
+    """
+
+    timer = Timer()
+
+    logger.info("create line segment from %s ways (%s)", len(ways), timer.get_elapsed())
+    line_segments, line_segments_way_lookup = create_line_segments(ways)
+
+    logger.info("find line segment costs (%s)", timer.get_elapsed())
+    create_segment_costs = segment_cost_creator(line_segments, line_segments_way_lookup)
+    forward_costs = numpy.array(create_segment_costs(forward_coefficients), dtype=float)
+    reverse_costs = numpy.array(create_segment_costs(reverse_coefficients), dtype=float)
+
+    logger.info("create waypoint nodes (%s)", timer.get_elapsed())
+    node_registry = create_node_registry(line_segments, snap_tolerance, crs)
+    coordinates = node_registry.coordinates
+    segment_endpoints = node_registry.node_ids.reshape(-1, 2)
+    starts, ends = segment_endpoints[:, 0], segment_endpoints[:, 1]
+    if snap_tolerance:
+        line_segments = move_line_endpoints(
+            line_segments, coordinates[starts], coordinates[ends]
+        )
+
+    logger.info("find line segment connections (%s)", timer.get_elapsed())
+    endpoint_offsets = coordinates[ends] - coordinates[starts]
+    endpoint_distances = numpy.hypot(endpoint_offsets[:, 0], endpoint_offsets[:, 1])
+    is_loop = starts == ends
+    is_connection = ~is_loop & (endpoint_distances < close_waypoint_distance)
+    is_distant = ~is_loop & ~is_connection
+    segments = numpy.flatnonzero(is_connection)
+    distant_starts, distant_ends = starts[is_distant], ends[is_distant]
+    crossing_sources = crossing_targets = numpy.zeros(0, dtype=numpy.int64)
+
+    def find_gap_pairs(coordinates):
+        if gap_radius is None:
+            return find_nearest_waypoints(coordinates, gap_neighbour_count)
+        return find_waypoints_within_radius(coordinates, gap_radius)
+
+    if contract:
+        logger.info("find gaps between disconnected ways (%s)", timer.get_elapsed())
+        # Waypoints bridging a gap to another part of the route are kept, straight
+        # line shortcuts within a connected part are only kept between junctions
+        gap_pairs = find_gap_pairs(coordinates)
+        labels = find_connected_components(
+            len(coordinates), starts[segments], ends[segments]
+        )
+        is_crossing = labels[gap_pairs[0]] != labels[gap_pairs[1]]
+        crossing_sources = gap_pairs[0][is_crossing]
+        crossing_targets = gap_pairs[1][is_crossing]
+
+        logger.info("contract line segment chains (%s)", timer.get_elapsed())
+        is_kept = numpy.zeros(len(coordinates), dtype=bool)
+        is_kept[distant_starts] = is_kept[distant_ends] = True
+        is_kept[crossing_sources] = is_kept[crossing_targets] = True
+        if keep_coordinates is not None and len(keep_coordinates):
+            keep_nodes = node_registry.find_nodes(keep_coordinates)
+            is_kept[keep_nodes[keep_nodes >= 0]] = True
+        chains = contract_chains(
+            len(coordinates),
+            starts[segments],
+            ends[segments],
+            forward_costs[segments],
+            reverse_costs[segments],
+            is_kept,
+        )
+        logger.info(
+            "contracted %s waypoints to %s",
+            len(coordinates),
+            len(chains.kept_waypoints),
+        )
+        waypoint_ids = numpy.full(len(coordinates), -1, dtype=numpy.int64)
+        waypoint_ids[chains.kept_waypoints] = numpy.arange(len(chains.kept_waypoints))
+        coordinates = coordinates[chains.kept_waypoints]
+        path_starts = waypoint_ids[chains.path_starts]
+        path_ends = waypoint_ids[chains.path_ends]
+        path_forward_costs = chains.path_forward_costs
+        path_reverse_costs = chains.path_reverse_costs
+        segment_paths = [
+            [(segments[segment], is_reversed) for segment, is_reversed in path]
+            for path in chains.segment_paths
+        ]
+        paths = numpy.arange(len(segment_paths))
+        distant_starts, distant_ends = (
+            waypoint_ids[distant_starts],
+            waypoint_ids[distant_ends],
+        )
+        crossing_sources, crossing_targets = (
+            waypoint_ids[crossing_sources],
+            waypoint_ids[crossing_targets],
+        )
+    else:
+        path_starts, path_ends = starts[segments], ends[segments]
+        path_forward_costs = forward_costs[segments]
+        path_reverse_costs = reverse_costs[segments]
+        segment_paths = None
+        paths = segments
+
+    logger.info("find gap bridging connections (%s)", timer.get_elapsed())
+    gap_pairs = find_gap_pairs(coordinates)
+    gap_sources = numpy.concatenate([gap_pairs[0], crossing_sources, distant_starts])
+    gap_targets = numpy.concatenate([gap_pairs[1], crossing_targets, distant_ends])
+
+    logger.info("join disconnected components (%s)", timer.get_elapsed())
+    is_dead_end = find_dead_ends(len(coordinates), path_starts, path_ends)
+    bridge_sources, bridge_targets = find_component_bridges(
+        coordinates,
+        numpy.concatenate([path_starts, gap_sources]),
+        numpy.concatenate([path_ends, gap_targets]),
+        is_dead_end,
+    )
+    logger.info("found %s component bridges", len(bridge_sources))
+    gap_sources = numpy.concatenate([gap_sources, bridge_sources])
+    gap_targets = numpy.concatenate([gap_targets, bridge_targets])
+    gap_sources, gap_targets = (
+        numpy.concatenate([gap_sources, gap_targets]),
+        numpy.concatenate([gap_targets, gap_sources]),
+    )
+    gap_offsets = coordinates[gap_targets] - coordinates[gap_sources]
+    gap_costs = numpy.hypot(gap_offsets[:, 0], gap_offsets[:, 1])
+    gap_costs = gap_costs * unconnected_coefficient
+
+    logger.info("create waypoint graph (%s)", timer.get_elapsed())
+    waypoint_graph = create_waypoint_graph(
+        coordinates,
+        numpy.concatenate([path_starts, path_ends, gap_sources]),
+        numpy.concatenate([path_ends, path_starts, gap_targets]),
+        numpy.concatenate([path_forward_costs, path_reverse_costs, gap_costs]),
+        numpy.concatenate([paths, paths, numpy.full(len(gap_sources), NO_PATH)]),
+        numpy.concatenate(
+            [
+                numpy.zeros(len(paths), dtype=bool),
+                numpy.ones(len(paths), dtype=bool),
+                numpy.zeros(len(gap_sources), dtype=bool),
+            ]
+        ),
+        line_segments,
+        segment_paths,
+        crs,
+    )
+
+    logger.info(
+        "process ways complete with %s waypoints and %s edges (%s)",
+        waypoint_graph.waypoint_count,
+        waypoint_graph.edge_count,
+        timer.get_elapsed(),
+    )
+    return waypoint_graph
@@ -0,0 +1,396 @@
+"""Compact graph of waypoints and the connections between them
+
+Edges leaving each waypoint are stored as compressed sparse row (CSR) arrays so only
+connections which exist are held in memory, rather than a full N×N cost matrix.
+
+Edge path - Index of the path followed by an edge or -1 for a straight line
+Edge reversed - True when the path is followed from its end to its start
+Path - Sequence of line segments joined end to end, a chain of ways with no junctions
+Path reversed - True when a line segment is followed from its end to its start in a path
+
+Coordinates are in the CRS recorded with the graph, lon/lat (EPSG:4326) unless ways
+were projected before processing, in which case costs are in metres.
+
+Graphs are saved as a directory holding one .npy file per array and a small JSON
+header, written last, so they can be loaded with memory mapping and no parsing. Each
+file is written to a temporary file and renamed into place.
+
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import os
+import json
+
+import numpy
+from shapely.geometry import LineString
+
+from open_cycle_export.cache_utilities.atomic_cache import atomic_write
+from open_cycle_export.route_processor.node_registry import quantize_coordinates
+from open_cycle_export.route_processor.routing_algorithm import EdgeArrays
+from open_cycle_export.route_processor.spatial_convertor import (
+    WGS84,
+    get_coordinate_precision,
+)
+from open_cycle_export.shapely_utilities.immutable_point import ImmutablePoint
+
+NO_PATH = -1
+GRAPH_FORMAT_VERSION = 2
+GRAPH_HEADER_FILENAME = "header.json"
+
+SegmentPath = Sequence[Tuple[int, bool]]
+
+
+class WaypointGraph:
+    """Waypoint coordinates, CSR edge arrays, CSR paths and flat segment coordinates
+
+    Array attributes are annotated, the EPSG code of the coordinates is held in crs
+    """
+
+    coordinates: numpy.ndarray
+    edge_offsets: numpy.ndarray
+    edge_targets: numpy.ndarray
+    edge_costs: numpy.ndarray
+    edge_paths: numpy.ndarray
+    edge_reversed: numpy.ndarray
+    path_offsets: numpy.ndarray
+    path_segments: numpy.ndarray
+    path_reversed: numpy.ndarray
+    segment_offsets: numpy.ndarray
+    segment_coordinates: numpy.ndarray
+
+    def __init__(
+        self,
+        coordinates: numpy.ndarray,
+        edge_offsets: numpy.ndarray,
+        edge_targets: numpy.ndarray,
+        edge_costs: numpy.ndarray,
+        edge_paths: numpy.ndarray,
+        edge_reversed: numpy.ndarray,
+        path_offsets: numpy.ndarray,
+        path_segments: numpy.ndarray,
+        path_reversed: numpy.ndarray,
+        segment_offsets: numpy.ndarray,
+        segment_coordinates: numpy.ndarray,
+        crs: int = WGS84,
+    ):
+        self.crs = int(crs)
+        self.coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+        self.edge_offsets = numpy.asarray(edge_offsets, dtype=numpy.int64)
+        self.edge_targets = numpy.asarray(edge_targets, dtype=numpy.int32)
+        self.edge_costs = numpy.asarray(edge_costs, dtype=float)
+        self.edge_paths = numpy.asarray(edge_paths, dtype=numpy.int32)
+        self.edge_reversed = numpy.asarray(edge_reversed, dtype=bool)
+        self.path_offsets = numpy.asarray(path_offsets, dtype=numpy.int64)
+        self.path_segments = numpy.asarray(path_segments, dtype=numpy.int32)
+        self.path_reversed = numpy.asarray(path_reversed, dtype=bool)
+        self.segment_offsets = numpy.asarray(segment_offsets, dtype=numpy.int64)
+        self.segment_coordinates = numpy.asarray(
+            segment_coordinates, dtype=float
+        ).reshape(-1, 2)
+
+    @property
+    def waypoint_count(self) -> int:
+        return len(self.coordinates)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_targets)
+
+    @property
+    def edge_arrays(self) -> EdgeArrays:
+        return self.edge_offsets, self.edge_targets, self.edge_costs
+
+    def get_waypoint(self, index: int) -> ImmutablePoint:
+        return ImmutablePoint(*map(float, self.coordinates[index]))
+
+    def find_waypoint(self, point: ImmutablePoint) -> int:
+        "Index of the waypoint at the same location as the point"
+
+        precision = get_coordinate_precision(self.crs)
+        point_key = quantize_coordinates(point.coords[0][:2], precision)
+        quantized_coordinates = quantize_coordinates(self.coordinates, precision)
+        is_point = numpy.all(quantized_coordinates == point_key, axis=1)
+        indexes = numpy.flatnonzero(is_point)
+        if len(indexes) < 1:
+            raise ValueError("{} is not a waypoint".format(point))
+        return int(indexes[0])
+
+    def find_edge(self, i_a: int, i_b: int) -> int:
+        "Index of the edge from waypoint i_a to i_b or -1 when not connected"
+
+        first_edge, last_edge = self.edge_offsets[i_a], self.edge_offsets[i_a + 1]
+        edges = numpy.flatnonzero(self.edge_targets[first_edge:last_edge] == i_b)
+        return int(first_edge + edges[0]) if len(edges) else -1
+
+    def get_segment_line_string(self, segment: int, reverse=False) -> LineString:
+        first, last = self.segment_offsets[segment], self.segment_offsets[segment + 1]
+        coordinates = self.segment_coordinates[first:last]
+        return LineString(coordinates[::-1] if reverse else coordinates)
+
+    def get_path_line_strings(self, path: int, reverse=False) -> List[LineString]:
+        "Line segments making up a path in order of travel"
+
+        first, last = self.path_offsets[path], self.path_offsets[path + 1]
+        segments = zip(
+            self.path_segments[first:last].tolist(),
+            self.path_reversed[first:last].tolist(),
+        )
+        line_strings = [
+            self.get_segment_line_string(segment, reversed_segment != reverse)
+            for segment, reversed_segment in segments
+        ]
+        return line_strings[::-1] if reverse else line_strings
+
+    def get_path_line_string(self, path: int, reverse=False) -> LineString:
+        "Single line following all segments of a path"
+
+        line_strings = self.get_path_line_strings(path, reverse)
+        coordinates = list(line_strings[0].coords)
+        for line_string in line_strings[1:]:
+            coordinates.extend(line_string.coords[1:])
+        return LineString(coordinates)
+
+    def get_connection_line_strings(self, i_a: int, i_b: int) -> List[LineString]:
+        "Line segments followed from waypoint i_a to i_b, straight when there is no way"
+
+        edge = self.find_edge(i_a, i_b)
+        if edge < 0 or self.edge_paths[edge] == NO_PATH:
+            return [LineString([self.coordinates[i_a], self.coordinates[i_b]])]
+        return self.get_path_line_strings(
+            self.edge_paths[edge], self.edge_reversed[edge]
+        )
+
+    def get_connection(self, i_a: int, i_b: int) -> LineString:
+        "Line followed from waypoint i_a to i_b, straight when there is no way"
+
+        edge = self.find_edge(i_a, i_b)
+        if edge < 0 or self.edge_paths[edge] == NO_PATH:
+            return LineString([self.coordinates[i_a], self.coordinates[i_b]])
+        return self.get_path_line_string(
+            self.edge_paths[edge], self.edge_reversed[edge]
+        )
+
+    def to_dict(self) -> Dict[str, List]:
+        data = {
+            name: getattr(self, name).tolist()
+            for name in WaypointGraph.__annotations__.keys()
+        }
+        data["crs"] = self.crs
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List]) -> "WaypointGraph":
+        arrays = {name: data[name] for name in cls.__annotations__.keys()}
+        return cls(**arrays, crs=data.get("crs", WGS84))
+
+
+def find_connected_components(
+    waypoint_count: int, edge_sources: numpy.ndarray, edge_targets: numpy.ndarray
+) -> numpy.ndarray:
+    """Label waypoints connected to one another ignoring edge direction
+    
+    Arguments:
+        waypoint_count {int} -- Number of waypoints
+        edge_sources {numpy.ndarray} -- Waypoint at the start of each edge
+        edge_targets {numpy.ndarray} -- Waypoint at the end of each edge
+    
+    Returns:
+        numpy.ndarray -- Component label of each waypoint numbered from zero
+    """
+
+    parents = list(range(waypoint_count))
+
+    def find_root(waypoint):
+        while parents[waypoint] != waypoint:
+            parents[waypoint] = parents[parents[waypoint]]
+            waypoint = parents[waypoint]
+        return waypoint
+
+    for source, target in zip(
+        numpy.asarray(edge_sources).tolist(), numpy.asarray(edge_targets).tolist()
+    ):
+        source_root, target_root = find_root(source), find_root(target)
+        if source_root != target_root:
+            parents[max(source_root, target_root)] = min(source_root, target_root)
+
+    roots = numpy.array([find_root(waypoint) for waypoint in range(waypoint_count)])
+    return numpy.unique(roots, return_inverse=True)[1].reshape(-1)
+
+
+def flatten_line_strings(line_strings: Sequence[LineString]):
+    "Flat coordinate array of all line strings and offset to the start of each"
+
+    coordinate_arrays = [
+        numpy.array(line_string.coords, dtype=float)[:, :2]
+        for line_string in line_strings
+    ]
+    offsets = numpy.zeros(len(coordinate_arrays) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(array) for array in coordinate_arrays], out=offsets[1:])
+    if len(coordinate_arrays) < 1:
+        return offsets, numpy.zeros((0, 2))
+    return offsets, numpy.concatenate(coordinate_arrays)
+
+
+def flatten_segment_paths(segment_paths: Sequence[SegmentPath]):
+    "Flat segment and reversed flag arrays of all paths and offset to the start of each"
+
+    offsets = numpy.zeros(len(segment_paths) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(path) for path in segment_paths], out=offsets[1:])
+    steps = [step for path in segment_paths for step in path]
+    segments = numpy.array([segment for segment, _ in steps], dtype=numpy.int64)
+    reversed_flags = numpy.array([reverse for _, reverse in steps], dtype=bool)
+    return offsets, segments, reversed_flags
+
+
+def create_waypoint_graph(
+    coordinates: numpy.ndarray,
+    edge_sources: numpy.ndarray,
+    edge_targets: numpy.ndarray,
+    edge_costs: numpy.ndarray,
+    edge_paths: numpy.ndarray,
+    edge_reversed: numpy.ndarray,
+    line_segments: Sequence[LineString],
+    segment_paths: Sequence[SegmentPath] = None,
+    crs: int = WGS84,
+) -> WaypointGraph:
+    """Create a waypoint graph from a list of candidate edges
+
+    Only one edge is kept between each pair of waypoints, edges following paths
+    take priority over straight lines then the lowest cost edge is kept
+
+    Arguments:
+        coordinates {numpy.ndarray} -- Coordinates of every waypoint
+        edge_sources {numpy.ndarray} -- Waypoint at the start of each edge
+        edge_targets {numpy.ndarray} -- Waypoint at the end of each edge
+        edge_costs {numpy.ndarray} -- Cost of travel along each edge
+        edge_paths {numpy.ndarray} -- Path followed or -1 for straight line
+        edge_reversed {numpy.ndarray} -- Flag for paths followed in reverse
+        line_segments {Sequence[LineString]} -- Line segments referenced by paths
+
+    Keyword Arguments:
+        segment_paths {Sequence[SegmentPath]} -- Segment and reversed flag of each step along each path, one path per segment when not given (default: {None})
+        crs {int} -- EPSG code of the coordinates (default: {4326})
+
+    Returns:
+        WaypointGraph -- Graph with edges sorted by source waypoint
+    """
+
+    edge_sources = numpy.asarray(edge_sources, dtype=numpy.int64)
+    edge_targets = numpy.asarray(edge_targets, dtype=numpy.int64)
+    edge_costs = numpy.asarray(edge_costs, dtype=float)
+    edge_paths = numpy.asarray(edge_paths, dtype=numpy.int64)
+    edge_reversed = numpy.asarray(edge_reversed, dtype=bool)
+
+    # Sort edges by source and target then by priority for the same waypoint pair
+    is_straight_line = edge_paths == NO_PATH
+    order = numpy.lexsort(
+        (
+            edge_paths,
+            edge_reversed,
+            edge_costs,
+            is_straight_line,
+            edge_targets,
+            edge_sources,
+        )
+    )
+    sorted_sources, sorted_targets = edge_sources[order], edge_targets[order]
+    is_first = numpy.ones(len(order), dtype=bool)
+    is_first[1:] = (sorted_sources[1:] != sorted_sources[:-1]) | (
+        sorted_targets[1:] != sorted_targets[:-1]
+    )
+    kept = order[is_first]
+
+    waypoint_count = len(coordinates)
+    edge_counts = numpy.bincount(edge_sources[kept], minlength=waypoint_count)
+    edge_offsets = numpy.zeros(waypoint_count + 1, dtype=numpy.int64)
+    numpy.cumsum(edge_counts, out=edge_offsets[1:])
+
+    if segment_paths is None:
+        segment_paths = [[(segment, False)] for segment in range(len(line_segments))]
+    path_offsets, path_segments, path_reversed = flatten_segment_paths(segment_paths)
+    segment_offsets, segment_coordinates = flatten_line_strings(line_segments)
+
+    return WaypointGraph(
+        coordinates,
+        edge_offsets,
+        edge_targets[kept],
+        edge_costs[kept],
+        edge_paths[kept],
+        edge_reversed[kept],
+        path_offsets,
+        path_segments,
+        path_reversed,
+        segment_offsets,
+        segment_coordinates,
+        crs,
+    )
+
+
+def save_waypoint_graph(waypoint_graph: WaypointGraph, directory: str):
+    """Save each graph array as a .npy file in a directory
+
+    The header is written after the arrays so a partly written graph has no header
+    and fails to load
+
+    Arguments:
+        waypoint_graph {WaypointGraph} -- Graph to save
+        directory {str} -- Directory to create or overwrite
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    header_path = os.path.join(directory, GRAPH_HEADER_FILENAME)
+    if os.path.exists(header_path):
+        os.remove(header_path)
+
+    arrays = {}
+    for name in WaypointGraph.__annotations__.keys():
+        array = numpy.ascontiguousarray(getattr(waypoint_graph, name))
+        # Replace rather than overwrite arrays which may be memory mapped elsewhere
+        with atomic_write(os.path.join(directory, name + ".npy"), "wb") as open_file:
+            numpy.save(open_file, array)
+        arrays[name] = {"dtype": array.dtype.str, "shape": list(array.shape)}
+
+    header = {
+        "version": GRAPH_FORMAT_VERSION,
+        "crs": waypoint_graph.crs,
+        "arrays": arrays,
+    }
+    with atomic_write(header_path) as open_file:
+        json.dump(header, open_file)
+
+
+def load_waypoint_graph(directory: str, mmap_mode: str = "r") -> WaypointGraph:
+    """Load a graph saved by save_waypoint_graph
+
+    Arguments:
+        directory {str} -- Directory holding the graph arrays
+
+    Keyword Arguments:
+        mmap_mode {str} -- Memory map mode for the arrays or None to read them into memory (default: {"r"})
+
+    Raises:
+        FileNotFoundError -- When the graph or any of its arrays is missing
+        ValueError -- When the graph was saved in a different format
+
+    Returns:
+        WaypointGraph -- Graph backed by the saved arrays
+    """
+
+    with open(os.path.join(directory, GRAPH_HEADER_FILENAME)) as open_file:
+        header = json.load(open_file)
+    if header.get("version") != GRAPH_FORMAT_VERSION:
+        raise ValueError("unsupported graph format {}".format(header.get("version")))
+    if set(header["arrays"].keys()) != set(WaypointGraph.__annotations__.keys()):
+        raise ValueError("graph arrays do not match {}".format(directory))
+
+    arrays = {
+        name: numpy.load(os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode)
+        for name in WaypointGraph.__annotations__.keys()
+    }
+    for name, array in arrays.items():
+        if array.dtype.str != header["arrays"][name]["dtype"] or list(
+            array.shape
+        ) != list(header["arrays"][name]["shape"]):
+            raise ValueError("graph array {} does not match header".format(name))
+    return WaypointGraph(**arrays, crs=header["crs"])
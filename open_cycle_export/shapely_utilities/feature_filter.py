@@ -0,0 +1,175 @@
+"""Filter and clip GeoJSON features by polygons
+
+The bounds of each feature are found from its GeoJSON coordinates and compared with
+the bounds of the polygon before any shapely geometry is built, so features well away
+from the polygon cost a few comparisons. Features which pass are tested against a
+prepared polygon, which indexes its edges once for every test. Features are taken
+from any iterable and yielded one at a time, so a large download never has to be
+held as a second filtered list.
+
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy
+import shapely.prepared
+import shapely.geometry
+from shapely.geometry.base import BaseGeometry
+
+Feature = Dict
+Bounds = Tuple[float, float, float, float]
+
+POSITION_LIST_TYPES = {"MultiPoint", "LineString"}
+
+
+def iterate_positions(coordinates: Sequence) -> Iterator[Sequence[float]]:
+    "Every position in nested GeoJSON coordinates"
+
+    if len(coordinates) and isinstance(coordinates[0], (int, float)):
+        yield coordinates
+    else:
+        for child_coordinates in coordinates:
+            yield from iterate_positions(child_coordinates)
+
+
+def find_geometry_bounds(geometry: Optional[Dict]) -> Optional[Bounds]:
+    """Bounds of a GeoJSON geometry without building a shapely geometry
+
+    Arguments:
+        geometry {Optional[Dict]} -- GeoJSON geometry with coordinates
+
+    Returns:
+        Optional[Bounds] -- Minimum x, minimum y, maximum x and maximum y, or None when the geometry is null or empty
+    """
+
+    if geometry is None:
+        return None
+    if geometry["type"] == "GeometryCollection":
+        bounds = [find_geometry_bounds(child) for child in geometry["geometries"]]
+        bounds = [child_bounds for child_bounds in bounds if child_bounds is not None]
+        if len(bounds) < 1:
+            return None
+        min_xs, min_ys, max_xs, max_ys = zip(*bounds)
+        return (min(min_xs), min(min_ys), max(max_xs), max(max_ys))
+    if geometry["type"] in POSITION_LIST_TYPES:
+        positions = geometry.get("coordinates") or []
+    else:
+        positions = list(iterate_positions(geometry.get("coordinates") or []))
+    if len(positions) < 1:
+        return None
+    xs = [position[0] for position in positions]
+    ys = [position[1] for position in positions]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+
+def bounds_intersect(bounds_a: Optional[Bounds], bounds_b: Bounds) -> bool:
+    "Check two bounds overlap, null or empty geometries with no bounds never do"
+
+    return (
+        bounds_a is not None
+        and bounds_a[0] <= bounds_b[2]
+        and bounds_b[0] <= bounds_a[2]
+        and bounds_a[1] <= bounds_b[3]
+        and bounds_b[1] <= bounds_a[3]
+    )
+
+
+def intersecting_feature_finder(polygon: BaseGeometry):
+    "Test whether features intersect a polygon, prepared once for every test"
+
+    polygon_bounds = polygon.bounds
+    prepared_polygon = shapely.prepared.prep(polygon)
+
+    def intersects(feature: Feature) -> bool:
+        geometry = feature.get("geometry")
+        if not bounds_intersect(find_geometry_bounds(geometry), polygon_bounds):
+            return False
+        return prepared_polygon.intersects(shapely.geometry.shape(geometry))
+
+    return intersects
+
+
+def iterate_intersecting_features(
+    features: Iterable[Feature], polygon: BaseGeometry
+) -> Iterator[Feature]:
+    "Features which intersect a polygon, in the order they are given"
+
+    intersects = intersecting_feature_finder(polygon)
+    return (feature for feature in features if intersects(feature))
+
+
+def filter_features(
+    features: Iterable[Feature], polygon: BaseGeometry
+) -> List[Feature]:
+    return list(iterate_intersecting_features(features, polygon))
+
+
+def iterate_clipped_features(
+    features: Iterable[Feature], polygon: BaseGeometry
+) -> Iterator[Feature]:
+    """Features cut to the parts of their geometry inside a polygon
+
+    Features entirely inside the polygon are yielded unchanged, features outside it
+    are skipped, and the rest are copied with the intersection as their geometry
+
+    Arguments:
+        features {Iterable[Feature]} -- GeoJSON features
+        polygon {BaseGeometry} -- Polygon to clip to
+
+    Returns:
+        Iterator[Feature] -- Clipped features in the order they are given
+    """
+
+    polygon_bounds = polygon.bounds
+    prepared_polygon = shapely.prepared.prep(polygon)
+    for feature in features:
+        bounds = find_geometry_bounds(feature.get("geometry"))
+        if not bounds_intersect(bounds, polygon_bounds):
+            continue
+        geometry = shapely.geometry.shape(feature["geometry"])
+        if prepared_polygon.contains(geometry):
+            yield feature
+        elif prepared_polygon.intersects(geometry):
+            clipped_geometry = shapely.geometry.mapping(geometry.intersection(polygon))
+            yield {**feature, "geometry": clipped_geometry}
+
+
+def group_features_by_polygon(
+    features: Iterable[Feature], polygons: Sequence[BaseGeometry]
+) -> List[List[Feature]]:
+    """Features intersecting each of many polygons, such as city boundaries
+
+    The bounds of each feature are compared with the bounds of every polygon at
+    once, and each feature is only built as a shapely geometry when it is within
+    the bounds of at least one polygon
+
+    Arguments:
+        features {Iterable[Feature]} -- GeoJSON features
+        polygons {Sequence[BaseGeometry]} -- Polygons to group the features by
+
+    Returns:
+        List[List[Feature]] -- Features intersecting each polygon, in the order they are given
+    """
+
+    polygon_bounds = numpy.array(
+        [polygon.bounds for polygon in polygons], dtype=float
+    ).reshape(-1, 4)
+    prepared_polygons = [shapely.prepared.prep(polygon) for polygon in polygons]
+    groups = [[] for _ in polygons]
+    for feature in features:
+        bounds = find_geometry_bounds(feature.get("geometry"))
+        if bounds is None:
+            continue
+        candidates = numpy.flatnonzero(
+            (polygon_bounds[:, 0] <= bounds[2])
+            & (bounds[0] <= polygon_bounds[:, 2])
+            & (polygon_bounds[:, 1] <= bounds[3])
+            & (bounds[1] <= polygon_bounds[:, 3])
+        )
+        if len(candidates) < 1:
+            continue
+        geometry = shapely.geometry.shape(feature["geometry"])
+        for index in candidates.tolist():
+            if prepared_polygons[index].intersects(geometry):
+                groups[index].append(feature)
+    return groups
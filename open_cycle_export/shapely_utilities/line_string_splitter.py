@@ -1,5 +1,6 @@
 from typing import List
 
+import numpy
 import shapely.ops
 
 from shapely.geometry.base import BaseGeometry
@@ -10,7 +11,7 @@ def filter_contained_points(line: LineString, points: List[Point]) -> List[Point
     return [point for point in points if line.contains(point)]
 
 
-def split_line_at_points(line: LineString, points: List[Point]):
+def split_line_at_points_recursive(line: LineString, points: List[Point]):
     "Reccursively split the line at all the break points"
 
     contained_points = filter_contained_points(line, points)
@@ -22,11 +23,137 @@ def split_line_at_points(line: LineString, points: List[Point]):
     line_segments = shapely.ops.split(line, break_point)
     for line_segment in line_segments:
         remaining_points = contained_points[1:]
-        segment_split_lines = split_line_at_points(line_segment, remaining_points)
+        segment_split_lines = split_line_at_points_recursive(
+            line_segment, remaining_points
+        )
         split_lines.extend(segment_split_lines)
     return split_lines
 
 
+def project_points_onto_line(
+    coordinates: numpy.ndarray,
+    point_coordinates: numpy.ndarray,
+    chunk_size: int = 2 ** 20,
+):
+    """Find the closest line segment to each point and fraction along that segment
+
+    Arguments:
+        coordinates {numpy.ndarray} -- Line vertex coordinates
+        point_coordinates {numpy.ndarray} -- Coordinates of points to project
+
+    Keyword Arguments:
+        chunk_size {int} -- Maximum number of point and segment pairs compared at once
+
+    Returns:
+        Tuple[numpy.ndarray, numpy.ndarray] -- Segment index and fraction for each point
+    """
+
+    segment_starts = coordinates[:-1]
+    segment_vectors = coordinates[1:] - segment_starts
+    squared_lengths = (segment_vectors ** 2).sum(axis=1)
+    squared_lengths[squared_lengths == 0] = numpy.inf
+
+    segment_indexes, segment_fractions = [], []
+    points_per_chunk = max(chunk_size // len(segment_starts), 1)
+    for start in range(0, len(point_coordinates), points_per_chunk):
+        points = point_coordinates[start : start + points_per_chunk, numpy.newaxis, :]
+        start_offsets = points - segment_starts
+        fractions = (start_offsets * segment_vectors).sum(axis=2) / squared_lengths
+        fractions = numpy.clip(fractions, 0, 1)
+        closest_offsets = (
+            start_offsets - fractions[..., numpy.newaxis] * segment_vectors
+        )
+        closest_segments = numpy.argmin((closest_offsets ** 2).sum(axis=2), axis=1)
+        segment_indexes.append(closest_segments)
+        segment_fractions.append(fractions[numpy.arange(len(points)), closest_segments])
+
+    return numpy.concatenate(segment_indexes), numpy.concatenate(segment_fractions)
+
+
+def find_break_vertex(
+    coordinates: numpy.ndarray, segment_index: int, break_coordinate: numpy.ndarray
+) -> int:
+    "Index of the vertex at either end of a segment which is at the break or -1"
+
+    for index in [segment_index, segment_index + 1]:
+        if numpy.array_equal(coordinates[index], break_coordinate):
+            return index
+    return -1
+
+
+def is_break_on_line(
+    coordinates: numpy.ndarray, segment_index: int, break_coordinate: numpy.ndarray
+) -> bool:
+    "Check the break is within the line and not on the line boundary"
+
+    break_vertex = find_break_vertex(coordinates, segment_index, break_coordinate)
+    if break_vertex < 0:
+        segment = LineString(coordinates[segment_index : segment_index + 2])
+        return segment.intersects(Point(break_coordinate))
+    is_closed = numpy.array_equal(coordinates[0], coordinates[-1])
+    return is_closed or 0 < break_vertex < len(coordinates) - 1
+
+
+def split_line_at_points(line: LineString, points: List[Point]) -> List[LineString]:
+    """Split the line at all the break points in a single pass along the line
+
+    Break points are projected onto the line once and sorted by position along it,
+    points between vertices are added to both of the lines either side. A point where
+    the line crosses itself only splits the line at its first position along the line,
+    as split_line_at_points_recursive does
+
+    Arguments:
+        line {LineString} -- Line to split
+        points {List[Point]} -- Break points, points not on the line are ignored
+
+    Returns:
+        List[LineString] -- Lines in order from the start of the line
+    """
+
+    if len(points) < 1:
+        return [line]
+
+    coordinates = numpy.array(line.coords, dtype=float)[:, :2]
+    break_coordinates = numpy.array([point.coords[0][:2] for point in points])
+    segment_indexes, segment_fractions = project_points_onto_line(
+        coordinates, break_coordinates
+    )
+
+    split_lines = []
+    start_vertex, start_coordinates = 0, []
+    for break_index in numpy.lexsort((segment_fractions, segment_indexes)):
+        segment_index = segment_indexes[break_index]
+        break_coordinate = break_coordinates[break_index]
+        if not is_break_on_line(coordinates, segment_index, break_coordinate):
+            continue
+        break_vertex = find_break_vertex(coordinates, segment_index, break_coordinate)
+        if break_vertex >= 0:
+            # Break point is exactly on a vertex
+            line_coordinates = [
+                *start_coordinates,
+                *coordinates[start_vertex : break_vertex + 1],
+            ]
+            next_vertex, next_coordinates = break_vertex, []
+        else:
+            # Break point is between two vertices
+            line_coordinates = [
+                *start_coordinates,
+                *coordinates[start_vertex : segment_index + 1],
+                break_coordinate,
+            ]
+            next_vertex, next_coordinates = segment_index + 1, [break_coordinate]
+        # Skip zero length lines when several break points are at the same place
+        if numpy.ptp(line_coordinates, axis=0).any():
+            split_lines.append(LineString(line_coordinates))
+            start_vertex, start_coordinates = next_vertex, next_coordinates
+
+    if len(split_lines) < 1:
+        return [line]
+
+    split_lines.append(LineString([*start_coordinates, *coordinates[start_vertex:]]))
+    return split_lines
+
+
 def extract_line_points(line_string: LineString) -> List[Point]:
     return [Point(*line_string.coords[0]), Point(*line_string.coords[-1])]
 
@@ -0,0 +1,129 @@
+import unittest
+
+import shapely.geometry
+from shapely.geometry import Point, Polygon
+
+from open_cycle_export.shapely_utilities.feature_filter import (
+    find_geometry_bounds,
+    filter_features,
+    iterate_intersecting_features,
+    iterate_clipped_features,
+    group_features_by_polygon,
+)
+
+
+def line_feature(coordinates, name=None):
+    return {
+        "type": "Feature",
+        "geometry": {"type": "LineString", "coordinates": coordinates},
+        "properties": {"name": name},
+    }
+
+
+class TestGeometryBounds(unittest.TestCase):
+    def test_line_string(self):
+        geometry = {"type": "LineString", "coordinates": [[0, 1, 5], [2, -1, 6]]}
+        self.assertTupleEqual(find_geometry_bounds(geometry), (0, -1, 2, 1))
+
+    def test_nested_geometries(self):
+        polygon = Polygon([(0, 0), (4, 0), (4, 3)], [[(1, 0.5), (3, 0.5), (3, 1)]])
+        for geometry in [
+            polygon,
+            shapely.geometry.MultiPolygon([polygon, Polygon([(5, 5), (6, 5), (6, 7)])]),
+            shapely.geometry.GeometryCollection([Point(-1, 2), polygon]),
+        ]:
+            self.assertTupleEqual(
+                find_geometry_bounds(shapely.geometry.mapping(geometry)),
+                geometry.bounds,
+            )
+
+    def test_empty_geometries(self):
+        for geometry in [
+            None,
+            {"type": "LineString", "coordinates": []},
+            {"type": "MultiLineString", "coordinates": [[]]},
+            {"type": "GeometryCollection", "geometries": []},
+        ]:
+            self.assertIsNone(find_geometry_bounds(geometry))
+
+
+class TestFeatureFilter(unittest.TestCase):
+    """Test features are filtered and clipped by polygons"""
+
+    def setUp(self):
+        self.polygon = Point(0, 0).buffer(10)
+        self.features = [
+            line_feature([[0, 0], [1, 1]], "inside"),
+            line_feature([[20, 20], [30, 30]], "far"),
+            line_feature([[9, 9], [9.5, 9.5]], "within bounds"),
+            line_feature([[5, 0], [15, 0]], "crossing"),
+        ]
+
+    def test_same_as_shapely_intersects(self):
+        expected = [
+            feature
+            for feature in self.features
+            if shapely.geometry.shape(feature["geometry"]).intersects(self.polygon)
+        ]
+        self.assertListEqual(filter_features(self.features, self.polygon), expected)
+        self.assertListEqual(
+            [feature["properties"]["name"] for feature in expected],
+            ["inside", "crossing"],
+        )
+
+    def test_streams_features(self):
+        features = iter(self.features)
+        filtered = iterate_intersecting_features(features, self.polygon)
+        self.assertEqual(next(filtered)["properties"]["name"], "inside")
+        self.assertEqual(next(features)["properties"]["name"], "far")
+
+    def test_clip_features(self):
+        clipped = list(iterate_clipped_features(self.features, self.polygon))
+        self.assertIs(clipped[0], self.features[0])
+        self.assertEqual(clipped[1]["properties"]["name"], "crossing")
+        clipped_line = shapely.geometry.shape(clipped[1]["geometry"])
+        self.assertAlmostEqual(clipped_line.length, 5, places=1)
+        self.assertEqual(
+            shapely.geometry.shape(self.features[3]["geometry"]).length, 10
+        )
+
+    def assertEmptyGeometrySkipped(self, geometry):
+        feature = {"type": "Feature", "geometry": geometry, "properties": {}}
+        features = [feature, *self.features]
+        self.assertListEqual(
+            filter_features(features, self.polygon),
+            filter_features(self.features, self.polygon),
+        )
+        self.assertListEqual(
+            list(iterate_clipped_features(features, self.polygon)),
+            list(iterate_clipped_features(self.features, self.polygon)),
+        )
+        self.assertListEqual(
+            group_features_by_polygon(features, [self.polygon]),
+            group_features_by_polygon(self.features, [self.polygon]),
+        )
+
+    def test_null_geometry_skipped(self):
+        self.assertEmptyGeometrySkipped(None)
+
+    def test_empty_coordinates_skipped(self):
+        "Should skip ways Overpass returns with no geometry"
+
+        self.assertEmptyGeometrySkipped({"type": "LineString", "coordinates": []})
+
+    def test_empty_geometry_collection_skipped(self):
+        self.assertEmptyGeometrySkipped(
+            {"type": "GeometryCollection", "geometries": []}
+        )
+
+    def test_group_features_by_polygon(self):
+        polygons = [self.polygon, Point(25, 25).buffer(10), Point(100, 0).buffer(1)]
+        groups = group_features_by_polygon(self.features, polygons)
+        names = [
+            [feature["properties"]["name"] for feature in group] for group in groups
+        ]
+        self.assertListEqual(names, [["inside", "crossing"], ["far"], []])
+
+
+if __name__ == "__main__":
+    unittest.main()
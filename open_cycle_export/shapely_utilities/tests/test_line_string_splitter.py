@@ -3,11 +3,14 @@ import unittest
 import sys
 
 import shapely.geometry
-from shapely.geometry import LineString
+from shapely.geometry import Point, LineString
 
 from open_cycle_export.test_data.test_data_loader import load_test_data
 from open_cycle_export.shapely_utilities.line_string_splitter import (
+    split_line_at_points,
+    split_line_at_points_recursive,
     split_line_by_intersecting_lines,
+    find_intersection_points,
 )
 
 
@@ -61,3 +64,53 @@ class TestLineStringSplitter(unittest.TestCase):
     @classmethod
     def tearDownClass(self):
         sys.setrecursionlimit(self.recursionlimit)
+
+
+class TestSplitLineAtPoints(unittest.TestCase):
+    """Test single pass splitting matches recursive splitting"""
+
+    def assertSplitLinesEqual(self, line, points):
+        split_lines = split_line_at_points(line, points)
+        expected_lines = split_line_at_points_recursive(line, points)
+        self.assertListEqual(
+            [list(split_line.coords) for split_line in split_lines],
+            [list(expected_line.coords) for expected_line in expected_lines],
+        )
+
+    def test_split_between_and_on_vertices(self):
+        line = LineString([(0, 0), (2, 0), (2, 2), (0, 2)])
+        points = [Point(2, 1), Point(1, 0), Point(2, 2), Point(1, 2), Point(5, 5)]
+        self.assertSplitLinesEqual(line, points)
+        self.assertEqual(len(split_line_at_points(line, points)), 5)
+
+    def test_duplicate_and_end_points_ignored(self):
+        line = LineString([(0, 0), (1, 0), (2, 0)])
+        points = [Point(1, 0), Point(1, 0), Point(0, 0), Point(2, 0)]
+        self.assertSplitLinesEqual(line, points)
+
+    def test_self_crossing_point_split_once(self):
+        "Should split at the first pass of a self crossing line, as recursion does"
+
+        line = LineString([(0, 0), (2, 2), (2, 0), (0, 2)])
+        points = [Point(1, 1), Point(1, 1)]
+        self.assertSplitLinesEqual(line, points)
+        self.assertListEqual(
+            [
+                list(split_line.coords)
+                for split_line in split_line_at_points(line, points)
+            ],
+            [[(0, 0), (1, 1)], [(1, 1), (2, 2), (2, 0), (0, 2)]],
+        )
+
+    def test_real_examples_match_recursive(self):
+        for filename in [
+            "test_line_string_splitter_overlap_data.json",
+            "test_line_string_splitter_recursion_data.json",
+        ]:
+            real_example_data = load_test_data(filename)
+            line = shapely.geometry.shape(real_example_data["line"])
+            intersecting_lines = real_example_data["intersecting_lines"]
+            intersecting_lines = list(map(shapely.geometry.shape, intersecting_lines))
+            intersection_geometries = map(line.intersection, intersecting_lines)
+            points = find_intersection_points(intersection_geometries)
+            self.assertSplitLinesEqual(line, points)
@@ -0,0 +1,234 @@
+"""Uniform grid spatial index for point coordinates
+
+Points are hashed to square cells and sorted by cell so the points in any cell are a
+contiguous slice of the sorted order, neighbouring cells are found by binary search.
+Queries are vectorised over arrays of query points.
+
+"""
+
+from typing import Tuple
+
+import numpy
+
+IndexPairs = Tuple[numpy.ndarray, numpy.ndarray]
+
+CELL_KEY_OFFSET = 2 ** 31
+BRUTE_FORCE_PAIR_LIMIT = 2 ** 22
+
+
+def expand_ranges(starts: numpy.ndarray, ends: numpy.ndarray) -> IndexPairs:
+    """Expand ranges into the index of each range and every position within it
+    
+    Arguments:
+        starts {numpy.ndarray} -- First position of each range
+        ends {numpy.ndarray} -- Position after the last of each range
+    
+    Returns:
+        IndexPairs -- Range index and position for every position in the ranges
+    """
+
+    lengths = ends - starts
+    range_indexes = numpy.repeat(numpy.arange(len(starts)), lengths)
+    range_firsts = numpy.repeat(starts - (numpy.cumsum(lengths) - lengths), lengths)
+    return range_indexes, range_firsts + numpy.arange(lengths.sum())
+
+
+def rank_within_groups(sorted_groups: numpy.ndarray) -> numpy.ndarray:
+    "Position of each item within its group for an array sorted by group"
+
+    group_starts = numpy.searchsorted(sorted_groups, sorted_groups, side="left")
+    return numpy.arange(len(sorted_groups)) - group_starts
+
+
+def estimate_cell_size(coordinates: numpy.ndarray, points_per_cell: float) -> float:
+    """Estimate a cell size which puts a number of points in each occupied cell
+
+    Points along routes lie on lines so the number of occupied cells is assumed to
+    scale with the inverse of the cell size
+    
+    Arguments:
+        coordinates {numpy.ndarray} -- Coordinates to be indexed
+        points_per_cell {float} -- Desired average number of points in occupied cells
+    
+    Returns:
+        float -- Cell size
+    """
+
+    if len(coordinates) < 2:
+        return 1.0
+    extent = numpy.ptp(coordinates, axis=0)
+    if extent.max() <= 0:
+        return 1.0
+    extent = numpy.maximum(extent, extent.max() / len(coordinates))
+    initial_cell_size = numpy.sqrt(extent[0] * extent[1] / len(coordinates))
+    cells = numpy.floor(coordinates / initial_cell_size).astype(numpy.int64)
+    occupied_cell_count = len(numpy.unique(cells, axis=0))
+    initial_points_per_cell = len(coordinates) / occupied_cell_count
+    return float(initial_cell_size * points_per_cell / initial_points_per_cell)
+
+
+class GridIndex:
+    """Points hashed to square grid cells"""
+
+    coordinates: numpy.ndarray
+    cell_size: float
+
+    def __init__(self, coordinates: numpy.ndarray, cell_size: float):
+        self.coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+        self.cell_size = float(cell_size)
+        self.origin = (
+            self.coordinates.min(axis=0) if len(self.coordinates) else numpy.zeros(2)
+        )
+        cell_keys = self._get_cell_keys(self._get_cells(self.coordinates))
+        self.order = numpy.argsort(cell_keys, kind="stable")
+        self.sorted_cell_keys = cell_keys[self.order]
+
+    @classmethod
+    def from_arrays(
+        cls,
+        coordinates: numpy.ndarray,
+        cell_size: float,
+        origin: numpy.ndarray,
+        order: numpy.ndarray,
+        sorted_cell_keys: numpy.ndarray,
+    ) -> "GridIndex":
+        "Grid index from the arrays of an index built before, without sorting again"
+
+        grid_index = cls.__new__(cls)
+        grid_index.coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+        grid_index.cell_size = float(cell_size)
+        grid_index.origin = numpy.asarray(origin, dtype=float)
+        grid_index.order = numpy.asarray(order, dtype=numpy.int64)
+        grid_index.sorted_cell_keys = numpy.asarray(sorted_cell_keys, dtype=numpy.int64)
+        return grid_index
+
+    def __len__(self):
+        return len(self.coordinates)
+
+    def query_radius(self, points: numpy.ndarray, radius: float) -> IndexPairs:
+        """Find indexed points within a radius of each query point
+        
+        Arguments:
+            points {numpy.ndarray} -- Query point coordinates
+            radius {float} -- Search radius
+        
+        Returns:
+            IndexPairs -- Query point index and indexed point index of each match
+        """
+
+        points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+        ring = max(int(numpy.ceil(radius / self.cell_size)), 0)
+        queries, indexes = self._query_cells(self._get_cells(points), ring)
+        squared_distances = self._get_squared_distances(points, queries, indexes)
+        is_within = squared_distances <= radius ** 2
+        return queries[is_within], indexes[is_within]
+
+    def query_nearest(
+        self, points: numpy.ndarray, count: int, exclude: numpy.ndarray = None
+    ) -> IndexPairs:
+        """Find the nearest indexed points to each query point
+
+        Neighbouring cells are searched first, query points without enough close
+        neighbours are compared with every indexed point
+        
+        Arguments:
+            points {numpy.ndarray} -- Query point coordinates
+            count {int} -- Number of nearest points to find for each query point
+        
+        Keyword Arguments:
+            exclude {numpy.ndarray} -- Indexed point to skip for each query point (default: {None})
+        
+        Returns:
+            IndexPairs -- Query point index and indexed point index sorted by query then distance
+        """
+
+        points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+        available_count = len(self) - (0 if exclude is None else 1)
+        count = min(count, available_count)
+        if count < 1 or len(points) < 1:
+            return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+
+        found_queries, found_indexes = [], []
+        pending = numpy.arange(len(points))
+        for ring in [1, 2]:
+            if len(pending) < 1:
+                break
+            queries, indexes = self._query_cells(self._get_cells(points[pending]), ring)
+            queries = pending[queries]
+            is_resolved = numpy.zeros(len(points), dtype=bool)
+            queries, indexes, squared_distances = self._select_nearest(
+                points, queries, indexes, count, exclude
+            )
+            # Results are exact when the furthest match is within the searched rings
+            furthest = rank_within_groups(queries) == count - 1
+            is_within_rings = (
+                squared_distances[furthest] <= (ring * self.cell_size) ** 2
+            )
+            is_resolved[queries[furthest][is_within_rings]] = True
+            is_kept = is_resolved[queries]
+            found_queries.append(queries[is_kept])
+            found_indexes.append(indexes[is_kept])
+            pending = pending[~is_resolved[pending]]
+
+        # Compare remaining query points with every point a chunk at a time
+        chunk_size = max(BRUTE_FORCE_PAIR_LIMIT // len(self), 1)
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start : start + chunk_size]
+            queries = numpy.repeat(chunk, len(self))
+            indexes = numpy.tile(numpy.arange(len(self)), len(chunk))
+            queries, indexes, _ = self._select_nearest(
+                points, queries, indexes, count, exclude
+            )
+            found_queries.append(queries)
+            found_indexes.append(indexes)
+
+        queries = numpy.concatenate(found_queries)
+        indexes = numpy.concatenate(found_indexes)
+        order = numpy.argsort(queries, kind="stable")
+        return queries[order], indexes[order]
+
+    def query_pairs(self, radius: float) -> IndexPairs:
+        "Find all pairs of different indexed points within a radius of one another"
+
+        queries, indexes = self.query_radius(self.coordinates, radius)
+        is_pair = queries != indexes
+        return queries[is_pair], indexes[is_pair]
+
+    def _select_nearest(self, points, queries, indexes, count, exclude):
+        if exclude is not None:
+            is_allowed = indexes != exclude[queries]
+            queries, indexes = queries[is_allowed], indexes[is_allowed]
+        squared_distances = self._get_squared_distances(points, queries, indexes)
+        order = numpy.lexsort((indexes, squared_distances, queries))
+        queries = queries[order]
+        is_kept = rank_within_groups(queries) < count
+        return (
+            queries[is_kept],
+            indexes[order][is_kept],
+            squared_distances[order][is_kept],
+        )
+
+    def _get_squared_distances(self, points, queries, indexes):
+        offsets = points[queries] - self.coordinates[indexes]
+        return (offsets ** 2).sum(axis=1)
+
+    def _get_cells(self, coordinates: numpy.ndarray) -> numpy.ndarray:
+        cells = numpy.floor((coordinates - self.origin) / self.cell_size)
+        return cells.astype(numpy.int64)
+
+    def _get_cell_keys(self, cells: numpy.ndarray) -> numpy.ndarray:
+        return cells[:, 0] * 2 * CELL_KEY_OFFSET + (cells[:, 1] + CELL_KEY_OFFSET)
+
+    def _query_cells(self, cells: numpy.ndarray, ring: int) -> IndexPairs:
+        "Query index and point index of points in all cells within a ring of cells"
+
+        all_queries, all_indexes = [], []
+        for x_offset in range(-ring, ring + 1):
+            for y_offset in range(-ring, ring + 1):
+                cell_keys = self._get_cell_keys(cells + (x_offset, y_offset))
+                starts = numpy.searchsorted(self.sorted_cell_keys, cell_keys, "left")
+                ends = numpy.searchsorted(self.sorted_cell_keys, cell_keys, "right")
+                queries, positions = expand_ranges(starts, ends)
+                all_queries.append(queries)
+                all_indexes.append(self.order[positions])
+        return numpy.concatenate(all_queries), numpy.concatenate(all_indexes)
@@ -0,0 +1,204 @@
+"""Nearest place lookups for naming routes
+
+Places are projected to a metric CRS and held in a grid index, so the nearest place
+to each of a batch of points is found with a few array operations rather than a
+distance call per place. An index is built once for each area from its downloaded
+place features and saved as a directory of .npy files with a JSON header holding the
+place names, written last in the same way as waypoint graphs, so worker processes
+load it with memory mapping instead of receiving every place feature.
+
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+import os
+import json
+
+import numpy
+
+from open_cycle_export.cache_utilities.atomic_cache import atomic_write
+from open_cycle_export.route_processor.spatial_convertor import (
+    WGS84,
+    choose_metric_crs,
+    transform_coordinates,
+)
+from open_cycle_export.spatial_index.grid_index import GridIndex, estimate_cell_size
+
+PLACE_INDEX_FORMAT_VERSION = 1
+PLACE_INDEX_HEADER_FILENAME = "header.json"
+PLACE_INDEX_ARRAYS = (
+    "coordinates",
+    "metric_coordinates",
+    "origin",
+    "order",
+    "sorted_cell_keys",
+)
+PLACES_PER_CELL = 4
+
+
+class PlaceIndex:
+    """Place names and lon/lat coordinates with a grid index of metric coordinates"""
+
+    def __init__(
+        self,
+        names: Sequence[Optional[str]],
+        coordinates: numpy.ndarray,
+        crs: int,
+        grid_index: GridIndex,
+    ):
+        self.names = list(names)
+        self.coordinates = numpy.asarray(coordinates, dtype=float).reshape(-1, 2)
+        self.crs = int(crs)
+        self.grid_index = grid_index
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def get_arrays(self) -> Dict[str, numpy.ndarray]:
+        "Arrays which are saved to rebuild the index, see PLACE_INDEX_ARRAYS"
+
+        return {
+            "coordinates": self.coordinates,
+            "metric_coordinates": self.grid_index.coordinates,
+            "origin": self.grid_index.origin,
+            "order": self.grid_index.order,
+            "sorted_cell_keys": self.grid_index.sorted_cell_keys,
+        }
+
+    def find_nearest(
+        self, coordinates: numpy.ndarray, crs: int = WGS84
+    ) -> numpy.ndarray:
+        """Index of the nearest place to each coordinate
+
+        Of equally near places the first is found
+
+        Arguments:
+            coordinates {numpy.ndarray} -- Coordinates with shape (coordinate_count, 2)
+
+        Keyword Arguments:
+            crs {int} -- EPSG code of the coordinates (default: {4326})
+
+        Raises:
+            ValueError -- When there are no places
+
+        Returns:
+            numpy.ndarray -- Place index for each coordinate
+        """
+
+        if len(self) < 1:
+            raise ValueError("no places to search")
+        metric_coordinates = transform_coordinates(coordinates, crs, self.crs)
+        queries, indexes = self.grid_index.query_nearest(metric_coordinates, 1)
+        nearest = numpy.empty(len(metric_coordinates), dtype=numpy.int64)
+        nearest[queries] = indexes
+        return nearest
+
+    def find_nearest_names(
+        self, coordinates: numpy.ndarray, crs: int = WGS84
+    ) -> List[Optional[str]]:
+        "Name of the nearest place to each coordinate"
+
+        return [self.names[index] for index in self.find_nearest(coordinates, crs)]
+
+
+def create_place_index(place_features: Sequence[Dict]) -> PlaceIndex:
+    """Index places from GeoJSON point features
+
+    Arguments:
+        place_features {Sequence[Dict]} -- Point features with a name property
+
+    Returns:
+        PlaceIndex -- Index of the places in the order of the features
+    """
+
+    names = [feature.get("properties", {}).get("name") for feature in place_features]
+    coordinates = numpy.array(
+        [
+            feature.get("geometry", {}).get("coordinates")[:2]
+            for feature in place_features
+        ],
+        dtype=float,
+    ).reshape(-1, 2)
+    crs = choose_metric_crs(coordinates)
+    metric_coordinates = transform_coordinates(coordinates, WGS84, crs)
+    cell_size = estimate_cell_size(metric_coordinates, PLACES_PER_CELL)
+    return PlaceIndex(names, coordinates, crs, GridIndex(metric_coordinates, cell_size))
+
+
+def save_place_index(place_index: PlaceIndex, directory: str):
+    """Save each place index array as a .npy file in a directory
+
+    Arguments:
+        place_index {PlaceIndex} -- Index to save
+        directory {str} -- Directory to create or overwrite
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    header_path = os.path.join(directory, PLACE_INDEX_HEADER_FILENAME)
+    if os.path.exists(header_path):
+        os.remove(header_path)
+
+    arrays = {}
+    for name, array in place_index.get_arrays().items():
+        array = numpy.ascontiguousarray(array)
+        with atomic_write(os.path.join(directory, name + ".npy"), "wb") as open_file:
+            numpy.save(open_file, array)
+        arrays[name] = {"dtype": array.dtype.str, "shape": list(array.shape)}
+
+    header = {
+        "version": PLACE_INDEX_FORMAT_VERSION,
+        "crs": place_index.crs,
+        "cell_size": place_index.grid_index.cell_size,
+        "names": place_index.names,
+        "arrays": arrays,
+    }
+    with atomic_write(header_path) as open_file:
+        json.dump(header, open_file)
+
+
+def load_place_index(directory: str, mmap_mode: str = "r") -> PlaceIndex:
+    """Load a place index saved by save_place_index
+
+    Arguments:
+        directory {str} -- Directory holding the index arrays
+
+    Keyword Arguments:
+        mmap_mode {str} -- Memory map mode for the arrays or None to read them into memory (default: {"r"})
+
+    Raises:
+        FileNotFoundError -- When the index or any of its arrays is missing
+        ValueError -- When the index was saved in a different format
+
+    Returns:
+        PlaceIndex -- Index backed by the saved arrays
+    """
+
+    with open(os.path.join(directory, PLACE_INDEX_HEADER_FILENAME)) as open_file:
+        header = json.load(open_file)
+    if header.get("version") != PLACE_INDEX_FORMAT_VERSION:
+        raise ValueError(
+            "unsupported place index format {}".format(header.get("version"))
+        )
+    if set(header["arrays"].keys()) != set(PLACE_INDEX_ARRAYS):
+        raise ValueError("place index arrays do not match {}".format(directory))
+
+    arrays = {
+        name: numpy.load(os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode)
+        for name in PLACE_INDEX_ARRAYS
+    }
+    for name, array in arrays.items():
+        if array.dtype.str != header["arrays"][name]["dtype"] or list(
+            array.shape
+        ) != list(header["arrays"][name]["shape"]):
+            raise ValueError("place index array {} does not match header".format(name))
+    if len(header["names"]) != len(arrays["coordinates"]):
+        raise ValueError("place names do not match {}".format(directory))
+
+    grid_index = GridIndex.from_arrays(
+        arrays["metric_coordinates"],
+        header["cell_size"],
+        arrays["origin"],
+        arrays["order"],
+        arrays["sorted_cell_keys"],
+    )
+    return PlaceIndex(header["names"], arrays["coordinates"], header["crs"], grid_index)
@@ -0,0 +1,68 @@
+import unittest
+
+import numpy
+
+from open_cycle_export.spatial_index.grid_index import (
+    GridIndex,
+    expand_ranges,
+    estimate_cell_size,
+)
+
+
+def random_coordinates(count: int, seed: int = 0) -> numpy.ndarray:
+    return numpy.random.RandomState(seed).uniform(0, 10, (count, 2))
+
+
+def brute_force_nearest(coordinates, points, count, exclude_self=False):
+    offsets = points[:, numpy.newaxis, :] - coordinates[numpy.newaxis, :, :]
+    squared_distances = (offsets ** 2).sum(axis=2)
+    if exclude_self:
+        numpy.fill_diagonal(squared_distances, numpy.inf)
+    return numpy.argsort(squared_distances, axis=1, kind="stable")[:, :count]
+
+
+class TestExpandRanges(unittest.TestCase):
+    def test_expand_ranges(self):
+        range_indexes, positions = expand_ranges(
+            numpy.array([2, 5, 7]), numpy.array([4, 5, 8])
+        )
+        self.assertListEqual(range_indexes.tolist(), [0, 0, 2])
+        self.assertListEqual(positions.tolist(), [2, 3, 7])
+
+
+class TestGridIndex(unittest.TestCase):
+    """Test grid index queries match brute force results"""
+
+    def setUp(self):
+        self.coordinates = random_coordinates(300)
+        self.grid_index = GridIndex(self.coordinates, 0.5)
+
+    def test_query_radius(self):
+        points = random_coordinates(20, seed=1)
+        queries, indexes = self.grid_index.query_radius(points, 1.2)
+        found = set(zip(queries.tolist(), indexes.tolist()))
+        offsets = points[:, numpy.newaxis, :] - self.coordinates[numpy.newaxis, :, :]
+        expected = numpy.argwhere(numpy.hypot(offsets[..., 0], offsets[..., 1]) <= 1.2)
+        self.assertSetEqual(found, set(map(tuple, expected.tolist())))
+
+    def test_query_nearest(self):
+        points = numpy.concatenate([random_coordinates(20, seed=2), [[50, 50]]])
+        queries, indexes = self.grid_index.query_nearest(points, 4)
+        self.assertListEqual(queries.tolist(), numpy.repeat(range(21), 4).tolist())
+        expected = brute_force_nearest(self.coordinates, points, 4)
+        self.assertListEqual(indexes.tolist(), expected.ravel().tolist())
+
+    def test_query_nearest_excluding_self(self):
+        exclude = numpy.arange(len(self.coordinates))
+        _, indexes = self.grid_index.query_nearest(self.coordinates, 3, exclude)
+        expected = brute_force_nearest(self.coordinates, self.coordinates, 3, True)
+        self.assertListEqual(indexes.tolist(), expected.ravel().tolist())
+
+    def test_query_pairs_excludes_self(self):
+        grid_index = GridIndex(numpy.array([(0, 0), (0.1, 0), (5, 5)]), 1)
+        queries, indexes = grid_index.query_pairs(0.5)
+        self.assertListEqual(sorted(zip(queries, indexes)), [(0, 1), (1, 0)])
+
+    def test_estimate_cell_size_positive(self):
+        self.assertGreater(estimate_cell_size(self.coordinates, 4), 0)
+        self.assertEqual(estimate_cell_size(numpy.zeros((5, 2)), 4), 1.0)
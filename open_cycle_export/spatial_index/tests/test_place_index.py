@@ -0,0 +1,121 @@
+import os
+import json
+import tempfile
+import unittest
+
+import numpy
+
+from open_cycle_export.route_processor.spatial_convertor import (
+    BRITISH_NATIONAL_GRID,
+    transform_coordinates,
+)
+from open_cycle_export.spatial_index.place_index import (
+    PLACE_INDEX_HEADER_FILENAME,
+    create_place_index,
+    save_place_index,
+    load_place_index,
+)
+
+
+def create_place_features(count: int, seed: int = 0):
+    "Places scattered across England and Wales"
+
+    random_state = numpy.random.RandomState(seed)
+    coordinates = random_state.uniform((-4.5, 50.5), (1.5, 54.5), (count, 2))
+    return [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": coordinate},
+            "properties": {"name": "Place {}".format(index)},
+        }
+        for index, coordinate in enumerate(coordinates.tolist())
+    ]
+
+
+def brute_force_nearest(place_coordinates, coordinates):
+    offsets = coordinates[:, numpy.newaxis, :] - place_coordinates[numpy.newaxis, :, :]
+    return numpy.argmin((offsets ** 2).sum(axis=2), axis=1)
+
+
+class TestPlaceIndex(unittest.TestCase):
+    """Test the nearest places match brute force results in metres"""
+
+    def setUp(self):
+        self.place_features = create_place_features(500)
+        self.place_index = create_place_index(self.place_features)
+        self.coordinates = numpy.random.RandomState(1).uniform(
+            (-5, 50), (2, 55), (100, 2)
+        )
+
+    def test_british_national_grid(self):
+        self.assertEqual(self.place_index.crs, BRITISH_NATIONAL_GRID)
+        self.assertEqual(len(self.place_index), 500)
+
+    def test_find_nearest(self):
+        nearest = self.place_index.find_nearest(self.coordinates)
+        expected = brute_force_nearest(
+            self.place_index.grid_index.coordinates,
+            transform_coordinates(self.coordinates, 4326, BRITISH_NATIONAL_GRID),
+        )
+        self.assertListEqual(nearest.tolist(), expected.tolist())
+
+    def test_find_nearest_in_other_crs(self):
+        metric_coordinates = transform_coordinates(
+            self.coordinates, 4326, BRITISH_NATIONAL_GRID
+        )
+        self.assertListEqual(
+            self.place_index.find_nearest(
+                metric_coordinates, BRITISH_NATIONAL_GRID
+            ).tolist(),
+            self.place_index.find_nearest(self.coordinates).tolist(),
+        )
+
+    def test_find_nearest_names(self):
+        place_coordinates = [
+            feature["geometry"]["coordinates"] for feature in self.place_features[:3]
+        ]
+        names = self.place_index.find_nearest_names(place_coordinates)
+        self.assertListEqual(names, ["Place 0", "Place 1", "Place 2"])
+
+    def test_no_places(self):
+        place_index = create_place_index([])
+        with self.assertRaises(ValueError):
+            place_index.find_nearest([(0.0, 51.0)])
+
+
+class TestSavePlaceIndex(unittest.TestCase):
+    """Test place indexes are saved as arrays which can be memory mapped"""
+
+    def setUp(self):
+        self.temporary_directory = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.temporary_directory.name, "places")
+        self.place_index = create_place_index(create_place_features(200))
+        save_place_index(self.place_index, self.directory)
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def test_round_trip(self):
+        place_index = load_place_index(self.directory)
+        self.assertListEqual(place_index.names, self.place_index.names)
+        self.assertEqual(place_index.crs, self.place_index.crs)
+        for name, array in self.place_index.get_arrays().items():
+            numpy.testing.assert_array_equal(place_index.get_arrays()[name], array)
+        self.assertFalse(place_index.grid_index.coordinates.flags.writeable)
+
+        coordinates = numpy.array([(-1.0, 51.5), (0.5, 53.0)])
+        self.assertListEqual(
+            place_index.find_nearest(coordinates).tolist(),
+            self.place_index.find_nearest(coordinates).tolist(),
+        )
+
+    def test_unsupported_version(self):
+        header_path = os.path.join(self.directory, PLACE_INDEX_HEADER_FILENAME)
+        with open(header_path, "w") as open_file:
+            json.dump({"version": 0, "arrays": {}}, open_file)
+        with self.assertRaises(ValueError):
+            load_place_index(self.directory)
+
+
+if __name__ == "__main__":
+    unittest.main()